@@ -0,0 +1,82 @@
+"""
+Memory benchmark: counting added, reused and deleted chunks of an update.
+
+Counts the same old and new digest streams twice and compares peak traced
+memory:
+
+- in memory, with a Counter of the new digests checked against a dict
+  inventory of the old ones, as update_collection does by default;
+- out of core, with DigestRuns spilling sorted runs to disk under a memory
+  budget and merging them, as with KARAUpdater(accounting_memory_budget=...).
+
+Digests are generated on the fly, so neither stream is held in memory.
+
+Usage:
+    python benchmarks/accounting_benchmark.py
+    python benchmarks/accounting_benchmark.py --chunks 5000000 --budget-mib 16
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterator
+
+from kara.accounting import DigestRuns, count_operations
+from kara.hashing import get_hash_function
+
+hash_function = get_hash_function("blake2b")
+
+
+def digests(num_chunks: int, offset: int) -> Iterator[bytes]:
+    """Digests of chunks ``offset`` to ``offset + num_chunks``."""
+    return (hash_function(str(offset + i).encode()) for i in range(num_chunks))
+
+
+def count_in_memory(num_chunks: int, shift: int) -> tuple[int, int, int]:
+    old_counts = Counter(digests(num_chunks, 0))
+    used_counts = Counter(digests(num_chunks, shift))
+    reused = sum(min(count, old_counts.get(digest, 0)) for digest, count in used_counts.items())
+    return num_chunks - reused, reused, num_chunks - reused
+
+
+def count_out_of_core(num_chunks: int, shift: int, budget: int) -> tuple[int, int, int]:
+    with DigestRuns(budget // 2) as new, DigestRuns(budget // 2) as old:
+        new.update(digests(num_chunks, shift))
+        old.update(digests(num_chunks, 0))
+        return count_operations(old, new)
+
+
+def measure(label: str, func, *args):  # type: ignore[no-untyped-def]
+    """Run ``func`` under tracemalloc and print its peak memory."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<28} {peak / 2**20:>9.1f} MiB peak   [{elapsed:.1f}s]")
+    return result
+
+
+def run(num_chunks: int, budget_mib: int) -> None:
+    # A tenth of the chunks changed: the old ones deleted, new ones added
+    shift = num_chunks // 10
+    print(f"Update: {num_chunks} old and {num_chunks} new chunks, {shift} changed")
+    before = measure("dict accounting (before)", count_in_memory, num_chunks, shift)
+    after = measure(
+        f"sorted runs, {budget_mib} MiB budget", count_out_of_core, num_chunks, shift,
+        budget_mib * 2**20,
+    )
+    assert before == after, (before, after)
+    print(f"  added, reused, deleted: {after}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--chunks", type=int, default=1_000_000)
+    p.add_argument("--budget-mib", type=int, default=8)
+    a = p.parse_args()
+    run(a.chunks, a.budget_mib)
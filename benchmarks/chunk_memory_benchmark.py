@@ -0,0 +1,111 @@
+"""
+Memory benchmark: resident size of a large chunk collection.
+
+Builds the same token chunks twice and compares traced memory:
+
+- as the former ChunkData dataclass, holding the decoded content, a list of
+  boxed token ids and a hex hash string per chunk;
+- as the current compact ChunkData, holding token ids in an ``array('I')``
+  and a raw digest, with content rendered from the tokens on access.
+
+Token ids and the renderer are synthetic, so no tokenizer or network access
+is needed.
+
+Usage:
+    python benchmarks/chunk_memory_benchmark.py
+    python benchmarks/chunk_memory_benchmark.py --chunks 200000 --chunk-tokens 64
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from kara.core import ChunkData
+
+
+@dataclass
+class LegacyChunkData:
+    """The former chunk record: eager content, list splits, hex hash."""
+
+    content: Any
+    splits: list[int]
+    hash: str
+    document_id: Optional[int] = None
+
+
+def render(tokens: Any) -> str:
+    """Synthetic decoder standing in for a tokenizer."""
+    return " ".join(f"t{token}" for token in tokens)
+
+
+def serialize(tokens: Any) -> bytes:
+    return json.dumps(list(tokens), separators=(",", ":")).encode("utf-8")
+
+
+def build_legacy(num_chunks: int, chunk_tokens: int, seed: int) -> list[LegacyChunkData]:
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(num_chunks):
+        tokens = [rng.randrange(300, 100_000) for _ in range(chunk_tokens)]
+        chunks.append(
+            LegacyChunkData(
+                content=render(tokens),
+                splits=tokens,
+                hash=hashlib.md5(serialize(tokens)).hexdigest(),
+                document_id=i // 50,
+            )
+        )
+    return chunks
+
+
+def build_compact(num_chunks: int, chunk_tokens: int, seed: int) -> list[ChunkData[int]]:
+    rng = random.Random(seed)
+    return [
+        ChunkData.from_splits(
+            [rng.randrange(300, 100_000) for _ in range(chunk_tokens)],
+            i // 50,
+            serializer=serialize,
+            renderer=render,
+        )
+        for i in range(num_chunks)
+    ]
+
+
+def measure(label: str, func, *args):  # type: ignore[no-untyped-def]
+    """Run ``func`` under tracemalloc and print the memory its result keeps alive."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<28} {current / 2**20:>9.1f} MiB   [{elapsed:.1f}s]")
+    return result, current
+
+
+def run(num_chunks: int, chunk_tokens: int, seed: int) -> None:
+    print(f"Collection: {num_chunks} chunks of {chunk_tokens} tokens")
+    legacy, before = measure("dataclass chunks (before)", build_legacy, num_chunks,
+                             chunk_tokens, seed)
+    del legacy
+    compact, after = measure("compact chunks (after)", build_compact, num_chunks,
+                             chunk_tokens, seed)
+    assert compact[0].content == render(compact[0].splits)
+    print(f"  {before / num_chunks:.0f} -> {after / num_chunks:.0f} bytes per chunk; "
+          f"reduced {before / max(after, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--chunks", type=int, default=1_000_000)
+    p.add_argument("--chunk-tokens", type=int, default=16)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+    run(a.chunks, a.chunk_tokens, a.seed)
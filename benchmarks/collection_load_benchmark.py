@@ -0,0 +1,77 @@
+"""
+Startup benchmark: loading a persisted chunk collection.
+
+Saves the same token collection twice and times getting it back:
+
+- pickled as a ChunkedDocument, the way collections used to be persisted;
+- written with ColumnarChunkedDocument.save and memory-mapped with load,
+  which only reads the document index up front.
+
+Token ids are synthetic, so no tokenizer or network access is needed.
+
+Usage:
+    python benchmarks/collection_load_benchmark.py
+    python benchmarks/collection_load_benchmark.py --chunks 200000 --chunk-tokens 64
+"""
+
+import argparse
+import os
+import pickle
+import random
+import tempfile
+import time
+
+from kara.columnar import ColumnarChunkedDocument
+from kara.core import ChunkData, ChunkedDocument
+
+
+def serialize(tokens) -> bytes:  # type: ignore[no-untyped-def]
+    return bytes(tokens)
+
+
+def build_chunks(num_chunks: int, chunk_tokens: int, seed: int) -> list[ChunkData[int]]:
+    rng = random.Random(seed)
+    return [
+        ChunkData.from_splits(
+            [rng.randrange(256) for _ in range(chunk_tokens)], i // 50, serializer=serialize
+        )
+        for i in range(num_chunks)
+    ]
+
+
+def timed(label: str, func, *args):  # type: ignore[no-untyped-def]
+    t0 = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<28} {elapsed * 1000:>10.1f} ms")
+    return result, elapsed
+
+
+def run(num_chunks: int, chunk_tokens: int, seed: int) -> None:
+    chunks = build_chunks(num_chunks, chunk_tokens, seed)
+    print(f"Collection: {num_chunks} chunks of {chunk_tokens} tokens")
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "collection.pkl")
+        mapped_path = os.path.join(directory, "collection.kara")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(ChunkedDocument(chunks=chunks), f)
+        ColumnarChunkedDocument(chunks).save(mapped_path)
+        del chunks
+
+        def load_pickle() -> ChunkedDocument[int]:
+            with open(pickle_path, "rb") as f:
+                return pickle.load(f)  # type: ignore[no-any-return]
+
+        _, before = timed("pickle.load (before)", load_pickle)
+        mapped, after = timed("mmap load (after)", ColumnarChunkedDocument.load, mapped_path)
+        timed("digest inventory (lazy)", lambda: mapped.digest_counts)
+        print(f"  startup {before / max(after, 1e-9):.0f}x faster")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--chunks", type=int, default=1_000_000)
+    p.add_argument("--chunk-tokens", type=int, default=16)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+    run(a.chunks, a.chunk_tokens, a.seed)
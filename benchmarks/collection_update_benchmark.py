@@ -0,0 +1,101 @@
+"""
+Memory benchmark: updating a memory-mapped chunk collection.
+
+Writes a token collection with CollectionWriter, then measures the peak
+resident set size of fresh processes that:
+
+- only load the collection with ColumnarChunkedDocument.load;
+- load it and run update_collection against it with a short document,
+  which indexes every stored chunk for reuse.
+
+Loading maps the file without reading it, so the update should stay close
+to the load: the stored units are streamed into the reuse index, not
+converted to Python ints all at once. Pages of the mapped file that are
+read count towards the resident set but are backed by the file.
+
+Token ids are synthetic, so no tokenizer or network access is needed.
+
+Usage:
+    python benchmarks/collection_update_benchmark.py
+    python benchmarks/collection_update_benchmark.py --chunks 200000 --chunk-tokens 256
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from kara.chunkers import TokenChunker
+from kara.columnar import ColumnarChunkedDocument
+from kara.core import KARAUpdater
+from kara.storage import DIGEST_DTYPE, CollectionWriter
+
+CHUNKS_PER_DOCUMENT = 50
+
+
+def write_collection(path: str, num_chunks: int, chunk_tokens: int, seed: int) -> None:
+    """Write random token chunks, a document at a time."""
+    rng = np.random.default_rng(seed)
+    lengths = np.full(CHUNKS_PER_DOCUMENT, chunk_tokens)
+    with CollectionWriter(path) as writer:
+        for document_id, start in enumerate(range(0, num_chunks, CHUNKS_PER_DOCUMENT)):
+            count = min(CHUNKS_PER_DOCUMENT, num_chunks - start)
+            digests = rng.integers(0, 256, (count, 17), dtype=np.uint8)
+            digests[:, 0] = 0  # MD5 tag
+            writer.add_columns(
+                document_id,
+                digests.view(DIGEST_DTYPE).ravel(),
+                lengths[:count],
+                rng.integers(0, 50_000, count * chunk_tokens, dtype=np.uint32),
+            )
+
+
+def peak_rss_mib() -> float:
+    """Peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def measure(path: str, chunk_tokens: int, update: bool, results: "multiprocessing.Queue") -> None:
+    """Load, and optionally update, the collection in this process."""
+    t0 = time.perf_counter()
+    collection = ColumnarChunkedDocument.load(path)
+    if update:
+        chunker = TokenChunker(
+            tokenizer_function=lambda text: [len(word) for word in text.split()],
+            chunk_size=chunk_tokens,
+        )
+        result = KARAUpdater(chunker=chunker).update_collection(collection, ["a tiny new doc"])
+        assert result.num_added == 1
+    results.put((time.perf_counter() - t0, peak_rss_mib()))
+
+
+def run(num_chunks: int, chunk_tokens: int, seed: int) -> None:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "collection.kara")
+        write_collection(path, num_chunks, chunk_tokens, seed)
+        size = os.path.getsize(path) / 2**20
+        print(f"Collection: {num_chunks} chunks of {chunk_tokens} tokens, {size:.0f} MiB file")
+        for label, update in (("load", False), ("load + update_collection", True)):
+            results: multiprocessing.Queue = context.Queue()
+            process = context.Process(target=measure, args=(path, chunk_tokens, update, results))
+            process.start()
+            elapsed, peak = results.get()
+            process.join()
+            print(f"  {label:<26} {peak:>8.1f} MiB peak RSS   [{elapsed:.1f}s]")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--chunks", type=int, default=200_000)
+    p.add_argument("--chunk-tokens", type=int, default=256)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+    run(a.chunks, a.chunk_tokens, a.seed)
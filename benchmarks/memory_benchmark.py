@@ -0,0 +1,88 @@
+"""
+Peak-memory benchmark: chunk-graph edge storage during a KARA update.
+
+Compares the peak traced memory of building the chunk graph the way KARA
+used to (every edge holding its own copy of the span's units) against a
+full ``update_collection`` call with range-based edges, which keep only
+(end, cost, hash) per edge and slice units out for the final path alone.
+
+The document is a synthetic token sequence, so no tokenizer or network
+access is needed.
+
+Usage:
+    python benchmarks/memory_benchmark.py
+    python benchmarks/memory_benchmark.py --tokens 4000 --chunk-tokens 256
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from kara import KARAUpdater, TokenChunker
+
+
+def tokenize(text: str) -> list[int]:
+    """Synthetic tokenizer: the document is already a list of token ids."""
+    return [int(token) for token in text.split()]
+
+
+def make_revisions(num_tokens: int, seed: int) -> tuple[str, str]:
+    """Build a token document and a revision with a few local edits."""
+    rng = random.Random(seed)
+    tokens = [rng.randrange(50_000) for _ in range(num_tokens)]
+    revised = list(tokens)
+    for _ in range(max(1, num_tokens // 500)):
+        position = rng.randrange(len(revised))
+        revised[position:position] = [rng.randrange(50_000) for _ in range(8)]
+    return " ".join(map(str, tokens)), " ".join(map(str, revised))
+
+
+def build_copied_edges(units: list[int], chunk_size: int) -> int:
+    """Build the legacy graph in which every edge copies its span's units."""
+    edges: list[list[tuple[int, list[int]]]] = [[] for _ in range(len(units) + 1)]
+    num_edges = 0
+    for i in range(len(units)):
+        chunk_splits: list[int] = []
+        for j in range(i + 1, min(i + chunk_size, len(units)) + 1):
+            chunk_splits.append(units[j - 1])
+            edges[i].append((j, chunk_splits.copy()))
+            num_edges += 1
+    return num_edges
+
+
+def measure(label: str, func, *args):  # type: ignore[no-untyped-def]
+    """Run ``func`` under tracemalloc and print its peak traced memory."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<28} peak {peak / 2**20:>9.1f} MiB   [{elapsed:.1f}s]")
+    return result, peak
+
+
+def run(num_tokens: int, chunk_tokens: int, seed: int) -> None:
+    original, revised = make_revisions(num_tokens, seed)
+    chunker = TokenChunker(tokenizer_function=tokenize, chunk_size=chunk_tokens)
+    updater = KARAUpdater(chunker=chunker)
+    collection = updater.create_collection([original]).new_chunked_doc
+    assert collection is not None
+
+    print(f"Document: {num_tokens} tokens, chunk_size={chunk_tokens}")
+    _, before = measure("copied split lists (before)", build_copied_edges, tokenize(revised),
+                        chunk_tokens)
+    result, after = measure("range edges (after)", updater.update_collection, collection,
+                            [revised])
+    print(f"  reused {result.num_reused}, added {result.num_added}; "
+          f"peak reduced {before / max(after, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--tokens", type=int, default=2000)
+    p.add_argument("--chunk-tokens", type=int, default=128)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+    run(a.tokens, a.chunk_tokens, a.seed)
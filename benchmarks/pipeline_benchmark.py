@@ -0,0 +1,96 @@
+"""
+Latency benchmark: overlapping document solving with embedding calls.
+
+Updates the same collection twice against a fake embedding coroutine that
+sleeps for a fixed latency per call:
+
+- sequentially, running update_collection over every document and then
+  embedding the added chunks in batches, as a service would without an
+  async API;
+- with KARAUpdater.aupdate, which embeds the chunks of each document while
+  the following documents are solved.
+
+Both use the same batch size and number of concurrent embedding calls.
+Documents are synthetic, so no tokenizer or network access is needed.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py
+    python benchmarks/pipeline_benchmark.py --documents 400 --latency-ms 100
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any
+
+from kara import CharacterChunker, KARAUpdater
+
+
+def make_documents(num_documents: int, seed: int) -> tuple[list[str], list[str]]:
+    """Return documents and an update rewriting a third of each document."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(500)]
+
+    def sentence() -> str:
+        return " ".join(rng.choice(words) for _ in range(12)) + ". "
+
+    documents = ["".join(sentence() for _ in range(60)) for _ in range(num_documents)]
+    updated = [doc[: len(doc) // 3] + "".join(sentence() for _ in range(20)) for doc in documents]
+    return documents, updated
+
+
+def run(num_documents: int, latency: float, batch_size: int, concurrency: int, seed: int) -> None:
+    documents, updated = make_documents(num_documents, seed)
+    chunker = CharacterChunker(chunk_size=300, separators=[". ", " "], keep_separator=True)
+    updater = KARAUpdater(chunker=chunker, compute_delta=True)
+    collection = updater.create_collection(documents).new_chunked_doc
+    assert collection is not None
+
+    async def embed(contents: list[Any]) -> list[int]:
+        await asyncio.sleep(latency)
+        return [len(content) for content in contents]
+
+    async def sequential() -> int:
+        result = updater.update_collection(collection, updated)
+        assert result.delta is not None and result.new_chunked_doc is not None
+        chunks = result.new_chunked_doc
+        contents = [
+            chunks.get_chunks_by_document(doc_id)[position].content
+            for doc_id, position in result.delta.added
+        ]
+        limit = asyncio.Semaphore(concurrency)
+
+        async def embed_batch(batch: list[Any]) -> list[int]:
+            async with limit:
+                return await embed(batch)
+
+        batches = [contents[i : i + batch_size] for i in range(0, len(contents), batch_size)]
+        await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return len(contents)
+
+    async def pipelined() -> int:
+        num_added = 0
+        async for update in updater.aupdate(
+            collection, updated, embed, batch_size=batch_size, max_concurrency=concurrency
+        ):
+            num_added += len(update.delta.added)
+        return num_added
+
+    print(f"Update: {num_documents} documents, {latency * 1000:.0f} ms per embedding call")
+    for label, func in (("solve, then embed (before)", sequential), ("aupdate (after)", pipelined)):
+        t0 = time.perf_counter()
+        num_added = asyncio.run(func())
+        elapsed = time.perf_counter() - t0
+        print(f"  {label:<28} {elapsed:>7.2f} s   [{num_added} chunks embedded]")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--documents", type=int, default=200)
+    p.add_argument("--latency-ms", type=float, default=50)
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--concurrency", type=int, default=2)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+    run(a.documents, a.latency_ms / 1000, a.batch_size, a.concurrency, a.seed)
@@ -0,0 +1,132 @@
+"""
+End-to-end throughput benchmark: update, embed, apply to a vector store, query.
+
+Runs a series of revisions of a synthetic collection through four stages:
+
+- update: KARAUpdater.update_collection against the previous revision;
+- embed: a fake embedder deriving a random unit vector from each added
+  chunk's digest, so no model or network access is needed;
+- apply: writing the delta into the vector store, either with
+  LocalVectorStore.apply, which keeps reused rows and fills freed ones in
+  place, or by rebuilding the matrix from the reused rows and the new
+  embeddings, as a store without delta support would;
+- query: a batch of brute-force top-k searches.
+
+Usage:
+    python benchmarks/vector_store_benchmark.py
+    python benchmarks/vector_store_benchmark.py --documents 1000 --dim 384 --revisions 10
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from kara import CharacterChunker, KARAUpdater
+from kara.core import ChunkRef, UpdateResult
+from kara.vectorstore import LocalVectorStore
+
+
+def fake_embed(chunks: list[bytes], dim: int) -> np.ndarray:
+    """Return a unit vector per chunk digest, the same for the same digest."""
+    vectors = np.empty((len(chunks), dim), dtype=np.float32)
+    for i, digest in enumerate(chunks):
+        vectors[i] = np.random.default_rng(list(digest)).standard_normal(dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class RebuiltMatrix:
+    """Baseline store that builds a new matrix on every update."""
+
+    def __init__(self, dim: int):
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.rows: dict[ChunkRef, int] = {}
+
+    def apply(self, result: UpdateResult[str], embeddings: np.ndarray) -> None:
+        assert result.delta is not None
+        reused = list(result.delta.reused.items())
+        kept = self.matrix[[self.rows[old] for _, old in reused]]
+        self.matrix = np.concatenate([kept, embeddings])
+        refs = [new for new, _ in reused] + result.delta.added
+        self.rows = {ref: row for row, ref in enumerate(refs)}
+
+
+def make_revisions(num_documents: int, num_revisions: int, seed: int) -> list[list[str]]:
+    """Return revisions of a collection, each rewriting a tenth of its sentences."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(2000)]
+
+    def sentence() -> str:
+        return " ".join(rng.choice(words) for _ in range(12)) + ". "
+
+    documents = [[sentence() for _ in range(30)] for _ in range(num_documents)]
+    revisions = [["".join(doc) for doc in documents]]
+    for _ in range(num_revisions):
+        for doc in documents:
+            for _ in range(len(doc) // 10):
+                doc[rng.randrange(len(doc))] = sentence()
+        revisions.append(["".join(doc) for doc in documents])
+    return revisions
+
+
+def run(num_documents: int, num_revisions: int, dim: int, num_queries: int, seed: int) -> None:
+    revisions = make_revisions(num_documents, num_revisions, seed)
+    chunker = CharacterChunker(chunk_size=300, separators=[". ", " "], keep_separator=True)
+    updater = KARAUpdater(chunker=chunker, compute_delta=True)
+    queries = fake_embed([bytes([i % 256, i // 256]) for i in range(num_queries)], dim)
+    store = LocalVectorStore(dim)
+    baseline = RebuiltMatrix(dim)
+    seconds: dict[str, float] = defaultdict(float)
+    num_embedded = 0
+
+    collection = updater.create_collection([]).new_chunked_doc
+    assert collection is not None
+    for revision in revisions:
+        t0 = time.perf_counter()
+        result = updater.update_collection(collection, revision)
+        t1 = time.perf_counter()
+        assert result.delta is not None and result.new_chunked_doc is not None
+        collection = result.new_chunked_doc
+        added = [
+            collection.get_chunks_by_document(doc_id)[position].digest
+            for doc_id, position in result.delta.added
+        ]
+        embeddings = fake_embed(added, dim)
+        t2 = time.perf_counter()
+        store.apply(result, embeddings)
+        t3 = time.perf_counter()
+        baseline.apply(result, embeddings)
+        t4 = time.perf_counter()
+        store.search_batch(queries, k=10)
+        t5 = time.perf_counter()
+        seconds["update"] += t1 - t0
+        seconds["embed (fake)"] += t2 - t1
+        seconds["apply in place (after)"] += t3 - t2
+        seconds["rebuild matrix (before)"] += t4 - t3
+        seconds["query"] += t5 - t4
+        num_embedded += len(added)
+
+    # The first revision embeds the whole collection; later ones only changes
+    print(
+        f"{len(revisions)} revisions of {num_documents} documents, {len(store)} chunks of "
+        f"dimension {dim}, {num_embedded} chunks embedded, {num_queries} queries per revision"
+    )
+    for stage, elapsed in seconds.items():
+        print(f"  {stage:<26} {elapsed:>8.3f} s")
+    total = seconds["update"] + seconds["embed (fake)"] + seconds["apply in place (after)"]
+    print(f"  {'update + embed + apply':<26} {num_embedded / total:>8.0f} chunks/s")
+    print(f"  {'query':<26} {num_queries * len(revisions) / seconds['query']:>8.0f} queries/s")
+    print(f"  store capacity {store.capacity} rows, {store.num_free_rows} free")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--documents", type=int, default=300)
+    p.add_argument("--revisions", type=int, default=5)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--queries", type=int, default=64)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+    run(a.documents, a.revisions, a.dim, a.queries, a.seed)
@@ -0,0 +1,214 @@
+"""
+External-memory digest accounting for updates of collections larger than memory.
+
+:class:`DigestRuns` counts digests like a :class:`collections.Counter`, but
+buffers them in memory only up to a budget. A full buffer is sorted, counted
+and spilled to a run file of ``(digest, count)`` records in digest order.
+Iterating merges the runs into one sorted stream, so :func:`count_operations`
+can compare an old and a new inventory in a single pass over both streams.
+"""
+
+import heapq
+import os
+import tempfile
+from collections.abc import Iterable, Iterator
+from itertools import groupby, islice
+from operator import itemgetter
+from types import TracebackType
+from typing import Optional
+
+import numpy as np
+
+from .hashing import DIGEST_SIZE
+
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
+
+_RUN_DTYPE = np.dtype([("digest", f"V{DIGEST_SIZE}"), ("count", "<u8")])
+# Sorting and counting a buffer takes about this many times its size
+_SPILL_OVERHEAD = 5
+# A merged record held as Python objects: the digest bytes, the count and a tuple
+_MERGED_RECORD_SIZE = 128
+# Runs merged at once, which bounds the number of open files
+_MAX_MERGE_WIDTH = 64
+# Smallest budget leaving every merged run a block of at least one record
+MIN_MEMORY_BUDGET = _SPILL_OVERHEAD * DIGEST_SIZE * _MAX_MERGE_WIDTH
+
+
+class DigestRuns:
+    """
+    Multiset of digests that spills to sorted run files past a memory budget.
+
+    Digests are appended to an in-memory buffer. When the buffer reaches its
+    share of the budget, it is sorted and counted with NumPy and written to a
+    temporary run file. Iteration yields ``(digest, count)`` pairs in digest
+    order, merging at most 64 runs at a time and reading every run in blocks
+    that together fit the budget. Run files are removed on :meth:`close`.
+
+    Example:
+        >>> with DigestRuns(memory_budget=16 * 2**20) as runs:
+        ...     runs.update(chunk.digest for chunk in chunks)
+        ...     for digest, count in runs:
+        ...         ...
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        directory: Optional[str] = None,
+    ):
+        """
+        Initialize the multiset.
+
+        Args:
+            memory_budget: Approximate number of bytes used for buffering,
+                sorting and merging digests
+            directory: Directory for run files, the system temporary
+                directory by default
+        """
+        if memory_budget < MIN_MEMORY_BUDGET:
+            raise ValueError(
+                f"memory_budget must be at least {MIN_MEMORY_BUDGET} bytes, got {memory_budget}."
+            )
+        self.memory_budget = memory_budget
+        self._directory = directory
+        self._buffer = bytearray()
+        self._buffer_size = memory_budget // _SPILL_OVERHEAD // DIGEST_SIZE * DIGEST_SIZE
+        self._runs: list[str] = []
+        self._num_digests = 0
+
+    def __enter__(self) -> "DigestRuns":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    @property
+    def num_digests(self) -> int:
+        """Number of digests counted, with repetitions."""
+        return self._num_digests
+
+    @property
+    def num_runs(self) -> int:
+        """Number of run files spilled to disk."""
+        return len(self._runs)
+
+    def update(self, digests: Iterable[bytes]) -> None:
+        """
+        Count digests.
+
+        Args:
+            digests: Tagged digests of ``DIGEST_SIZE`` bytes
+        """
+        buffer = self._buffer
+        for digest in digests:
+            if len(digest) != DIGEST_SIZE:
+                raise ValueError(f"Expected a {DIGEST_SIZE}-byte digest, got {len(digest)} bytes.")
+            buffer += digest
+            self._num_digests += 1
+            if len(buffer) >= self._buffer_size:
+                self._spill()
+
+    def __iter__(self) -> Iterator[tuple[bytes, int]]:
+        """Iterate over ``(digest, count)`` pairs in digest order."""
+        if not self._runs:
+            records = self._count_buffer()
+            return zip(records["digest"].tolist(), records["count"].tolist())
+        if self._buffer:
+            self._spill()
+        while len(self._runs) > _MAX_MERGE_WIDTH:
+            group = self._runs[:_MAX_MERGE_WIDTH]
+            merged = self._write_run(self._merge_blocks(group))
+            self._runs = [*self._runs[_MAX_MERGE_WIDTH:], merged]
+            for path in group:
+                os.remove(path)
+        return self._merge(self._runs)
+
+    def close(self) -> None:
+        """Remove the run files and clear the buffer."""
+        for path in self._runs:
+            os.remove(path)
+        self._runs = []
+        self._buffer = bytearray()
+
+    def _count_buffer(self) -> np.ndarray:
+        """Return the buffered digests as sorted ``(digest, count)`` records."""
+        digests, counts = np.unique(
+            np.frombuffer(self._buffer, dtype=_RUN_DTYPE["digest"]), return_counts=True
+        )
+        records = np.empty(len(digests), dtype=_RUN_DTYPE)
+        records["digest"] = digests
+        records["count"] = counts
+        return records
+
+    def _spill(self) -> None:
+        """Write the buffer to a new run file and empty it."""
+        records = self._count_buffer()
+        self._buffer.clear()
+        self._runs.append(self._write_run([records]))
+
+    def _write_run(self, blocks: Iterable[np.ndarray]) -> str:
+        """Write blocks of sorted records to a new run file and return its path."""
+        fd, path = tempfile.mkstemp(prefix="kara-run-", suffix=".bin", dir=self._directory)
+        with os.fdopen(fd, "wb") as f:
+            for block in blocks:
+                f.write(block.tobytes())
+        return path
+
+    def _merge(self, paths: list[str]) -> Iterator[tuple[bytes, int]]:
+        """Merge sorted run files into one stream of ``(digest, count)`` pairs."""
+        block_size = max(1, self.memory_budget // (len(paths) * _MERGED_RECORD_SIZE))
+        merged = heapq.merge(*(_read_run(path, block_size) for path in paths), key=itemgetter(0))
+        for digest, group in groupby(merged, key=itemgetter(0)):
+            yield digest, sum(count for _, count in group)
+
+    def _merge_blocks(self, paths: list[str]) -> Iterator[np.ndarray]:
+        """Merge sorted run files into blocks of records."""
+        block_size = max(1, self.memory_budget // (2 * _MERGED_RECORD_SIZE))
+        pairs = self._merge(paths)
+        while True:
+            block = np.array(list(islice(pairs, block_size)), dtype=_RUN_DTYPE)
+            if not len(block):
+                return
+            yield block
+
+
+def _read_run(path: str, block_size: int) -> Iterator[tuple[bytes, int]]:
+    """Read the ``(digest, count)`` pairs of a run file, ``block_size`` at a time."""
+    with open(path, "rb") as f:
+        while True:
+            records = np.fromfile(f, dtype=_RUN_DTYPE, count=block_size)
+            if not len(records):
+                return
+            yield from zip(records["digest"].tolist(), records["count"].tolist())
+
+
+def count_operations(old: DigestRuns, new: DigestRuns) -> tuple[int, int, int]:
+    """
+    Count added, reused and deleted chunks of an update in one merge pass.
+
+    Every new digest reuses as many old chunks with that digest as exist;
+    the remaining new chunks are added and the remaining old chunks deleted.
+
+    Args:
+        old: Digests of the chunks before the update
+        new: Digests of the chunks after the update
+
+    Returns:
+        Tuple of the number of added, reused and deleted chunks
+    """
+    num_added = num_reused = 0
+    old_counts = iter(old)
+    old_entry = next(old_counts, None)
+    for digest, count in new:
+        while old_entry is not None and old_entry[0] < digest:
+            old_entry = next(old_counts, None)
+        old_count = old_entry[1] if old_entry is not None and old_entry[0] == digest else 0
+        reused = min(count, old_count)
+        num_reused += reused
+        num_added += count - reused
+    return num_added, num_reused, old.num_digests - num_reused
@@ -0,0 +1,310 @@
+"""
+Embedding cache keyed by chunk hash, with an LRU tier in memory and a SQLite tier on disk.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+from types import TracebackType
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+
+from .core import ChunkData
+from .hashing import digest_from_hex
+
+# Chunk hash as ``ChunkData.hash`` formats it, or the raw ``ChunkData.digest``
+ChunkHash = Union[str, bytes]
+
+_MAX_PARAMETERS = 500
+
+
+class EmbeddingCache:
+    """
+    Cache of chunk embeddings keyed by chunk hash.
+
+    Chunks that disappear from a collection and return in a later revision,
+    as with reverts, can take their embedding from the cache instead of being
+    embedded again. Recently used embeddings are kept in memory, up to
+    ``max_entries``. With a ``path``, every embedding is also written to a
+    SQLite database, which persists across runs and evicts the least recently
+    used embeddings once it holds more than ``max_disk_bytes`` of vectors.
+
+    Embeddings read from disk are returned as lists of floats, stored with
+    ``dtype`` precision; embeddings in memory are returned as they were put.
+
+    Example:
+        >>> with EmbeddingCache("embeddings.sqlite", max_disk_bytes=2**30) as cache:
+        ...     vectors = cache.embed_chunks(chunks, embeddings.embed_documents)
+        ...     print(f"{cache.hit_rate:.0%} of chunks were cached")
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, "os.PathLike[str]"]] = None,
+        max_entries: int = 10_000,
+        max_disk_bytes: Optional[int] = None,
+        dtype: str = "float32",
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Optional path of the SQLite database of the disk tier,
+                created if it does not exist. ``None`` keeps embeddings in
+                memory only.
+            max_entries: Maximum number of embeddings kept in memory
+            max_disk_bytes: Maximum total size of the vectors on disk.
+                ``None`` never evicts.
+            dtype: NumPy dtype the vectors are stored with on disk
+        """
+        if max_entries < 0:
+            raise ValueError(f"max_entries must not be negative, got {max_entries}.")
+        if max_disk_bytes is not None and max_disk_bytes < 0:
+            raise ValueError(f"max_disk_bytes must not be negative, got {max_disk_bytes}.")
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[bytes, Any] = OrderedDict()
+        # The pipeline of KARAUpdater.aupdate reads and writes from two threads
+        self._lock = threading.Lock()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(os.fspath(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "digest BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+            self._disk_bytes, self._clock = self._db.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0), COALESCE(MAX(last_used), 0) "
+                "FROM embeddings"
+            ).fetchone()
+            if max_disk_bytes is not None and self._disk_bytes > max_disk_bytes:
+                self._evict(self._disk_bytes - max_disk_bytes)
+            self._db.commit()
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of cached embeddings, on disk if there is a disk tier."""
+        with self._lock:
+            if self._db is None:
+                return len(self._memory)
+            return int(self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+
+    def __contains__(self, chunk_hash: object) -> bool:
+        """Check whether an embedding is cached, without counting a hit or miss."""
+        if not isinstance(chunk_hash, (str, bytes)):
+            return False
+        digest = _digest_of(chunk_hash)
+        with self._lock:
+            if digest in self._memory:
+                return True
+            return self._db is not None and (
+                self._db.execute("SELECT 1 FROM embeddings WHERE digest = ?", (digest,)).fetchone()
+                is not None
+            )
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that found a cached embedding."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def disk_bytes(self) -> int:
+        """Total size of the vectors on disk."""
+        return self._disk_bytes if self._db is not None else 0
+
+    def get(self, chunk_hash: ChunkHash) -> Optional[Any]:
+        """
+        Return the cached embedding of a chunk, or ``None``.
+
+        Args:
+            chunk_hash: ``ChunkData.hash`` of the chunk, or its raw digest
+
+        Returns:
+            Cached embedding, or ``None`` if the chunk is not cached
+        """
+        return self.get_many([chunk_hash])[0]
+
+    def get_many(self, chunk_hashes: Iterable[ChunkHash]) -> list[Optional[Any]]:
+        """
+        Return the cached embeddings of chunks, with ``None`` for misses.
+
+        Args:
+            chunk_hashes: ``ChunkData.hash`` of every chunk, or raw digests
+
+        Returns:
+            Cached embedding or ``None`` per chunk, in order
+        """
+        digests = [_digest_of(chunk_hash) for chunk_hash in chunk_hashes]
+        with self._lock:
+            embeddings = [self._memory.get(digest) for digest in digests]
+            missing = [digest for digest, found in zip(digests, embeddings) if found is None]
+            stored = self._read(missing) if missing and self._db is not None else {}
+            for i, digest in enumerate(digests):
+                if embeddings[i] is None:
+                    embeddings[i] = stored.get(digest)
+                if embeddings[i] is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                self._remember(digest, embeddings[i])
+            return embeddings
+
+    def put(self, chunk_hash: ChunkHash, embedding: Any) -> None:
+        """
+        Cache the embedding of a chunk.
+
+        Args:
+            chunk_hash: ``ChunkData.hash`` of the chunk, or its raw digest
+            embedding: Embedding vector of the chunk
+        """
+        self.put_many([chunk_hash], [embedding])
+
+    def put_many(self, chunk_hashes: Iterable[ChunkHash], embeddings: Iterable[Any]) -> None:
+        """
+        Cache the embeddings of chunks.
+
+        Args:
+            chunk_hashes: ``ChunkData.hash`` of every chunk, or raw digests
+            embeddings: Embedding vector of every chunk, in order
+        """
+        entries = [
+            (_digest_of(chunk_hash), embedding)
+            for chunk_hash, embedding in zip(chunk_hashes, embeddings)
+        ]
+        with self._lock:
+            for digest, embedding in entries:
+                self._remember(digest, embedding)
+            if self._db is not None and entries:
+                self._write(entries)
+
+    def embed_chunks(
+        self, chunks: Sequence[ChunkData[Any]], embed: Callable[[list[Any]], Sequence[Any]]
+    ) -> list[Any]:
+        """
+        Return the embeddings of chunks, embedding only the ones not cached.
+
+        Cache misses are embedded with a single ``embed`` call and cached.
+
+        Args:
+            chunks: Chunks to embed, such as the added chunks of an update
+            embed: Function embedding a list of chunk contents, such as
+                LangChain's ``embed_documents``
+
+        Returns:
+            Embedding of every chunk, in order
+        """
+        embeddings = self.get_many([chunk.digest for chunk in chunks])
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            new_embeddings = embed([chunks[i].content for i in misses])
+            if len(new_embeddings) != len(misses):
+                raise ValueError(
+                    f"embed returned {len(new_embeddings)} embeddings for {len(misses)} contents."
+                )
+            self.put_many([chunks[i].digest for i in misses], new_embeddings)
+            for i, embedding in zip(misses, new_embeddings):
+                embeddings[i] = embedding
+        return embeddings
+
+    def close(self) -> None:
+        """Close the database of the disk tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, digest: bytes, embedding: Any) -> None:
+        """Keep an embedding in memory as the most recently used."""
+        if self.max_entries == 0:
+            return
+        self._memory[digest] = embedding
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, digests: list[bytes]) -> dict[bytes, Any]:
+        """Read embeddings from disk and mark them as recently used."""
+        assert self._db is not None
+        stored = {
+            bytes(digest): np.frombuffer(vector, dtype=self.dtype).tolist()
+            for digest, vector in self._select("vector", digests)
+        }
+        if stored:
+            self._clock += 1
+            self._db.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE digest = ?",
+                [(self._clock, digest) for digest in stored],
+            )
+            self._db.commit()
+        return stored
+
+    def _write(self, entries: list[tuple[bytes, Any]]) -> None:
+        """Write embeddings to disk and evict the least recently used beyond the limit."""
+        assert self._db is not None
+        self._clock += 1
+        vectors = {
+            digest: np.asarray(embedding, dtype=self.dtype).tobytes()
+            for digest, embedding in entries
+        }
+        replaced = sum(size for _, size in self._select("LENGTH(vector)", list(vectors)))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (digest, vector, last_used) VALUES (?, ?, ?)",
+            [(digest, vector, self._clock) for digest, vector in vectors.items()],
+        )
+        self._disk_bytes += sum(map(len, vectors.values())) - replaced
+        if self.max_disk_bytes is not None and self._disk_bytes > self.max_disk_bytes:
+            self._evict(self._disk_bytes - self.max_disk_bytes)
+        self._db.commit()
+
+    def _select(self, column: str, digests: list[bytes]) -> Iterator[tuple[bytes, Any]]:
+        """Yield the digest and ``column`` of the stored rows among ``digests``."""
+        assert self._db is not None
+        # SQLite limits the number of parameters of a statement
+        for start in range(0, len(digests), _MAX_PARAMETERS):
+            batch = digests[start : start + _MAX_PARAMETERS]
+            placeholders = ",".join("?" * len(batch))
+            yield from self._db.execute(
+                f"SELECT digest, {column} FROM embeddings WHERE digest IN ({placeholders})",
+                batch,
+            )
+
+    def _evict(self, num_bytes: int) -> None:
+        """Delete the least recently used vectors on disk, freeing at least ``num_bytes``."""
+        assert self._db is not None
+        evicted: list[tuple[bytes]] = []
+        freed = 0
+        for digest, size in self._db.execute(
+            "SELECT digest, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ):
+            if freed >= num_bytes:
+                break
+            evicted.append((digest,))
+            freed += size
+        self._db.executemany("DELETE FROM embeddings WHERE digest = ?", evicted)
+        self._disk_bytes -= freed
+
+
+def _digest_of(chunk_hash: ChunkHash) -> bytes:
+    """Return the raw digest of a chunk hash given as hex or as a digest."""
+    return chunk_hash if isinstance(chunk_hash, bytes) else digest_from_hex(chunk_hash)
@@ -7,6 +7,7 @@ import re
 from abc import ABC, abstractmethod
 from collections.abc import Collection, Sequence
 from collections.abc import Set as AbstractSet
+from functools import cache
 from typing import (
     Any,
     Callable,
@@ -17,19 +18,52 @@ from typing import (
     Union,
 )
 
+import numpy as np
+
+from .hashing import get_hash_function
+
 T = TypeVar("T")
 
 
+def serialize_unit(unit: Any) -> bytes:
+    """
+    Serialize a single unit to bytes, as :meth:`BaseDocumentChunker.serialize_unit` does.
+
+    Hash-only collection states fingerprint their chunks with it, since they
+    are built without a chunker.
+    """
+    if type(unit) is int:
+        # The bytes of the JSON encoding below, without going through the encoder
+        return b"%d," % unit
+    if isinstance(unit, str):
+        return unit.encode("utf-8")
+    serialized = json.dumps(unit, separators=(",", ":"), ensure_ascii=True) + ","
+    return serialized.encode("utf-8")
+
+
+def prefix_lengths(lengths: np.ndarray) -> np.ndarray:
+    """
+    Return cumulative unit lengths with a leading zero.
+
+    ``prefix[j] - prefix[i]`` is then the length of units ``[i, j)``.
+    """
+    prefix = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=prefix[1:])
+    return prefix
+
+
 class BaseDocumentChunker(ABC, Generic[T]):
     """Abstract base class for document chunkers."""
 
-    def __init__(self, chunk_size: int = 1000, overlap: int = 0):
+    def __init__(self, chunk_size: int = 1000, overlap: int = 0, hash_algorithm: str = "md5"):
         """
         Initialize the document chunker.
 
         Args:
             chunk_size: Maximum size of each chunk
             overlap: Overlap between chunks in units
+            hash_algorithm: Algorithm used to hash chunks: ``"md5"``, ``"blake2b"``
+                or ``"xxh128"``. Non-MD5 hashes are tagged with the algorithm name
         """
         if chunk_size <= 0:
             raise ValueError("chunk_size must be positive")
@@ -37,6 +71,8 @@ class BaseDocumentChunker(ABC, Generic[T]):
             raise ValueError("overlap must be zero or positive")
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.hash_algorithm = hash_algorithm
+        self.hash_function = get_hash_function(hash_algorithm)
 
     @abstractmethod
     def create_chunks(self, text: str) -> list[list[T]]:
@@ -62,6 +98,12 @@ class BaseDocumentChunker(ABC, Generic[T]):
             return len(unit)
         return 1
 
+    def unit_lengths(self, units: Sequence[T]) -> np.ndarray:
+        """Return the lengths of ``units`` as an integer array."""
+        return np.fromiter(
+            (self.unit_length(unit) for unit in units), dtype=np.int64, count=len(units)
+        )
+
     def serialize_units(self, units: Sequence[T]) -> bytes:
         """Serialize units to bytes for hashing."""
         if all(isinstance(unit, str) for unit in units):
@@ -69,6 +111,20 @@ class BaseDocumentChunker(ABC, Generic[T]):
         serialized = json.dumps(list(units), separators=(",", ":"), ensure_ascii=True)
         return serialized.encode("utf-8")
 
+    def hash_units(self, units: Sequence[T]) -> bytes:
+        """Digest units with the chunker's hash algorithm."""
+        return self.hash_function(self.serialize_units(units))
+
+    def serialize_unit(self, unit: T) -> bytes:
+        """
+        Serialize a single unit to bytes for span fingerprinting.
+
+        Concatenating the serialized units of a span must identify the span as
+        well as :meth:`serialize_units` does, so that equal chunk hashes imply
+        equal span fingerprints.
+        """
+        return serialize_unit(unit)
+
     def render_units(self, units: Sequence[T]) -> Any:
         """Render units for output or storage."""
         if all(isinstance(unit, str) for unit in units):
@@ -89,8 +145,11 @@ class BaseDocumentChunker(ABC, Generic[T]):
         if not units:
             return []
 
-        def chunk_length(chunk_units: list[Any]) -> int:
-            return sum(self.unit_length(unit) for unit in chunk_units)
+        prefix = prefix_lengths(self.unit_lengths(units))
+        # Furthest end of a chunk starting at each unit; a unit longer than the
+        # limit still forms a chunk of its own
+        ends = np.searchsorted(prefix, prefix[:-1] + max_chunk_size, side="right") - 1
+        ends = np.maximum(ends, np.arange(1, len(units) + 1)).tolist()
 
         chunks: list[list[Any]] = []
         overlap_units = self.overlap
@@ -98,23 +157,8 @@ class BaseDocumentChunker(ABC, Generic[T]):
         units_count = len(units)
 
         while start < units_count:
-            current_chunk: list[Any] = []
-            current_length = 0
-            end = start
-
-            while end < units_count:
-                unit = units[end]
-                unit_len = self.unit_length(unit)
-                if current_length > 0 and current_length + unit_len > max_chunk_size:
-                    break
-                current_chunk.append(unit)
-                current_length += unit_len
-                end += 1
-
-            if not current_chunk:
-                break
-
-            chunks.append(current_chunk)
+            end = ends[start]
+            chunks.append(units[start:end])
 
             if end >= units_count:
                 break
@@ -141,6 +185,7 @@ class CharacterChunker(BaseDocumentChunker[str]):
         chunk_size: int = 4000,
         overlap: int = 0,
         keep_separator: bool = True,
+        hash_algorithm: str = "md5",
     ):
         """
         Initialize the recursive character chunker.
@@ -150,8 +195,9 @@ class CharacterChunker(BaseDocumentChunker[str]):
             chunk_size: Maximum chunk size in characters. Defaults to 4000
             overlap: Overlap between chunks in units
             keep_separator: Whether to keep separators in the result
+            hash_algorithm: Algorithm used to hash chunks
         """
-        super().__init__(chunk_size=chunk_size, overlap=overlap)
+        super().__init__(chunk_size=chunk_size, overlap=overlap, hash_algorithm=hash_algorithm)
         self.separators = separators or ["\n\n", "\n", " "]
         self.keep_separator = keep_separator
 
@@ -175,6 +221,10 @@ class CharacterChunker(BaseDocumentChunker[str]):
         """Split text into smallest units using separators."""
         return self._split_text_with_regex(text, self.separators, self.keep_separator)
 
+    def unit_lengths(self, units: Sequence[str]) -> np.ndarray:
+        """Return the character lengths of ``units`` as an integer array."""
+        return np.fromiter(map(len, units), dtype=np.int64, count=len(units))
+
     def _split_text_with_regex(
         self,
         text: str,
@@ -229,6 +279,7 @@ class TokenChunker(BaseDocumentChunker[int]):
         tokenizer_function: Optional[Callable[[str], list[int]]] = None,
         chunk_size: int = 512,
         overlap: int = 0,
+        hash_algorithm: str = "md5",
     ):
         """
         Initialize the token-based chunker.
@@ -237,8 +288,9 @@ class TokenChunker(BaseDocumentChunker[int]):
             chunk_size: Maximum chunk size in tokens
             overlap: Overlap between chunks in tokens
             tokenizer_function: Function to tokenize text
+            hash_algorithm: Algorithm used to hash chunks
         """
-        super().__init__(chunk_size=chunk_size, overlap=overlap)
+        super().__init__(chunk_size=chunk_size, overlap=overlap, hash_algorithm=hash_algorithm)
         self.tokenizer_function = tokenizer_function
 
     def create_chunks(self, text: str) -> list[list[int]]:
@@ -274,6 +326,10 @@ class TokenChunker(BaseDocumentChunker[int]):
         """
         return 1
 
+    def unit_lengths(self, units: Sequence[int]) -> np.ndarray:
+        """Return the unit lengths of ``units``: one per token."""
+        return np.ones(len(units), dtype=np.int64)
+
 
 class OpenAITokenChunker(TokenChunker):
     """Token chunker using OpenAI's tiktoken encodings."""
@@ -285,6 +341,7 @@ class OpenAITokenChunker(TokenChunker):
         overlap: int = 0,
         allowed_special: Optional[Union[Literal["all"], AbstractSet[str]]] = None,
         disallowed_special: Optional[Union[Literal["all"], Collection[str]]] = None,
+        hash_algorithm: str = "md5",
     ):
         """
         Initialize the OpenAI token chunker.
@@ -295,8 +352,9 @@ class OpenAITokenChunker(TokenChunker):
             overlap: Overlap between chunks in tokens
             allowed_special: Allowed special tokens
             disallowed_special: Disallowed special tokens
+            hash_algorithm: Algorithm used to hash chunks
         """
-        super().__init__(chunk_size=chunk_size, overlap=overlap)
+        super().__init__(chunk_size=chunk_size, overlap=overlap, hash_algorithm=hash_algorithm)
         try:
             import tiktoken
         except ImportError as exc:
@@ -310,6 +368,19 @@ class OpenAITokenChunker(TokenChunker):
         self.allowed_special = allowed_special
         self.disallowed_special = disallowed_special
 
+    def __getstate__(self) -> dict[str, Any]:
+        """Drop the encoding when pickling; it is reloaded by name in the receiver."""
+        state = self.__dict__.copy()
+        del state["_encoding"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore the chunker and reload its encoding from tiktoken's cache."""
+        import tiktoken
+
+        self.__dict__.update(state)
+        self._encoding = tiktoken.get_encoding(self.encoding_name)
+
     def _split_to_units(self, text: str) -> list[int]:
         """Split text into token IDs using tiktoken."""
         # Only pass special token arguments if they are explicitly set to non-None values
@@ -336,6 +407,7 @@ class HuggingFaceTokenChunker(TokenChunker):
         model_name: str,
         chunk_size: int = 1000,
         overlap: int = 0,
+        hash_algorithm: str = "md5",
     ):
         """
         Initialize the Hugging Face token chunker.
@@ -344,8 +416,9 @@ class HuggingFaceTokenChunker(TokenChunker):
             model_name: Hugging Face model name to load
             chunk_size: Maximum size of each chunk in tokens
             overlap: Overlap between chunks in tokens
+            hash_algorithm: Algorithm used to hash chunks
         """
-        super().__init__(chunk_size=chunk_size, overlap=overlap)
+        super().__init__(chunk_size=chunk_size, overlap=overlap, hash_algorithm=hash_algorithm)
         try:
             from transformers import AutoTokenizer
         except ImportError as exc:
@@ -357,6 +430,17 @@ class HuggingFaceTokenChunker(TokenChunker):
         self.model_name = model_name
         self._tokenizer = AutoTokenizer.from_pretrained(model_name)
 
+    def __getstate__(self) -> dict[str, Any]:
+        """Drop the tokenizer when pickling; it is reloaded by name in the receiver."""
+        state = self.__dict__.copy()
+        del state["_tokenizer"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore the chunker, loading its tokenizer once per receiving process."""
+        self.__dict__.update(state)
+        self._tokenizer = _load_huggingface_tokenizer(self.model_name)
+
     def _split_to_units(self, text: str) -> list[int]:
         """Split text into token IDs using a Hugging Face tokenizer."""
         return list(self._tokenizer.encode(text, add_special_tokens=False))
@@ -366,3 +450,11 @@ class HuggingFaceTokenChunker(TokenChunker):
         if all(isinstance(unit, int) for unit in units):
             return str(self._tokenizer.decode(list(units), clean_up_tokenization_spaces=False))
         return str(super().render_units(units))
+
+
+@cache
+def _load_huggingface_tokenizer(model_name: str) -> Any:
+    """Load a Hugging Face tokenizer once per process for unpickled chunkers."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name)
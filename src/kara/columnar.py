@@ -0,0 +1,440 @@
+"""
+Columnar chunk storage for large collections of token chunks.
+"""
+
+import os
+from array import array
+from collections import Counter
+from collections.abc import Collection, Iterable, Mapping, Sequence
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from .core import ChunkData, ChunkedDocument, DocumentId, _render_units
+from .hashing import DIGEST_SIZE, HASH_ALGORITHMS, SortedDigests, digest_to_hex
+from .storage import (
+    NATIVE_UNIT_DTYPE,
+    CollectionWriter,
+    PathOrFile,
+    chunk_columns,
+    read_columns,
+)
+
+# Digests converted to bytes at a time when streaming a mapped digest column
+_DIGEST_BLOCK = 1 << 16
+# Units converted to Python ints at a time when streaming a mapped unit buffer
+_UNIT_BLOCK = 1 << 16
+# Windows refuses to replace a file while it is memory-mapped
+_MAPPED_FILES_LOCKED = os.name == "nt"
+
+
+class ColumnarChunkedDocument(ChunkedDocument[int]):
+    """
+    Chunk collection stored as columns instead of per-chunk objects.
+
+    The collection holds one contiguous array of tagged digests, a document
+    code per chunk and offsets into a shared ``uint32`` unit buffer, so it only
+    stores integer units such as token ids. Documents are kept contiguous, in
+    order of first appearance. :class:`ChunkData` objects are materialized on
+    access and render their content from the units, while the digest
+    inventory, per-document slicing and :meth:`save`/:meth:`load` work on the
+    arrays directly.
+
+    It is interchangeable with :class:`~kara.core.ChunkedDocument`:
+    :class:`~kara.core.KARAUpdater` returns a columnar collection when updating
+    one. Each :meth:`replace_documents` call copies the columns once, so patch
+    documents in batches.
+    """
+
+    def __init__(
+        self,
+        chunks: Sequence[ChunkData[int]],
+        renderer: Optional[Callable[[Sequence[int]], Any]] = None,
+    ):
+        """
+        Initialize the collection.
+
+        Args:
+            chunks: Chunks of the collection. Chunks of a document that are not
+                contiguous are grouped at the document's first chunk.
+            renderer: Function rendering units to content, such as the chunker's
+                ``render_units``. Contents given to the chunks are not kept.
+        """
+        documents: dict[Optional[DocumentId], list[ChunkData[int]]] = {}
+        for chunk in chunks:
+            documents.setdefault(chunk.document_id, []).append(chunk)
+
+        document_ids = list(documents)
+        groups = list(documents.values())
+        digests, lengths, units = chunk_columns([chunk for group in groups for chunk in group])
+        codes = np.repeat(np.arange(len(groups), dtype=np.int64), [len(group) for group in groups])
+        self._renderer = renderer or _render_units
+        self._set_columns(digests, codes, _offsets_of(lengths), units, document_ids)
+
+    def _set_columns(
+        self,
+        digests: np.ndarray,
+        codes: np.ndarray,
+        offsets: np.ndarray,
+        units: np.ndarray,
+        document_ids: list[Optional[DocumentId]],
+        document_starts: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Store new columns and index the chunk range of every document.
+
+        ``document_starts`` lists the first chunk of every document in column
+        order, followed by the number of chunks; it is derived from the codes
+        when not given.
+        """
+        self._digests = digests
+        self._codes = codes
+        self._offsets = offsets
+        self._units = units
+        # Document id of every code; codes of removed documents are not reused
+        self._document_ids = document_ids
+        self._digest_counts_cache: Optional[dict[bytes, int]] = None
+        self._chunks = None
+        # Absolute path of the file the columns are views of
+        self._mapped_path: Optional[str] = None
+
+        if document_starts is None:
+            boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+            first = np.zeros(min(len(codes), 1), dtype=np.int64)
+            document_starts = np.concatenate((first, boundaries, [len(codes)]))
+        starts = document_starts[:-1].tolist()
+        ends = document_starts[1:].tolist()
+        self._spans: dict[Optional[DocumentId], tuple[int, int]] = {
+            document_ids[code]: (start, end)
+            for code, start, end in zip(codes[starts].tolist(), starts, ends)
+        }
+
+    @property
+    def chunks(self) -> list[ChunkData[int]]:
+        """All chunks of the collection, document by document; read-only."""
+        if self._chunks is None:
+            self._chunks = self._materialize(0, len(self._codes))
+        return self._chunks
+
+    def _materialize(self, start: int, end: int) -> list[ChunkData[int]]:
+        """Create the chunk objects of chunks ``start`` to ``end``."""
+        offsets = self._offsets[start : end + 1].tolist()
+        unit_bytes = (
+            self._units[offsets[0] : offsets[-1]].astype(NATIVE_UNIT_DTYPE, copy=False).tobytes()
+        )
+        digest_bytes = self._digests[start:end].tobytes()
+        document_ids = self._document_ids
+        codes = self._codes[start:end].tolist()
+        renderer = self._renderer
+        base = offsets[0]
+        itemsize = NATIVE_UNIT_DTYPE.itemsize
+
+        chunks: list[ChunkData[int]] = []
+        for i, code in enumerate(codes):
+            units = array("I")
+            units.frombytes(
+                unit_bytes[(offsets[i] - base) * itemsize : (offsets[i + 1] - base) * itemsize]
+            )
+            chunks.append(
+                ChunkData._from_units(
+                    units,
+                    digest_bytes[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE],
+                    document_ids[code],
+                    renderer,
+                )
+            )
+        return chunks
+
+    def __repr__(self) -> str:
+        """Represent the collection by its size."""
+        return (
+            f"ColumnarChunkedDocument(num_chunks={self.num_chunks}, "
+            f"num_documents={len(self._spans)})"
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Drop the derived chunk objects and inventory when pickling."""
+        state = super().__getstate__()
+        state["_digest_counts_cache"] = None
+        state["_mapped_path"] = None
+        return state
+
+    @property
+    def num_chunks(self) -> int:
+        """Number of chunks in the collection."""
+        return len(self._codes)
+
+    @property
+    def digest_counts(self) -> Mapping[bytes, int]:
+        """Live inventory of how many chunks carry each digest; read-only."""
+        if self._digest_counts_cache is None:
+            self._digest_counts_cache = _count_digests(self._digests)
+        return self._digest_counts_cache
+
+    def get_chunk_hashes(self) -> set[str]:
+        """Get all chunk hashes in the collection."""
+        return {digest_to_hex(digest) for digest in self.digest_counts}
+
+    def get_chunk_digests(self) -> set[bytes]:
+        """Get all raw chunk digests in the collection."""
+        return set(self.digest_counts)
+
+    def get_chunks_by_document(self, document_id: DocumentId) -> list[ChunkData[int]]:
+        """Get all chunks belonging to a specific document."""
+        span = self._spans.get(document_id)
+        return self._materialize(*span) if span else []
+
+    def get_document_ids(self) -> set[DocumentId]:
+        """Get all unique document IDs in the collection."""
+        return {document_id for document_id in self._spans if document_id is not None}
+
+    def has_document(self, document_id: DocumentId) -> bool:
+        """Check whether the collection holds chunks of a document."""
+        return document_id in self._spans
+
+    def replace_documents(
+        self, replacements: Mapping[Optional[DocumentId], Optional[list[ChunkData[int]]]]
+    ) -> None:
+        """
+        Replace the chunks of several documents.
+
+        A document's new chunks take the place of its old ones, ``None`` or an
+        empty list removes the document, and documents not yet in the
+        collection are appended in the given order. The untouched stretches of
+        the columns are copied as whole slices.
+
+        Args:
+            replacements: New chunks for every document to change, or ``None``
+        """
+        for document_id, new_chunks in replacements.items():
+            for chunk in new_chunks or ():
+                if chunk.document_id != document_id:
+                    raise ValueError(
+                        f"Chunk of document {chunk.document_id} cannot replace "
+                        f"chunks of document {document_id}."
+                    )
+
+        counts = self._digest_counts_cache
+        lengths = np.diff(self._offsets)
+        document_ids = list(self._document_ids)
+        replaced: list[tuple[int, int, int, Optional[list[ChunkData[int]]]]] = []
+        appended: list[tuple[int, list[ChunkData[int]]]] = []
+        for document_id, new_chunks in replacements.items():
+            span = self._spans.get(document_id)
+            if span is not None:
+                replaced.append((*span, int(self._codes[span[0]]), new_chunks))
+            elif new_chunks:
+                appended.append((len(document_ids), new_chunks))
+                document_ids.append(document_id)
+
+        if counts is not None:
+            for start, end, _, _ in replaced:
+                for digest in _digest_list(self._digests[start:end]):
+                    remaining = counts[digest] - 1
+                    if remaining:
+                        counts[digest] = remaining
+                    else:
+                        del counts[digest]
+            for new_chunks in replacements.values():
+                for chunk in new_chunks or ():
+                    counts[chunk.digest] = counts.get(chunk.digest, 0) + 1
+
+        # Interleave kept stretches of the columns with the replaced documents
+        pieces = [_document_columns(-1, [])]
+        position = 0
+        replaced.sort(key=lambda item: item[0])
+        for start, end, code, new_chunks in [*replaced, (self.num_chunks, 0, -1, None)]:
+            if position < start:
+                pieces.append(
+                    (
+                        self._digests[position:start],
+                        self._codes[position:start],
+                        lengths[position:start],
+                        self._units[self._offsets[position] : self._offsets[start]],
+                    )
+                )
+            if new_chunks:
+                pieces.append(_document_columns(code, new_chunks))
+            position = end
+        pieces.extend(_document_columns(code, new_chunks) for code, new_chunks in appended)
+
+        digests, codes, new_lengths, units = (np.concatenate(column) for column in zip(*pieces))
+        self._set_columns(digests, codes, _offsets_of(new_lengths), units, document_ids)
+        self._digest_counts_cache = counts
+
+    def iter_units(self) -> Iterable[Sequence[int]]:
+        """
+        Iterate over the units of every chunk, in :attr:`chunks` order.
+
+        The unit buffer is converted to Python ints a block of whole chunks at
+        a time, so a mapped collection is streamed rather than loaded.
+        """
+        offsets = self._offsets
+        num_chunks = len(offsets) - 1
+        first = 0
+        while first < num_chunks:
+            # Chunks starting within a block of units, and at least one
+            last = int(np.searchsorted(offsets, offsets[first] + _UNIT_BLOCK, side="right")) - 1
+            last = min(max(last, first + 1), num_chunks)
+            block_offsets = (offsets[first : last + 1] - offsets[first]).tolist()
+            units = self._units[offsets[first] : offsets[last]].tolist()
+            for i in range(last - first):
+                yield units[block_offsets[i] : block_offsets[i + 1]]
+            first = last
+
+    def iter_digests(self) -> Iterable[bytes]:
+        """Iterate over the digest of every chunk, reading the column in blocks."""
+        return (
+            digest
+            for start in range(0, len(self._digests), _DIGEST_BLOCK)
+            for digest in _digest_list(self._digests[start : start + _DIGEST_BLOCK])
+        )
+
+    def iter_document_digests(self) -> Iterable[tuple[Optional[DocumentId], list[bytes]]]:
+        """Iterate over every document id with the digests of its chunks, in order."""
+        return (
+            (document_id, _digest_list(self._digests[start:end]))
+            for document_id, (start, end) in self._spans.items()
+        )
+
+    def get_hash_algorithms(self) -> set[str]:
+        """Get the algorithms the chunk hashes were computed with."""
+        tags = self._digests.view(np.uint8).reshape(-1, DIGEST_SIZE)[:, 0]
+        return {HASH_ALGORITHMS[tag] for tag in np.unique(tags).tolist()}
+
+    def _exact_digests(self) -> Collection[bytes]:
+        """
+        Return the digests of the collection for exact membership tests.
+
+        Unless the inventory is already built, the digest column is sorted
+        instead, which takes a fraction of the memory of a dictionary.
+        """
+        if self._digest_counts_cache is not None:
+            return self._digest_counts_cache
+        return SortedDigests(self._digests)
+
+    def _check_replaceable(self, file: PathOrFile) -> None:
+        """Reject replacing the file the columns are mapped from where it is locked."""
+        if (
+            _MAPPED_FILES_LOCKED
+            and self._mapped_path is not None
+            and isinstance(file, (str, os.PathLike))
+            and os.path.abspath(file) == self._mapped_path
+        ):
+            raise ValueError(
+                f"Cannot replace {self._mapped_path} while the collection is memory-mapped "
+                "from it on Windows. Write to another path, or load the collection from "
+                "an open file to read it into memory."
+            )
+
+    def _with_chunks(self, chunks: list[ChunkData[int]]) -> "ColumnarChunkedDocument":
+        """Create a columnar collection with the same renderer holding ``chunks``."""
+        return ColumnarChunkedDocument(chunks, renderer=self._renderer)
+
+    @classmethod
+    def from_collection(
+        cls,
+        collection: ChunkedDocument[int],
+        renderer: Optional[Callable[[Sequence[int]], Any]] = None,
+    ) -> "ColumnarChunkedDocument":
+        """
+        Convert a collection of token chunks to columnar storage.
+
+        Args:
+            collection: Collection whose chunks hold integer units
+            renderer: Function rendering units to content
+
+        Returns:
+            ColumnarChunkedDocument with the same chunks
+        """
+        return cls(collection.chunks, renderer=renderer)
+
+    def to_collection(self) -> ChunkedDocument[int]:
+        """Convert the collection to a :class:`~kara.core.ChunkedDocument`."""
+        return ChunkedDocument(chunks=self.chunks)
+
+    def save(self, file: PathOrFile) -> None:
+        """
+        Save the collection in the binary format of :mod:`kara.storage`.
+
+        Document ids must be integers or strings. The renderer is not saved.
+
+        Args:
+            file: Path or binary file object to write to. A path is replaced
+                only once the file is complete.
+
+        Raises:
+            ValueError: On Windows, if ``file`` is the path the collection is
+                memory-mapped from
+        """
+        self._check_replaceable(file)
+        lengths = np.diff(self._offsets)
+        with CollectionWriter(file) as writer:
+            for document_id, (start, end) in self._spans.items():
+                writer.add_columns(
+                    document_id,
+                    self._digests[start:end],
+                    lengths[start:end],
+                    self._units[self._offsets[start] : self._offsets[end]],
+                )
+
+    @classmethod
+    def load(
+        cls,
+        file: PathOrFile,
+        renderer: Optional[Callable[[Sequence[int]], Any]] = None,
+    ) -> "ColumnarChunkedDocument":
+        """
+        Load a collection written by :meth:`save` or a :class:`~kara.storage.CollectionWriter`.
+
+        A path is memory-mapped read-only: the columns are views of the file,
+        so loading takes time proportional to the number of documents rather
+        than chunks, and pages are read as they are accessed. Patching the
+        collection copies the columns into memory.
+
+        Args:
+            file: Path or binary file object to read from
+            renderer: Function rendering units to content
+
+        Returns:
+            ColumnarChunkedDocument with the saved chunks
+        """
+        columns = read_columns(file)
+        collection: ColumnarChunkedDocument = cls.__new__(cls)
+        collection._renderer = renderer or _render_units
+        collection._set_columns(
+            columns.digests,
+            columns.codes,
+            columns.offsets,
+            columns.units,
+            columns.document_ids,
+            columns.document_starts,
+        )
+        if isinstance(file, (str, os.PathLike)):
+            collection._mapped_path = os.path.abspath(file)
+        return collection
+
+
+def _offsets_of(lengths: np.ndarray) -> np.ndarray:
+    """Return the offsets of chunks with ``lengths`` units into their unit buffer."""
+    return np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+
+def _document_columns(
+    code: int, chunks: Sequence[ChunkData[int]]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the digest, code, unit count and unit columns of a document's chunks."""
+    digests, lengths, units = chunk_columns(chunks)
+    return digests, np.full(len(chunks), code, dtype=np.int64), lengths, units
+
+
+def _digest_list(digests: np.ndarray) -> list[bytes]:
+    """Convert a digest column to a list of digests."""
+    raw = digests.tobytes()
+    return [raw[i : i + DIGEST_SIZE] for i in range(0, len(raw), DIGEST_SIZE)]
+
+
+def _count_digests(digests: np.ndarray) -> dict[bytes, int]:
+    """Count the chunks carrying each digest of a digest column."""
+    # Hashing the sliced digests beats np.unique on 17-byte voids plus a dict build
+    return dict(Counter(_digest_list(digests)))
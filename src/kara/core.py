@@ -2,47 +2,233 @@
 Core KARA algorithm implementation.
 """
 
-import hashlib
+import bisect
 import heapq
 import json
+import os
 import sys
 import warnings
-from collections.abc import Sequence
-from dataclasses import dataclass
-from typing import Any, Callable, Generic, Optional, TypeVar
-
-from .chunkers import BaseDocumentChunker
+from array import array
+from collections import Counter, deque
+from collections.abc import (
+    AsyncIterator,
+    Awaitable,
+    Collection,
+    Container,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import chain, groupby
+from operator import attrgetter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generic,
+    Literal,
+    NamedTuple,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
+
+from .accounting import MIN_MEMORY_BUDGET, DigestRuns, count_operations
+from .chunkers import BaseDocumentChunker, prefix_lengths, serialize_unit
+from .hashing import (
+    DIGEST_SIZE,
+    LEGACY_HASH_ALGORITHM,
+    BloomFilter,
+    LengthIndex,
+    OccurrenceIndex,
+    PrefilteredDigests,
+    SortedOccurrenceIndex,
+    SpanHasher,
+    digest_algorithm,
+    digest_from_hex,
+    digest_to_hex,
+    fingerprint_units,
+    get_hash_function,
+)
+
+if TYPE_CHECKING:
+    from .cache import EmbeddingCache
 
 T = TypeVar("T")
 
+# Stable document identifier; update_collection numbers documents by position
+DocumentId = Union[int, str]
+
+# Stored chunk: (hash or raw digest, document id, unit count[, first unit, fingerprint])
+HashRecord = Union[
+    tuple[Union[str, bytes], Optional[DocumentId], int],
+    tuple[Union[str, bytes], Optional[DocumentId], int, Any, int],
+]
+
+# Location of a chunk: (document id, position among the document's chunks)
+ChunkRef = tuple[Optional[DocumentId], int]
+
+# Source of reuse candidates: an occurrence index of the old chunks, or their
+# lengths when only hashes and lengths were kept
+ReuseIndex = Union[OccurrenceIndex[T], SortedOccurrenceIndex[T], LengthIndex[T]]
+
+# Batches submitted per worker in parallel updates, to balance uneven documents
+_BATCHES_PER_WORKER = 4
+
 
-@dataclass
 class ChunkData(Generic[T]):
-    """Represents a chunk with its content and metadata."""
+    """
+    Represents a chunk with its content and metadata.
 
-    content: Any
-    splits: list[T]
-    hash: str
-    document_id: Optional[int] = None
+    Chunks are compact records: integer units (token ids) are stored as an
+    ``array('I')`` rather than a list of boxed ints, and content created by
+    :meth:`from_splits` is rendered from the units on every access instead of
+    being kept next to them. The chunk hash is kept as a compact tagged digest
+    (see :mod:`kara.hashing`); :attr:`hash` formats it as a hex string.
+    """
+
+    __slots__ = ("_content", "_units", "_renderer", "digest", "document_id")
+
+    def __init__(
+        self,
+        content: Any,
+        splits: Sequence[T],
+        digest: Union[bytes, str, None] = None,
+        document_id: Optional[DocumentId] = None,
+        renderer: Optional[Callable[[Sequence[T]], Any]] = None,
+        *,
+        hash: Optional[str] = None,
+    ):
+        """
+        Initialize the chunk.
+
+        Args:
+            content: Rendered content, or ``None`` to render it with ``renderer``
+            splits: Units of the chunk
+            digest: Tagged digest of the serialized units, or a hex hash as
+                formatted by :attr:`hash`. An untagged 16-byte digest is taken
+                as MD5, like an unprefixed hex hash.
+            document_id: Document the chunk belongs to
+            renderer: Function rendering units to content, used when ``content``
+                is ``None``
+            hash: Hex hash of the chunk, accepted instead of ``digest`` as in
+                earlier versions
+
+        Raises:
+            TypeError: If neither or both of ``digest`` and ``hash`` are given,
+                or the digest is neither bytes nor a string
+            ValueError: If the digest has the wrong size or the hash cannot be
+                parsed
+        """
+        if hash is not None:
+            if digest is not None:
+                raise TypeError("Pass either digest or hash, not both.")
+            digest = hash
+        self._content = content
+        self._units: Sequence[T] = _compact_units(splits)
+        self._renderer = renderer
+        self.digest = _as_digest(digest)
+        self.document_id = document_id
+
+    @property
+    def content(self) -> Any:
+        """Content of the chunk, rendered from its units unless it was given."""
+        if self._content is None and self._renderer is not None:
+            return self._renderer(self._units)
+        return self._content
+
+    @property
+    def splits(self) -> list[T]:
+        """Units of the chunk, as a new list."""
+        return list(self._units)
+
+    @property
+    def units(self) -> Sequence[T]:
+        """Units of the chunk in their compact storage; read-only."""
+        return self._units
+
+    @property
+    def hash(self) -> str:
+        """Hex hash of the chunk, prefixed with its algorithm unless it is MD5."""
+        return digest_to_hex(self.digest)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare chunks by content, units, digest and document id."""
+        if not isinstance(other, ChunkData):
+            return NotImplemented
+        return (
+            self.digest == other.digest
+            and self.document_id == other.document_id
+            and list(self._units) == list(other._units)
+            and self.content == other.content
+        )
+
+    def __repr__(self) -> str:
+        """Represent the chunk by its fields."""
+        return (
+            f"ChunkData(content={self.content!r}, splits={self.splits!r}, "
+            f"digest={self.digest!r}, document_id={self.document_id!r})"
+        )
+
+    def __getstate__(self) -> tuple[Any, ...]:
+        """
+        Pickle the rendered content instead of a chunker's renderer.
+
+        Renderers are usually bound methods of a chunker, which may hold a
+        tokenizer or a function that cannot be pickled.
+        """
+        content, renderer = self._content, self._renderer
+        if content is None and renderer is not None and renderer is not _render_units:
+            content, renderer = renderer(self._units), None
+        return content, self._units, renderer, self.digest, self.document_id
+
+    def __setstate__(self, state: tuple[Any, ...]) -> None:
+        """Restore a pickled chunk."""
+        self._content, self._units, self._renderer, self.digest, self.document_id = state
+
+    def _clone(self, digest: bytes, document_id: Optional[DocumentId]) -> "ChunkData[T]":
+        """Copy the chunk with another digest or document id, sharing its units."""
+        clone: ChunkData[T] = ChunkData.__new__(ChunkData)
+        clone._content = self._content
+        clone._units = self._units
+        clone._renderer = self._renderer
+        clone.digest = digest
+        clone.document_id = document_id
+        return clone
+
+    @classmethod
+    def _from_units(
+        cls,
+        units: Sequence[T],
+        digest: bytes,
+        document_id: Optional[DocumentId],
+        renderer: Optional[Callable[[Sequence[T]], Any]],
+    ) -> "ChunkData[T]":
+        """Create a chunk rendered from units that are already in compact storage."""
+        chunk: ChunkData[T] = cls.__new__(cls)
+        chunk._content = None
+        chunk._units = units
+        chunk._renderer = renderer
+        chunk.digest = digest
+        chunk.document_id = document_id
+        return chunk
 
     @classmethod
     def from_splits(
         cls,
         splits: Sequence[T],
-        document_id: Optional[int] = None,
+        document_id: Optional[DocumentId] = None,
         serializer: Optional[Callable[[Sequence[T]], bytes]] = None,
         renderer: Optional[Callable[[Sequence[T]], Any]] = None,
+        hasher: Optional[Callable[[bytes], bytes]] = None,
     ) -> "ChunkData[T]":
-        """Create ChunkData from splits."""
-        content: Any
-        if renderer is None:
-            if all(isinstance(unit, str) for unit in splits):
-                content = "".join(splits)  # type: ignore
-            else:
-                content = list(splits)
-        else:
-            content = renderer(splits)
-
+        """Create ChunkData from splits, digested with ``hasher`` (MD5 by default)."""
         if serializer is None:
             if all(isinstance(unit, str) for unit in splits):
                 serialized = "".join(splits).encode("utf-8")  # type: ignore
@@ -53,35 +239,261 @@ class ChunkData(Generic[T]):
         else:
             serialized = serializer(splits)
 
-        hash_value = hashlib.md5(serialized).hexdigest()
-        return cls(content=content, splits=list(splits), hash=hash_value, document_id=document_id)
+        if hasher is None:
+            hasher = get_hash_function(LEGACY_HASH_ALGORITHM)
+        return cls(
+            content=None,
+            splits=splits,
+            digest=hasher(serialized),
+            document_id=document_id,
+            renderer=renderer or _render_units,
+        )
+
+
+def _as_digest(digest: Union[bytes, str, None]) -> bytes:
+    """Validate a chunk digest, parsing hex hashes and tagging bare MD5 digests."""
+    if type(digest) is bytes and len(digest) == DIGEST_SIZE:
+        return digest
+    if digest is None:
+        raise TypeError("A chunk digest or hash is required.")
+    if isinstance(digest, str):
+        hash_value = digest
+        try:
+            digest = digest_from_hex(hash_value)
+        except ValueError as e:
+            raise ValueError(f"Invalid chunk hash {hash_value!r}: {e}") from e
+        if len(digest) != DIGEST_SIZE:
+            raise ValueError(
+                f"Invalid chunk hash {hash_value!r}: expected {DIGEST_SIZE - 1} digest bytes."
+            )
+        return digest
+    if not isinstance(digest, (bytes, bytearray, memoryview)):
+        raise TypeError(
+            f"Chunk digest must be bytes or a hex hash string, got {type(digest).__name__}."
+        )
+    digest = bytes(digest)
+    if len(digest) == DIGEST_SIZE:
+        return digest
+    if len(digest) == DIGEST_SIZE - 1:
+        return digest_from_hex(digest.hex())
+    raise ValueError(
+        f"Chunk digests must be {DIGEST_SIZE} bytes with their algorithm tag, "
+        f"or {DIGEST_SIZE - 1} bytes of MD5; got {len(digest)} bytes."
+    )
+
+
+def _compact_units(units: Sequence[T]) -> Sequence[T]:
+    """Store token ids as a 32-bit array and any other units as a list."""
+    if units and type(units[0]) is int:
+        try:
+            return array("I", units)  # type: ignore[arg-type, type-var]
+        except (OverflowError, TypeError):
+            pass
+    return list(units)
+
+
+def _render_units(units: Sequence[Any]) -> Any:
+    """Render units the way chunks without a chunker renderer always have."""
+    if all(isinstance(unit, str) for unit in units):
+        return "".join(units)
+    return list(units)
 
 
-@dataclass
 class ChunkedDocument(Generic[T]):
-    """Represents the current state of the document collection."""
+    """
+    Represents the current state of the document collection.
+
+    Chunks are stored per document, in order of first appearance, alongside a
+    digest -> count inventory, so per-document access and hash lookups do not
+    scan the whole collection. The flat :attr:`chunks` list is rebuilt on
+    access after a change. Modify the collection through
+    :meth:`replace_document`, :meth:`remove_document` or
+    :meth:`replace_documents` so that patches only touch the changed documents.
+    """
 
-    chunks: list[ChunkData[T]]
+    def __init__(self, chunks: list[ChunkData[T]]):
+        """
+        Initialize the collection.
+
+        Args:
+            chunks: Chunks of the collection. Chunks of a document that are not
+                contiguous are grouped at the document's first chunk.
+        """
+        self._documents: dict[Optional[DocumentId], list[ChunkData[T]]] = {}
+        num_groups = 0
+        for document_id, group in groupby(chunks, key=attrgetter("document_id")):
+            self._documents.setdefault(document_id, []).extend(group)
+            num_groups += 1
+        self._digest_counts: dict[bytes, int] = dict(Counter(chunk.digest for chunk in chunks))
+        self._num_chunks = len(chunks)
+
+        # Flat view of the chunks, kept as given when documents are contiguous
+        self._chunks: Optional[list[ChunkData[T]]] = (
+            list(chunks) if num_groups == len(self._documents) else None
+        )
+
+    @property
+    def chunks(self) -> list[ChunkData[T]]:
+        """All chunks of the collection, document by document; read-only."""
+        if self._chunks is None:
+            self._chunks = list(chain.from_iterable(self._documents.values()))
+        return self._chunks
+
+    def __eq__(self, other: object) -> bool:
+        """Compare collections by their chunks."""
+        if not isinstance(other, ChunkedDocument):
+            return NotImplemented
+        return self.chunks == other.chunks
+
+    def __repr__(self) -> str:
+        """Represent the collection by its chunks."""
+        return f"ChunkedDocument(chunks={self.chunks!r})"
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Drop the flat chunk view when pickling; it is rebuilt on access."""
+        state = self.__dict__.copy()
+        state["_chunks"] = None
+        return state
+
+    @property
+    def num_chunks(self) -> int:
+        """Number of chunks in the collection."""
+        return self._num_chunks
+
+    @property
+    def digest_counts(self) -> Mapping[bytes, int]:
+        """Live inventory of how many chunks carry each digest; read-only."""
+        return self._digest_counts
 
     def get_chunk_hashes(self) -> set[str]:
         """Get all chunk hashes in the collection."""
-        return {chunk.hash for chunk in self.chunks}
+        return {digest_to_hex(digest) for digest in self._digest_counts}
 
-    def get_chunks_by_document(self, document_id: int) -> list[ChunkData[T]]:
+    def get_chunk_digests(self) -> set[bytes]:
+        """Get all raw chunk digests in the collection."""
+        return set(self._digest_counts)
+
+    def get_chunks_by_document(self, document_id: DocumentId) -> list[ChunkData[T]]:
         """Get all chunks belonging to a specific document."""
-        return [chunk for chunk in self.chunks if chunk.document_id == document_id]
+        return list(self._documents.get(document_id, ()))
 
-    def get_document_ids(self) -> set[int]:
+    def get_document_ids(self) -> set[DocumentId]:
         """Get all unique document IDs in the collection."""
-        return {chunk.document_id for chunk in self.chunks if chunk.document_id is not None}
+        return {document_id for document_id in self._documents if document_id is not None}
+
+    def has_document(self, document_id: DocumentId) -> bool:
+        """Check whether the collection holds chunks of a document."""
+        return document_id in self._documents
+
+    def replace_document(self, document_id: DocumentId, chunks: list[ChunkData[T]]) -> None:
+        """
+        Replace the chunks of a document, appending it if it is new.
+
+        Args:
+            document_id: Document whose chunks to replace
+            chunks: New chunks of the document
+        """
+        self.replace_documents({document_id: chunks})
+
+    def remove_document(self, document_id: DocumentId) -> None:
+        """Remove all chunks of a document."""
+        self.replace_documents({document_id: None})
+
+    def replace_documents(
+        self, replacements: Mapping[Optional[DocumentId], Optional[list[ChunkData[T]]]]
+    ) -> None:
+        """
+        Replace the chunks of several documents.
+
+        A document's new chunks take the place of its old ones, ``None`` or an
+        empty list removes the document, and documents not yet in the
+        collection are appended in the given order. Only the replaced
+        documents are visited.
+
+        Args:
+            replacements: New chunks for every document to change, or ``None``
+        """
+        for document_id, new_chunks in replacements.items():
+            for chunk in new_chunks or ():
+                if chunk.document_id != document_id:
+                    raise ValueError(
+                        f"Chunk of document {chunk.document_id} cannot replace "
+                        f"chunks of document {document_id}."
+                    )
+
+        counts = self._digest_counts
+        for document_id, new_chunks in replacements.items():
+            old_chunks = self._documents.get(document_id, ())
+            self._num_chunks += len(new_chunks or ()) - len(old_chunks)
+            for chunk in old_chunks:
+                remaining = counts[chunk.digest] - 1
+                if remaining:
+                    counts[chunk.digest] = remaining
+                else:
+                    del counts[chunk.digest]
+            if new_chunks:
+                for chunk in new_chunks:
+                    counts[chunk.digest] = counts.get(chunk.digest, 0) + 1
+                self._documents[document_id] = list(new_chunks)
+            else:
+                self._documents.pop(document_id, None)
+        self._chunks = None
+
+    def iter_units(self) -> Iterable[Sequence[T]]:
+        """Iterate over the units of every chunk, in :attr:`chunks` order."""
+        return (chunk.units for chunk in self.chunks)
+
+    def iter_digests(self) -> Iterable[bytes]:
+        """Iterate over the digest of every chunk, in :attr:`chunks` order."""
+        return (chunk.digest for chunk in self.chunks)
+
+    def iter_document_digests(self) -> Iterable[tuple[Optional[DocumentId], list[bytes]]]:
+        """Iterate over every document id with the digests of its chunks, in order."""
+        return (
+            (document_id, [chunk.digest for chunk in chunks])
+            for document_id, chunks in self._documents.items()
+        )
 
     def get_chunk_contents(self) -> list[Any]:
         """Get all chunk contents."""
         return [chunk.content for chunk in self.chunks]
 
+    def get_hash_algorithms(self) -> set[str]:
+        """Get the algorithms the chunk hashes were computed with."""
+        return {digest_algorithm(digest) for digest in self._digest_counts}
+
+    def _exact_digests(self) -> Collection[bytes]:
+        """Return the digests of the collection for exact membership tests."""
+        return self._digest_counts
+
+    def rehash(self, chunker: BaseDocumentChunker[T]) -> "ChunkedDocument[T]":
+        """
+        Rehash every chunk with the chunker's hash algorithm.
+
+        Use this to migrate a stored collection after changing the hash
+        algorithm; contents, splits and document ids are kept.
+
+        Args:
+            chunker: Chunker whose serialization and hash algorithm to use
+
+        Returns:
+            New ChunkedDocument with rehashed chunks
+        """
+        hash_units = chunker.hash_units
+        return self._with_chunks(
+            [chunk._clone(hash_units(chunk.units), chunk.document_id) for chunk in self.chunks]
+        )
+
+    def _with_chunks(self, chunks: list[ChunkData[T]]) -> "ChunkedDocument[T]":
+        """Create a collection of the same storage kind holding ``chunks``."""
+        return ChunkedDocument(chunks=chunks)
+
     @classmethod
     def from_chunks(
-        cls, chunks: list[Any], chunker: BaseDocumentChunker[T], document_id: Optional[int] = None
+        cls,
+        chunks: list[Any],
+        chunker: BaseDocumentChunker[T],
+        document_id: Optional[DocumentId] = None,
     ) -> "ChunkedDocument[T]":
         """Create a :class:`ChunkedDocument` from pre-split chunks.
 
@@ -101,6 +513,8 @@ class ChunkedDocument(Generic[T]):
             stacklevel=2,
         )
         result = []
+        # One bound renderer shared by every chunk
+        render_units = chunker.render_units
         for chunk in chunks:
             splits = chunker.normalize_chunk(chunk)
             chunk_length = sum(chunker.unit_length(unit) for unit in splits)
@@ -114,27 +528,377 @@ class ChunkedDocument(Generic[T]):
                     splits,
                     document_id,
                     serializer=chunker.serialize_units,
-                    renderer=chunker.render_units,
+                    renderer=render_units,
+                    hasher=chunker.hash_function,
                 )
             )
         return cls(chunks=result)
 
 
+class CollectionState:
+    """
+    Hash-only state of a collection, for updates that need no chunk contents.
+
+    Only a digest -> count inventory and, for every document, the digest, unit
+    count, first unit and span fingerprint of its chunks in order are kept;
+    contents and other units are dropped. :meth:`KARAUpdater.update_collection`
+    accepts it in place of a :class:`ChunkedDocument`, locating old chunks
+    through an occurrence index of the stored fingerprints, and returns the new
+    chunks as a :class:`ChunkedDocument`. Incremental mode has no old units to
+    anchor on and solves whole documents.
+
+    Example:
+        >>> state = CollectionState.from_collection(result.new_chunked_doc)
+        >>> result = updater.update_collection(state, documents)
+        >>> state = CollectionState.from_collection(result.new_chunked_doc)
+    """
+
+    def __init__(self, chunks: Iterable[ChunkData[Any]] = ()):
+        """
+        Initialize the state.
+
+        Args:
+            chunks: Chunks to record. Chunks of a document that are not
+                contiguous are grouped at the document's first chunk.
+        """
+        documents: dict[Optional[DocumentId], list[ChunkData[Any]]] = {}
+        for chunk in chunks:
+            documents.setdefault(chunk.document_id, []).append(chunk)
+
+        self._documents: dict[Optional[DocumentId], _RecordedDocument] = {}
+        self._digest_counts: dict[bytes, int] = {}
+        self._length_counts: Counter[int] = Counter()
+        self._num_chunks = 0
+        # Chunks recorded without a fingerprint, which the occurrence index cannot hold
+        self._num_unindexed = 0
+        self.replace_documents(documents)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare states by the digests and unit counts of their documents."""
+        if not isinstance(other, CollectionState):
+            return NotImplemented
+        return {key: document[:2] for key, document in self._documents.items()} == {
+            key: document[:2] for key, document in other._documents.items()
+        }
+
+    def __repr__(self) -> str:
+        """Represent the state by its size."""
+        return (
+            f"CollectionState(num_chunks={self._num_chunks}, num_documents={len(self._documents)})"
+        )
+
+    @property
+    def num_chunks(self) -> int:
+        """Number of chunks in the collection."""
+        return self._num_chunks
+
+    @property
+    def digest_counts(self) -> Mapping[bytes, int]:
+        """Live inventory of how many chunks carry each digest; read-only."""
+        return self._digest_counts
+
+    def get_chunk_hashes(self) -> set[str]:
+        """Get all chunk hashes in the collection."""
+        return {digest_to_hex(digest) for digest in self._digest_counts}
+
+    def get_chunk_digests(self) -> set[bytes]:
+        """Get all raw chunk digests in the collection."""
+        return set(self._digest_counts)
+
+    def get_document_digests(self, document_id: DocumentId) -> list[bytes]:
+        """Get the digests of a document's chunks, in order."""
+        document = self._documents.get(document_id)
+        return _split_digests(document[0]) if document else []
+
+    def iter_digests(self) -> Iterable[bytes]:
+        """Iterate over the digest of every chunk, document by document."""
+        return (
+            digest
+            for document in self._documents.values()
+            for digest in _split_digests(document[0])
+        )
+
+    def iter_document_digests(self) -> Iterable[tuple[Optional[DocumentId], list[bytes]]]:
+        """Iterate over every document id with the digests of its chunks, in order."""
+        return (
+            (document_id, _split_digests(document[0]))
+            for document_id, document in self._documents.items()
+        )
+
+    def get_document_ids(self) -> set[DocumentId]:
+        """Get all unique document IDs in the collection."""
+        return {document_id for document_id in self._documents if document_id is not None}
+
+    def has_document(self, document_id: DocumentId) -> bool:
+        """Check whether the collection holds chunks of a document."""
+        return document_id in self._documents
+
+    def get_chunk_lengths(self) -> set[int]:
+        """Get the distinct unit counts of the chunks."""
+        return set(self._length_counts)
+
+    def get_hash_algorithms(self) -> set[str]:
+        """Get the algorithms the chunk hashes were computed with."""
+        return {digest_algorithm(digest) for digest in self._digest_counts}
+
+    def _exact_digests(self) -> Collection[bytes]:
+        """Return the digests of the collection for exact membership tests."""
+        return self._digest_counts
+
+    def replace_document(self, document_id: DocumentId, chunks: list[ChunkData[Any]]) -> None:
+        """Record the new chunks of a document, appending it if it is new."""
+        self.replace_documents({document_id: chunks})
+
+    def remove_document(self, document_id: DocumentId) -> None:
+        """Remove all chunks of a document."""
+        self.replace_documents({document_id: None})
+
+    def replace_documents(
+        self, replacements: Mapping[Optional[DocumentId], Optional[list[ChunkData[Any]]]]
+    ) -> None:
+        """
+        Record the new chunks of several documents.
+
+        As in :meth:`ChunkedDocument.replace_documents`, ``None`` or an empty
+        list removes a document and new documents are appended.
+
+        Args:
+            replacements: New chunks for every document to change, or ``None``
+        """
+        for document_id, new_chunks in replacements.items():
+            for chunk in new_chunks or ():
+                if chunk.document_id != document_id:
+                    raise ValueError(
+                        f"Chunk of document {chunk.document_id} cannot replace "
+                        f"chunks of document {document_id}."
+                    )
+
+        for document_id, new_chunks in replacements.items():
+            chunks = new_chunks or ()
+            self._replace(
+                document_id,
+                b"".join(chunk.digest for chunk in chunks),
+                array("I", [len(chunk.units) for chunk in chunks]),
+                _compact_units([chunk.units[0] if chunk.units else None for chunk in chunks]),
+                array("Q", [fingerprint_units(chunk.units, serialize_unit) for chunk in chunks]),
+            )
+
+    def _replace(
+        self,
+        document_id: Optional[DocumentId],
+        digests: bytes,
+        lengths: array,
+        first_units: Optional[Sequence[Any]] = None,
+        fingerprints: Optional[array] = None,
+    ) -> None:
+        """
+        Replace a document's chunk records, removing it if there are none.
+
+        Without ``first_units`` and ``fingerprints``, the chunks cannot be put
+        in an occurrence index.
+        """
+        old = self._documents.pop(document_id, None)
+        if old is not None:
+            self._record(old, -1)
+        if lengths:
+            document = _RecordedDocument(digests, lengths, first_units, fingerprints)
+            self._documents[document_id] = document
+            self._record(document, 1)
+
+    def _record(self, document: "_RecordedDocument", sign: int) -> None:
+        """Add a document's chunks to the inventory, or remove them when ``sign`` is -1."""
+        digests, lengths, _, fingerprints = document
+        if fingerprints is None:
+            self._num_unindexed += sign * len(lengths)
+        counts = self._digest_counts
+        for digest in _split_digests(digests):
+            remaining = counts.get(digest, 0) + sign
+            if remaining:
+                counts[digest] = remaining
+            else:
+                del counts[digest]
+        length_counts = self._length_counts
+        for length in lengths:
+            remaining = length_counts[length] + sign
+            if remaining:
+                length_counts[length] = remaining
+            else:
+                del length_counts[length]
+        self._num_chunks += sign * len(lengths)
+
+    def _occurrence_index(self, compact: bool = False) -> Optional["ReuseIndex[Any]"]:
+        """
+        Index the recorded chunk fingerprints, or return ``None`` if some are missing.
+
+        ``compact`` builds a :class:`~kara.hashing.SortedOccurrenceIndex`.
+        """
+        if self._num_unindexed:
+            return None
+        chunks = (
+            (first_unit, length, fingerprint)
+            for document in self._documents.values()
+            for first_unit, length, fingerprint in zip(
+                document.first_units or (), document.lengths, document.fingerprints or ()
+            )
+            if length
+        )
+        if compact:
+            return SortedOccurrenceIndex(chunks, serialize_unit)
+        index: OccurrenceIndex[Any] = OccurrenceIndex(serialize_unit)
+        for first_unit, length, fingerprint in chunks:
+            index.add_fingerprint(first_unit, length, fingerprint)
+        return index
+
+    def _with_chunks(self, chunks: list[ChunkData[T]]) -> ChunkedDocument[T]:
+        """Create a :class:`ChunkedDocument` of the chunks of an update."""
+        return ChunkedDocument(chunks=chunks)
+
+    @classmethod
+    def from_collection(cls, collection: ChunkedDocument[Any]) -> "CollectionState":
+        """Record the hashes and lengths of a collection's chunks."""
+        return cls(collection.chunks)
+
+    @classmethod
+    def from_records(cls, records: Iterable[HashRecord]) -> "CollectionState":
+        """
+        Rebuild a state from stored chunk records, without the chunks themselves.
+
+        Records are ``(hash, document_id, length)`` or ``(hash, document_id,
+        length, first_unit, fingerprint)`` tuples, such as those kept in
+        vector-store metadata next to every embedded chunk, listed in chunk
+        order within each document; :meth:`to_records` produces the latter.
+        Nothing is re-tokenized or re-hashed, so rehydration is bound by
+        reading the records.
+
+        Args:
+            records: Chunk hash (a hex string as in :attr:`ChunkData.hash`, or a
+                raw digest), document id, the chunk's unit count and, optionally,
+                its first unit and unit fingerprint. Without fingerprints,
+                updates hash every span of a recorded length.
+
+        Returns:
+            CollectionState of the recorded chunks
+
+        Raises:
+            ValueError: If a record has no unit count or an invalid hash
+        """
+        documents: dict[Optional[DocumentId], tuple[list[bytes], array, list[Any], array]] = {}
+        for record in records:
+            if len(record) not in (3, 5) or record[2] is None:
+                raise ValueError(
+                    "Chunk records must be (hash, document_id, length) or (hash, "
+                    f"document_id, length, first_unit, fingerprint) tuples, got {record!r}."
+                )
+            hash_value, document_id, length, *indexed = record
+            digests, lengths, first_units, fingerprints = documents.setdefault(
+                document_id, ([], array("I"), [], array("Q"))
+            )
+            digests.append(_as_digest(hash_value))
+            lengths.append(length)
+            if indexed:
+                first_units.append(indexed[0])
+                fingerprints.append(indexed[1])
+
+        state = cls()
+        for document_id, (digests, lengths, first_units, fingerprints) in documents.items():
+            if len(fingerprints) == len(lengths):
+                state._replace(
+                    document_id,
+                    b"".join(digests),
+                    lengths,
+                    _compact_units(first_units),
+                    fingerprints,
+                )
+            else:
+                state._replace(document_id, b"".join(digests), lengths)
+        return state
+
+    def to_records(self) -> Iterator[HashRecord]:
+        """
+        Iterate over a record of every chunk for :meth:`from_records`.
+
+        Records are yielded document by document, in chunk order, as
+        ``(hash, document_id, length, first_unit, fingerprint)`` tuples of
+        JSON-compatible values for units that are; chunks recorded without a
+        fingerprint yield ``(hash, document_id, length)``.
+        """
+        for document_id, document in self._documents.items():
+            hashes = map(digest_to_hex, _split_digests(document.digests))
+            if document.first_units is None or document.fingerprints is None:
+                for hash_value, length in zip(hashes, document.lengths):
+                    yield hash_value, document_id, length
+                continue
+            chunks = zip(hashes, document.lengths, document.first_units, document.fingerprints)
+            for hash_value, length, first_unit, fingerprint in chunks:
+                yield hash_value, document_id, length, first_unit, fingerprint
+
+
+class _RecordedDocument(NamedTuple):
+    """Chunk records of a document in a :class:`CollectionState`, in chunk order."""
+
+    digests: bytes
+    lengths: array
+    # First unit and span fingerprint of every chunk, unless rehydrated without them
+    first_units: Optional[Sequence[Any]]
+    fingerprints: Optional[array]
+
+
+def _split_digests(digests: bytes) -> list[bytes]:
+    """Split concatenated tagged digests."""
+    return [digests[i : i + DIGEST_SIZE] for i in range(0, len(digests), DIGEST_SIZE)]
+
+
+@dataclass
+class ChunkDelta:
+    """
+    Chunk-level changes of an update.
+
+    New chunks are referenced by their position in the new collection and old
+    chunks by their position in the old one. Each reused chunk maps to a
+    distinct old chunk with the same digest, preferably one of its own
+    document, so its stored embedding and vector id can be kept.
+
+    Attributes:
+        added: New chunks to embed, document by document
+        deleted: Old chunks to delete, document by document
+        reused: Old chunk kept for every reused new chunk
+    """
+
+    added: list[ChunkRef] = field(default_factory=list)
+    deleted: list[ChunkRef] = field(default_factory=list)
+    reused: dict[ChunkRef, ChunkRef] = field(default_factory=dict)
+
+
 @dataclass
 class UpdateResult(Generic[T]):
-    """Result of a KARA update operation."""
+    """
+    Result of a KARA update operation.
+
+    Besides the operation counts, :attr:`delta` lists the chunks behind them
+    when the updater computes deltas, so a vector store can be updated without
+    diffing the collections.
+    """
 
     num_added: int = 0
     num_reused: int = 0
     num_deleted: int = 0
     new_chunked_doc: Optional["ChunkedDocument[T]"] = None
+    delta: Optional["ChunkDelta"] = None
 
     def __add__(self, other: "UpdateResult[T]") -> "UpdateResult[T]":
         """Add two UpdateResult objects."""
+        delta = None
+        if self.delta is not None and other.delta is not None:
+            delta = ChunkDelta(
+                added=self.delta.added + other.delta.added,
+                deleted=self.delta.deleted + other.delta.deleted,
+                reused={**self.delta.reused, **other.delta.reused},
+            )
         return UpdateResult(
             num_added=self.num_added + other.num_added,
             num_reused=self.num_reused + other.num_reused,
             num_deleted=self.num_deleted + other.num_deleted,
+            delta=delta,
         )
 
     @property
@@ -145,10 +909,34 @@ class UpdateResult(Generic[T]):
     @property
     def efficiency_ratio(self) -> float:
         """Ratio of skipped operations to total operations."""
-        total_chunks = len(self.new_chunked_doc.chunks) if self.new_chunked_doc else 0
+        total_chunks = self.new_chunked_doc.num_chunks if self.new_chunked_doc else 0
         return self.num_reused / total_chunks if total_chunks > 0 else 0.0
 
 
+@dataclass
+class DocumentUpdate(Generic[T]):
+    """
+    Update of a single document, as yielded by :meth:`KARAUpdater.aupdate`.
+
+    Attributes:
+        document_id: Document the update belongs to, or ``None`` for the last
+            update of a run, which only lists the old chunks to delete
+        chunks: New chunks of the document, in order
+        delta: Added and reused chunks of the document; in the last update,
+            the deleted chunks of the collection
+        embeddings: Embeddings of the ``delta.added`` chunks, in order, when an
+            embedding function is given
+        num_cached: Number of ``delta.added`` chunks whose embeddings were
+            taken from the embedding cache instead of being embedded
+    """
+
+    document_id: Optional[DocumentId]
+    chunks: list[ChunkData[T]]
+    delta: ChunkDelta
+    embeddings: Optional[list[Any]] = None
+    num_cached: int = 0
+
+
 class KARAUpdater(Generic[T]):
     """
     Knowledge-Aware Re-embedding Algorithm updater.
@@ -160,15 +948,78 @@ class KARAUpdater(Generic[T]):
     def __init__(
         self,
         chunker: BaseDocumentChunker[T],
+        solver: Literal["dag", "dijkstra", "convex"] = "dag",
+        incremental: bool = False,
+        max_workers: Optional[int] = None,
+        prefilter_bits_per_key: Optional[int] = None,
+        accounting_memory_budget: Optional[int] = None,
+        compute_delta: bool = False,
     ):
         """
         Initialize the KARA updater.
 
         Args:
             chunker: Document chunker for breaking documents into optimal chunks
+            solver: Shortest-path solver for the chunk graph. ``"dag"`` relaxes
+                nodes in a single left-to-right pass; ``"dijkstra"`` is the
+                heap-based reference implementation, kept for cross-checking.
+                ``"convex"`` never enumerates filler chunks and solves in
+                O(N log N), which keeps large ``chunk_size`` values practical.
+            incremental: Diff each document against its previous chunks, keep
+                old chunks verbatim in unchanged stretches and only solve the
+                windows around edits. Update cost then scales with edit size
+                rather than document size, at the price of not re-optimizing
+                chunk boundaries away from the edits.
+            max_workers: Number of worker processes used by
+                :meth:`update_collection` when no executor is passed. ``None``
+                or ``1`` solves documents serially.
+            prefilter_bits_per_key: Bits per old digest of a Bloom filter that
+                stands in for the old inventory in the reuse test of
+                :meth:`update_collection`, so workers receive the filter rather
+                than the inventory, along with a
+                :class:`~kara.hashing.SortedOccurrenceIndex` of the old chunks
+                in flat columns. Every solved document is checked against the
+                exact old digests and solved again without any false hit it
+                reused, so reuse decisions match an exact run. A
+                :class:`~kara.columnar.ColumnarChunkedDocument` is checked
+                against a sorted copy of its digest column rather than its
+                inventory; with ``accounting_memory_budget`` as well, the
+                inventory is never built. ``None`` tests against the
+                inventory directly.
+            accounting_memory_budget: Approximate number of bytes for counting
+                the added, reused and deleted chunks of
+                :meth:`update_collection`. When given, old and new digests are
+                counted in sorted runs spilled to disk and merged, as in
+                :mod:`kara.accounting`, rather than in dictionaries. ``None``
+                counts in memory.
+            compute_delta: Pair up the added, reused and deleted chunks of
+                :meth:`create_collection`, :meth:`update_collection` and
+                :meth:`update_documents` into the result's
+                :attr:`~UpdateResult.delta`, for applying updates to a vector
+                store. Pairing walks every old chunk digest, so updates that
+                only need the counts skip it by default. Not available with
+                ``accounting_memory_budget``; :meth:`aupdate` always reports
+                per-document deltas.
         """
+        if solver not in ("dag", "dijkstra", "convex"):
+            raise ValueError(f"Unknown solver {solver!r}. Expected 'dag', 'dijkstra' or 'convex'.")
+        # The budget is split between the old and the new digests
+        min_budget = 2 * MIN_MEMORY_BUDGET
+        if accounting_memory_budget is not None and accounting_memory_budget < min_budget:
+            raise ValueError(
+                f"accounting_memory_budget must be at least {min_budget} bytes, "
+                f"got {accounting_memory_budget}."
+            )
+        if compute_delta and accounting_memory_budget is not None:
+            raise ValueError("compute_delta cannot be combined with accounting_memory_budget.")
         self.chunker: BaseDocumentChunker[T] = chunker
         self.max_chunk_size: int = chunker.chunk_size
+        self.solver = solver
+        self.incremental = incremental
+        self.max_workers = max_workers
+        self.prefilter_bits_per_key = prefilter_bits_per_key
+        self.accounting_memory_budget = accounting_memory_budget
+        self.compute_delta = compute_delta
 
     def create_collection(self, documents: list[str]) -> UpdateResult[T]:
         """
@@ -184,107 +1035,515 @@ class KARAUpdater(Generic[T]):
             return UpdateResult(
                 num_added=0,
                 new_chunked_doc=ChunkedDocument[T](chunks=[]),
+                delta=ChunkDelta() if self.compute_delta else None,
             )
 
         all_chunks = []
         total_added = 0
+        delta = ChunkDelta()
+        render_units = self.chunker.render_units
 
         for doc_id, document in enumerate(documents):
             chunk_list = self.chunker.create_chunks(document)
 
-            for chunk in chunk_list:
+            for index, chunk in enumerate(chunk_list):
                 splits = self.chunker.normalize_chunk(chunk)
                 all_chunks.append(
                     ChunkData.from_splits(
                         splits,
                         doc_id,
                         serializer=self.chunker.serialize_units,
-                        renderer=self.chunker.render_units,
+                        renderer=render_units,
+                        hasher=self.chunker.hash_function,
                     )
                 )
                 total_added += 1
+                delta.added.append((doc_id, index))
 
         return UpdateResult(
             num_added=total_added,
             new_chunked_doc=ChunkedDocument[T](chunks=all_chunks),
+            delta=delta if self.compute_delta else None,
         )
 
     def update_collection(
-        self, current_collection: ChunkedDocument[T], documents: list[str]
+        self,
+        current_collection: Union[ChunkedDocument[T], CollectionState],
+        documents: list[str],
+        executor: Optional[Executor] = None,
+        output: Optional[Union[str, "os.PathLike[str]"]] = None,
     ) -> UpdateResult[T]:
         """
         Update the document collection with new documents.
 
+        Documents are solved independently, so they can be spread over an
+        executor. Results are merged in document order and the inventory
+        accounting is identical to a serial run.
+
         Args:
-            current_collection: Current document collection state
+            current_collection: Current document collection state, either a
+                collection or a hash-only :class:`CollectionState`
             documents: list of updated document texts
+            executor: Optional executor to solve documents in parallel. When not
+                given and ``max_workers`` is greater than one, a process pool is
+                created for the call.
+            output: Optional path to write the new collection to, in the format
+                of :mod:`kara.storage`, for chunkers producing token ids. Chunks
+                are written document by document as they are solved, and the
+                new collection is memory-mapped from the file. The path may be
+                the one ``current_collection`` was loaded from; it is replaced
+                once the update is complete. Windows does not allow replacing
+                a mapped file, so there it must be another path.
 
         Returns:
             UpdateResult with statistics and new collection
         """
-        if not documents:
+        if not documents and output is None:
             return UpdateResult(
-                num_deleted=len(current_collection.chunks),
-                new_chunked_doc=ChunkedDocument[T](chunks=[]),
+                num_deleted=current_collection.num_chunks,
+                new_chunked_doc=current_collection._with_chunks([]),
+                delta=(
+                    _match_chunks(
+                        current_collection.iter_document_digests(),
+                        [],
+                        current_collection.digest_counts,
+                    )
+                    if self.compute_delta
+                    else None
+                ),
             )
+        document_chunks = self._solve_update(current_collection, documents, executor)
+        if output is not None:
+            return self._write_collection(document_chunks, current_collection, output)
+
+        # Track which hashes are used across all documents
+        solved = list(document_chunks)
+        combined_result = self._count_update(current_collection, solved)
+        all_new_chunks = [chunk for chunks in solved for chunk in chunks]
+        combined_result.new_chunked_doc = current_collection._with_chunks(all_new_chunks)
+        return combined_result
 
-        # Process each document separately and combine results
-        all_new_chunks: list[ChunkData[T]] = []
-        combined_result: UpdateResult[T] = UpdateResult()
-        old_chunk_counts: dict[str, int] = {}
-        for chunk in current_collection.chunks:
-            old_chunk_counts[chunk.hash] = old_chunk_counts.get(chunk.hash, 0) + 1
+    def aupdate(
+        self,
+        current_collection: Union[ChunkedDocument[T], CollectionState],
+        documents: list[str],
+        embed: Optional[Callable[[list[Any]], Awaitable[Sequence[Any]]]] = None,
+        executor: Optional[Executor] = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_pending_batches: int = 8,
+        max_pending_documents: int = 256,
+        cache: Optional["EmbeddingCache"] = None,
+    ) -> AsyncIterator[DocumentUpdate[T]]:
+        """
+        Update the document collection asynchronously, document by document.
 
-        used_counts: dict[str, int] = {}
+        Documents are solved in a worker thread, on ``executor`` if given,
+        while the event loop embeds the chunks of solved documents, so solving
+        overlaps with embedding calls. The contents of added chunks are grouped
+        into batches of up to ``batch_size`` and passed to ``embed``, with at
+        most ``max_concurrency`` calls in flight. A batch is sent early
+        whenever an embedding call is idle. Solving pauses while
+        ``max_pending_batches`` batches wait for an embedding call or
+        ``max_pending_documents`` documents wait to be consumed.
 
-        for doc_id, document in enumerate(documents):
-            new_splits = self.chunker._split_to_units(document)
-            doc_result = self._update_chunks_for_document(
-                current_collection, new_splits, doc_id, set(old_chunk_counts.keys())
+        Reused chunks are paired with old chunks as each document is solved, so
+        the counts over a run match :meth:`update_collection`, though a chunk
+        may keep a different old chunk with the same digest.
+
+        With a ``cache``, added chunks whose digest is cached take their
+        embedding from the cache, like reused chunks, and only the others are
+        passed to ``embed`` and then cached.
+
+        Example:
+            >>> async for update in updater.aupdate(collection, documents, embed):
+            ...     store.upsert(update.delta.added, update.embeddings)
+
+        Args:
+            current_collection: Current document collection state, either a
+                collection or a hash-only :class:`CollectionState`
+            documents: list of updated document texts
+            embed: Optional coroutine function embedding a list of chunk
+                contents, such as LangChain's ``aembed_documents``
+            executor: Optional executor to solve documents in parallel, as in
+                :meth:`update_collection`
+            batch_size: Maximum number of chunk contents per ``embed`` call
+            max_concurrency: Maximum number of concurrent ``embed`` calls
+            max_pending_batches: Maximum number of batches waiting for ``embed``
+            max_pending_documents: Maximum number of solved documents waiting
+                to be yielded
+            cache: Optional :class:`~kara.cache.EmbeddingCache` of embeddings
+                by chunk hash, used when ``embed`` is given
+
+        Returns:
+            Async iterator of a DocumentUpdate per document, in order, once its
+            added chunks are embedded, followed by one listing deleted chunks
+        """
+        from .pipeline import run_update_pipeline
+
+        for name, value in (
+            ("batch_size", batch_size),
+            ("max_concurrency", max_concurrency),
+            ("max_pending_batches", max_pending_batches),
+            ("max_pending_documents", max_pending_documents),
+        ):
+            if value < 1:
+                raise ValueError(f"{name} must be positive, got {value}.")
+        return run_update_pipeline(
+            self,
+            current_collection,
+            documents,
+            embed,
+            executor,
+            batch_size,
+            max_concurrency,
+            max_pending_batches,
+            max_pending_documents,
+            cache,
+        )
+
+    def update_documents(
+        self,
+        current_collection: ChunkedDocument[T],
+        changes: Mapping[DocumentId, Optional[str]],
+        executor: Optional[Executor] = None,
+    ) -> UpdateResult[T]:
+        """
+        Update the listed documents of a collection in place.
+
+        Documents are keyed by stable ids instead of list positions. Each
+        listed document is re-chunked against the old chunks of the listed
+        documents, and ``None`` deletes a document. Every other document is
+        left untouched and is not reprocessed, so the cost scales with the
+        change set rather than the collection.
+
+        Args:
+            current_collection: Collection to patch; it is modified in place
+            changes: New text of every changed document, or ``None`` to delete it
+            executor: Optional executor to solve documents in parallel, as in
+                :meth:`update_collection`
+
+        Returns:
+            UpdateResult counting the chunks of the listed documents, with the
+            patched collection as ``new_chunked_doc``
+        """
+        old_chunks = [
+            chunk
+            for doc_id in changes
+            for chunk in current_collection.get_chunks_by_document(doc_id)
+        ]
+        old_chunk_counts = Counter(chunk.digest for chunk in old_chunks)
+        self._check_hash_algorithm({digest_algorithm(digest) for digest in old_chunk_counts})
+        reuse_index = self._index_chunks(chunk.units for chunk in old_chunks)
+
+        tasks: list[tuple[DocumentId, str, Optional[list[ChunkData[T]]]]] = [
+            (
+                doc_id,
+                document,
+                current_collection.get_chunks_by_document(doc_id) if self.incremental else None,
             )
+            for doc_id, document in changes.items()
+            if document is not None
+        ]
+        document_chunks = self._solve_tasks(tasks, old_chunk_counts, reuse_index, executor)
 
-            assert doc_result.new_chunked_doc is not None
-            all_new_chunks.extend(doc_result.new_chunked_doc.chunks)
+        replacements: dict[Optional[DocumentId], Optional[list[ChunkData[T]]]] = dict.fromkeys(
+            changes
+        )
+        used_counts: Counter[bytes] = Counter()
+        for (doc_id, _, _), chunks in zip(tasks, document_chunks):
+            replacements[doc_id] = chunks
+            used_counts.update(chunk.digest for chunk in chunks)
+
+        result = self._count_operations(old_chunk_counts, len(old_chunks), used_counts)
+        if self.compute_delta:
+            old_documents = [
+                (
+                    doc_id,
+                    [chunk.digest for chunk in current_collection.get_chunks_by_document(doc_id)],
+                )
+                for doc_id in changes
+            ]
+            new_documents = [
+                (doc_id, [chunk.digest for chunk in chunks])
+                for doc_id, chunks in replacements.items()
+                if chunks
+            ]
+            result.delta = _match_chunks(old_documents, new_documents, old_chunk_counts)
+        current_collection.replace_documents(replacements)
+        result.new_chunked_doc = current_collection
+        return result
 
-            # Track which hashes are used across all documents
-            for chunk in doc_result.new_chunked_doc.chunks:
-                used_counts[chunk.hash] = used_counts.get(chunk.hash, 0) + 1
+    def _solve_update(
+        self,
+        current_collection: Union[ChunkedDocument[T], CollectionState],
+        documents: list[str],
+        executor: Optional[Executor],
+    ) -> Iterator[list[ChunkData[T]]]:
+        """
+        Index a collection and solve documents against it, numbered by position.
+
+        Chunks are yielded document by document, in order, as each document
+        is solved.
+        """
+        self._check_hash_algorithm(current_collection.get_hash_algorithms())
+        # Workers of a prefiltered update receive flat index columns, not nested sets
+        compact = self.prefilter_bits_per_key is not None
+        if isinstance(current_collection, CollectionState):
+            # Recorded fingerprints assume the default unit serialization
+            fingerprinted = type(self.chunker).serialize_unit is BaseDocumentChunker.serialize_unit
+            occurrence_index = (
+                current_collection._occurrence_index(compact) if fingerprinted else None
+            )
+            if occurrence_index is not None:
+                reuse_index: ReuseIndex[T] = occurrence_index
+            else:
+                reuse_index = LengthIndex(current_collection.get_chunk_lengths())
+        elif compact:
+            reuse_index = SortedOccurrenceIndex.from_units(
+                current_collection.iter_units(), self.chunker.serialize_unit
+            )
+        else:
+            reuse_index = self._index_chunks(current_collection.iter_units())
+
+        # Previous chunks of every document, for diffing in incremental mode
+        anchor_collection = (
+            current_collection
+            if self.incremental and isinstance(current_collection, ChunkedDocument)
+            else None
+        )
+        tasks: list[tuple[DocumentId, str, Optional[list[ChunkData[T]]]]] = [
+            (
+                doc_id,
+                document,
+                anchor_collection.get_chunks_by_document(doc_id) if anchor_collection else None,
+            )
+            for doc_id, document in enumerate(documents)
+        ]
+        if self.prefilter_bits_per_key is None:
+            # The collection's live inventory doubles as the set of reusable digests
+            return self._solve_tasks(tasks, current_collection.digest_counts, reuse_index, executor)
+        old_digests = current_collection._exact_digests()
+        membership = PrefilteredDigests(
+            old_digests, BloomFilter(old_digests, self.prefilter_bits_per_key)
+        )
+        return self._confirm_reuse(
+            tasks,
+            self._solve_tasks(tasks, membership, reuse_index, executor),
+            membership,
+            reuse_index,
+        )
+
+    def _write_collection(
+        self,
+        document_chunks: Iterable[list[ChunkData[T]]],
+        current_collection: Union[ChunkedDocument[T], CollectionState],
+        output: Union[str, "os.PathLike[str]"],
+    ) -> UpdateResult[T]:
+        """Stream solved documents to a collection file and map the result."""
+        from .columnar import ColumnarChunkedDocument
+        from .storage import CollectionWriter
+
+        if isinstance(current_collection, ColumnarChunkedDocument):
+            current_collection._check_replaceable(output)
+
+        def write_chunks(writer: CollectionWriter) -> Iterator[list[ChunkData[T]]]:
+            # Each document is written out before its chunks are counted
+            for chunks in document_chunks:
+                writer.add_chunks(chunks)  # type: ignore[arg-type]
+                yield chunks
+
+        with CollectionWriter(output) as writer:
+            result = self._count_update(current_collection, write_chunks(writer))
+        # Columnar collections hold token ids, the units of token chunkers
+        render_units: Callable[[Sequence[int]], Any] = self.chunker.render_units  # type: ignore[assignment]
+        collection = ColumnarChunkedDocument.load(output, renderer=render_units)
+        result.new_chunked_doc = collection  # type: ignore[assignment]
+        return result
+
+    def _count_update(
+        self,
+        current_collection: Union[ChunkedDocument[T], CollectionState],
+        document_chunks: Iterable[list[ChunkData[T]]],
+    ) -> UpdateResult[T]:
+        """
+        Count the operations of replacing a collection with ``document_chunks``.
+
+        In memory, the chunks behind the counts are paired up into the
+        result's delta if the updater computes deltas. With an accounting
+        memory budget, the digests of both collections are counted in sorted
+        runs on disk and merged in a single pass.
+        """
+        if self.accounting_memory_budget is None:
+            new_documents = [
+                (chunks[0].document_id, [chunk.digest for chunk in chunks])
+                for chunks in document_chunks
+                if chunks
+            ]
+            used_counts = Counter(digest for _, digests in new_documents for digest in digests)
+            old_chunk_counts = current_collection.digest_counts
+            result: UpdateResult[T] = self._count_operations(
+                old_chunk_counts, current_collection.num_chunks, used_counts
+            )
+            if self.compute_delta:
+                result.delta = _match_chunks(
+                    current_collection.iter_document_digests(), new_documents, old_chunk_counts
+                )
+            return result
+        budget = self.accounting_memory_budget // 2
+        with DigestRuns(budget) as new_runs, DigestRuns(budget) as old_runs:
+            new_runs.update(chunk.digest for chunks in document_chunks for chunk in chunks)
+            old_runs.update(current_collection.iter_digests())
+            num_added, num_reused, num_deleted = count_operations(old_runs, new_runs)
+        return UpdateResult(num_added=num_added, num_reused=num_reused, num_deleted=num_deleted)
+
+    def _confirm_reuse(
+        self,
+        tasks: list[tuple[DocumentId, str, Optional[list[ChunkData[T]]]]],
+        document_chunks: Iterable[list[ChunkData[T]]],
+        membership: PrefilteredDigests,
+        reuse_index: ReuseIndex[T],
+    ) -> Iterator[list[ChunkData[T]]]:
+        """
+        Re-solve documents that reused a false hit of the prefilter.
+
+        A chunk whose digest passed the filter without being an old chunk was
+        priced as reused. Its document is solved again with such digests
+        excluded until every chunk passing the filter is confirmed.
+        """
+        for task, chunks in zip(tasks, document_chunks):
+            while True:
+                false_hits = {
+                    chunk.digest
+                    for chunk in chunks
+                    if chunk.digest in membership and not membership.confirm(chunk.digest)
+                }
+                if not false_hits:
+                    break
+                membership = membership.excluding(false_hits)
+                (chunks,) = _solve_documents(self, membership, reuse_index, [task])
+            yield chunks
+
+    def _solve_tasks(
+        self,
+        tasks: list[tuple[DocumentId, str, Optional[list[ChunkData[T]]]]],
+        old_chunk_hashes: Container[bytes],
+        reuse_index: ReuseIndex[T],
+        executor: Optional[Executor],
+    ) -> Iterator[list[ChunkData[T]]]:
+        """
+        Solve documents serially, on the given executor or on a process pool.
+
+        Chunks are yielded document by document, in task order, as soon as
+        each document is solved.
+        """
+        if executor is None and self.max_workers is not None and self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                yield from self._solve_documents_parallel(
+                    pool, tasks, old_chunk_hashes, reuse_index
+                )
+        elif executor is not None:
+            yield from self._solve_documents_parallel(
+                executor, tasks, old_chunk_hashes, reuse_index
+            )
+        else:
+            for task in tasks:
+                yield from _solve_documents(self, old_chunk_hashes, reuse_index, [task])
+
+    @staticmethod
+    def _count_operations(
+        old_chunk_counts: Mapping[bytes, int],
+        num_old_chunks: int,
+        used_counts: Mapping[bytes, int],
+    ) -> UpdateResult[T]:
+        """
+        Count added, reused and deleted chunks against the old inventory.
+
+        Only the new chunks are visited: every old chunk that is not reused is
+        deleted, so the old inventory is never scanned.
+
+        Args:
+            old_chunk_counts: Number of old chunks per digest
+            num_old_chunks: Total number of old chunks
+            used_counts: Number of new chunks per digest
+
+        Returns:
+            UpdateResult with the operation counts
+        """
+        result: UpdateResult[T] = UpdateResult()
 
         # Calculate added and reused chunks based on inventory
-        combined_result.num_added = 0
-        combined_result.num_reused = 0
         for chunk_hash, count in used_counts.items():
             old_count = old_chunk_counts.get(chunk_hash, 0)
             reused = min(count, old_count)
-            combined_result.num_reused += reused
-            combined_result.num_added += count - reused
+            result.num_reused += reused
+            result.num_added += count - reused
 
-        # Count deleted chunks considering duplicate hashes
-        for chunk_hash, count in old_chunk_counts.items():
-            reused_count = used_counts.get(chunk_hash, 0)
-            if reused_count < count:
-                combined_result.num_deleted += count - reused_count
+        result.num_deleted = num_old_chunks - result.num_reused
+        return result
 
-        # Create the final chunked document
-        combined_result.new_chunked_doc = ChunkedDocument[T](chunks=all_new_chunks)
+    def _solve_documents_parallel(
+        self,
+        executor: Executor,
+        tasks: list[tuple[DocumentId, str, Optional[list[ChunkData[T]]]]],
+        old_chunk_hashes: Container[bytes],
+        reuse_index: ReuseIndex[T],
+    ) -> Iterator[list[ChunkData[T]]]:
+        """
+        Solve documents on an executor, yielding their chunks in document order.
 
-        return combined_result
+        Documents are sent in contiguous batches so the updater, its chunker and
+        the old hash sets are shipped once per batch rather than per document.
+        """
+        max_workers = self.max_workers or os.cpu_count() or 1
+        batch_size = max(1, -(-len(tasks) // (max_workers * _BATCHES_PER_WORKER)))
+        batches = [tasks[i : i + batch_size] for i in range(0, len(tasks), batch_size)]
+
+        solve_batch = partial(_solve_documents, self, old_chunk_hashes, reuse_index)
+        for batch_chunks in executor.map(solve_batch, batches):
+            yield from batch_chunks
+
+    def _check_hash_algorithm(self, algorithms: set[str]) -> None:
+        """Reject old chunks that were hashed with another algorithm."""
+        if algorithms - {self.chunker.hash_algorithm}:
+            raise ValueError(
+                f"Collection contains chunks hashed with {', '.join(sorted(algorithms))}, "
+                f"but the chunker uses {self.chunker.hash_algorithm!r}. "
+                "Migrate it with ChunkedDocument.rehash(chunker) first."
+            )
+
+    def _index_chunks(self, chunk_units: Iterable[Sequence[T]]) -> OccurrenceIndex[T]:
+        """Build an occurrence index of old chunks from their units."""
+        index: OccurrenceIndex[T] = OccurrenceIndex(self.chunker.serialize_unit)
+        for units in chunk_units:
+            index.add(units)
+        return index
 
     def _update_chunks_for_document(
         self,
         current_collection: ChunkedDocument[T],
         new_splits: list[T],
-        document_id: int,
-        old_chunk_hashes: set[str],
+        document_id: DocumentId,
+        old_chunk_hashes: Container[bytes],
+        reuse_index: Optional[ReuseIndex[T]] = None,
+        old_document_chunks: Optional[list[ChunkData[T]]] = None,
     ) -> UpdateResult[T]:
         """
         Update chunks for a single document using the KARA algorithm.
 
+        Occurrences of old chunks are located through the occurrence index and
+        verified against ``old_chunk_hashes``; they become the reuse edges of
+        the chunk graph, and every other span is a filler edge.
+
         Args:
             current_collection: Current document collection state
             new_splits: New splits to process for this document
             document_id: ID of the document being processed
-            old_chunk_hashes: set of existing chunk hashes
+            old_chunk_hashes: Existing chunk digests
+            reuse_index: Occurrence index of the existing chunks. Built from
+                ``current_collection`` when not provided.
+            old_document_chunks: Previous chunks of this document, in order. In
+                incremental mode they anchor the unchanged stretches.
 
         Returns:
             UpdateResult with new chunks and statistics for this document
@@ -296,62 +1555,544 @@ class KARAUpdater(Generic[T]):
                 new_chunked_doc=ChunkedDocument[T](chunks=[]),
             )
 
-        # Build graph of possible chunks for this document
-        edges: list[list[tuple[int, float, list[T], str]]] = [[] for _ in range(N + 1)]
+        if reuse_index is None:
+            reuse_index = self._index_chunks(current_collection.iter_units())
+        render_units = self.chunker.render_units
+
+        anchors: list[tuple[int, int, ChunkData[T]]] = []
+        if self.incremental and old_document_chunks:
+            anchors = self._find_anchor_chunks(old_document_chunks, new_splits)
+
+        # Solve the windows between anchored chunks (the whole document if none)
+        new_chunks: list[ChunkData[T]] = []
+        node = 0
+        for anchor_start, anchor_end, old_chunk in [*anchors, (N, N, None)]:
+            for start, end in self._solve_window(
+                new_splits, node, anchor_start, old_chunk_hashes, reuse_index
+            ):
+                new_chunks.append(
+                    ChunkData.from_splits(
+                        new_splits[start:end],
+                        document_id,
+                        serializer=self.chunker.serialize_units,
+                        renderer=render_units,
+                        hasher=self.chunker.hash_function,
+                    )
+                )
+            if old_chunk is None:
+                break
+
+            if old_chunk.document_id != document_id:
+                old_chunk = old_chunk._clone(old_chunk.digest, document_id)
+            new_chunks.append(old_chunk)
+            node = self._next_node(anchor_start, anchor_end, N)
+
+        result: UpdateResult[T] = UpdateResult()
+        result.new_chunked_doc = ChunkedDocument[T](chunks=new_chunks)
+        return result
+
+    def _next_node(self, start: int, end: int, num_units: int) -> int:
+        """Return the node a chunk spanning ``[start, end)`` leads to."""
+        if end == num_units:
+            return num_units
+        return max(start + 1, end - self.chunker.overlap)
+
+    def _find_anchor_chunks(
+        self, old_document_chunks: list[ChunkData[T]], new_splits: list[T]
+    ) -> list[tuple[int, int, ChunkData[T]]]:
+        """
+        Find old chunks that survive verbatim in unchanged stretches of a document.
+
+        The document's old chunks are put in an occurrence index and located
+        in the new units with a single rolling-hash pass, so the cost grows
+        linearly with the document rather than with a diff of it. Of the
+        verified occurrences, the longest run keeping the old chunk order is
+        kept as anchors, so only the windows between them need to be solved.
+
+        Args:
+            old_document_chunks: Previous chunks of the document, in order
+            new_splits: New units of the document
+
+        Returns:
+            Anchors as (start, end, chunk) spans over ``new_splits``, in order
+        """
+        serialize_unit = self.chunker.serialize_unit
+        index: OccurrenceIndex[T] = OccurrenceIndex(serialize_unit)
+        # Old chunks by unit count and fingerprint, in order
+        chunk_positions: dict[tuple[int, int], list[int]] = {}
+        for position, chunk in enumerate(old_document_chunks):
+            units = chunk.units
+            if units:
+                fingerprint = fingerprint_units(units, serialize_unit)
+                index.add_fingerprint(units[0], len(units), fingerprint)
+                chunk_positions.setdefault((len(units), fingerprint), []).append(position)
+
+        N = len(new_splits)
+        span_hasher = SpanHasher(new_splits, serialize_unit)
+        occurrences: list[tuple[int, int, int]] = []
+        for start, end in index.find(new_splits, span_hasher, 0, N, N):
+            key = (end - start, span_hasher.fingerprint(start, end))
+            for position in chunk_positions.get(key, ()):
+                if list(old_document_chunks[position].units) == new_splits[start:end]:
+                    occurrences.append((start, end, position))
+
+        # Longest run of occurrences whose old positions increase with their starts
+        occurrences.sort(key=lambda occurrence: (occurrence[0], -occurrence[2]))
+        run_tails: list[int] = []
+        run_ends: list[int] = []
+        previous: list[int] = []
+        for i, (_, _, position) in enumerate(occurrences):
+            length = bisect.bisect_left(run_tails, position)
+            previous.append(run_ends[length - 1] if length else -1)
+            if length == len(run_tails):
+                run_tails.append(position)
+                run_ends.append(i)
+            else:
+                run_tails[length] = position
+                run_ends[length] = i
+        run: list[tuple[int, int, int]] = []
+        i = run_ends[-1] if run_ends else -1
+        while i >= 0:
+            run.append(occurrences[i])
+            i = previous[i]
+        run.reverse()
+
+        anchors: list[tuple[int, int, ChunkData[T]]] = []
+        node = 0
+        for start, end, position in run:
+            if start < node:
+                continue
+            anchors.append((start, end, old_document_chunks[position]))
+            node = self._next_node(start, end, N)
+
+        return anchors
+
+    def _solve_window(
+        self,
+        new_splits: list[T],
+        start: int,
+        target: int,
+        old_chunk_hashes: Container[bytes],
+        reuse_index: ReuseIndex[T],
+    ) -> list[tuple[int, int]]:
+        """
+        Find the optimal chunking between two nodes of a document's chunk graph.
+
+        Args:
+            new_splits: New units of the document
+            start: Node the path starts from
+            target: Node the path must end at
+            old_chunk_hashes: Existing chunk digests
+            reuse_index: Occurrence index of the existing chunks
+
+        Returns:
+            (start, end) unit spans of the chosen chunks, in order
+        """
+        if start >= target:
+            return []
+
+        window_end = self._window_end(new_splits, target)
+        span_hasher = SpanHasher(new_splits[start:window_end], self.chunker.serialize_unit)
+
+        # Reuse edges come straight from the occurrence index, verified by hash
+        reuse_hashes: dict[tuple[int, int], bytes] = {}
+        for match_start, match_end in reuse_index.find(
+            new_splits, span_hasher, start, target, window_end
+        ):
+            match_hash = self.chunker.hash_units(new_splits[match_start:match_end])
+            if match_hash in old_chunk_hashes:
+                reuse_hashes[(match_start, match_end)] = match_hash
+
+        if self.solver == "convex":
+            previous_node, previous_end = self._solve_convex(
+                new_splits, start, target, reuse_hashes
+            )
+        else:
+            edges = self._build_edges(new_splits, start, target, reuse_hashes)
+            if self.solver == "dijkstra":
+                previous_node, previous_end = self._solve_dijkstra(edges)
+            else:
+                previous_node, previous_end = self._solve_dag(edges)
+
+        # Reconstruct the solution for this window
+        spans: list[tuple[int, int]] = []
+        node = target - start
+        while node > 0:
+            prev_node = previous_node[node]
+            span_end = previous_end[node]
+            if prev_node is None or span_end is None:
+                break
+            spans.append((prev_node + start, span_end))
+            node = prev_node
+
+        spans.reverse()
+        return spans
+
+    def _window_end(self, new_splits: list[T], target: int) -> int:
+        """
+        Return the end of the units a chunk in a window can cover.
+
+        A chunk landing on ``target`` runs ``overlap`` units past it, and no
+        chunk reaches beyond the document.
+
+        Args:
+            new_splits: New units of the document
+            target: Node the path must end at
+
+        Returns:
+            Index one past the last unit of the window
+        """
+        return min(len(new_splits), target + self.chunker.overlap)
+
+    def _window_prefix(self, new_splits: list[T], start: int, target: int) -> np.ndarray:
+        """
+        Return prefix lengths of the units a chunk in a window can cover.
+
+        Args:
+            new_splits: New units of the document
+            start: Node the path starts from
+            target: Node the path must end at
+
+        Returns:
+            Cumulative lengths of ``new_splits[start:window_end]`` with a leading zero
+        """
+        window_end = self._window_end(new_splits, target)
+        lengths = self.chunker.unit_lengths(new_splits[start:window_end])
+
+        # A single split cannot exceed the max chunk size
+        # TODO: handle the edge case in which all splits are larger than max_chunk_size
+        too_long = np.flatnonzero(lengths > self.max_chunk_size)
+        if too_long.size:
+            raise ValueError(
+                f"Split length {lengths[too_long[0]]} exceeds max chunk size {self.max_chunk_size}."
+            )
+        return prefix_lengths(lengths)
+
+    def _build_edges(
+        self,
+        new_splits: list[T],
+        start: int,
+        target: int,
+        reuse_hashes: dict[tuple[int, int], bytes],
+    ) -> list[list[tuple[int, int, float, Optional[bytes]]]]:
+        """
+        Enumerate every candidate chunk between two nodes of the chunk graph.
+
+        Args:
+            new_splits: New units of the document
+            start: Node the path starts from
+            target: Node the path must end at
+            reuse_hashes: Digests of the reusable spans, keyed by (start, end)
 
+        Returns:
+            Outgoing (next_node, end, cost, digest) edges of every node, numbered from ``start``
+        """
+        N = len(new_splits)
+        max_chunk_size = self.max_chunk_size
+        overlap_units = self.chunker.overlap
+        prefix = self._window_prefix(new_splits, start, target)
+
+        # Furthest end of a chunk leaving each node: the longest span that fits
+        # max_chunk_size, and whose next node does not pass the target
+        ends = np.searchsorted(prefix, prefix[: target - start] + max_chunk_size, side="right")
+        furthest_end = N if target == N else min(N - 1, target + overlap_units)
+        ends = np.minimum(ends - 1 + start, furthest_end).tolist()
+
+        reuse_by_start: dict[int, list[tuple[int, bytes]]] = {}
+        for (i, j), chunk_hash in reuse_hashes.items():
+            reuse_by_start.setdefault(i, []).append((j, chunk_hash))
+
+        # Build graph of possible chunks for this window. Nodes are numbered from
+        # `start`. An edge leaving node i is stored as (next_node, end, cost, digest)
+        # and stands for new_splits[i:end]; units are only sliced out for edges on
+        # the final path.
+        edges: list[list[tuple[int, int, float, Optional[bytes]]]] = [
+            [] for _ in range(target - start + 1)
+        ]
+
+        for i in range(start, target):
+            end = ends[i - start]
+            if end <= i:
+                continue
+            span_lengths = prefix[i - start + 1 : end - start + 1] - prefix[i - start]
+            penalty_array = (1 - span_lengths / float(max_chunk_size)) ** 2
+            penalties = penalty_array.tolist()
+            costs = (penalty_array + 1.0).tolist()
+            hashes: list[Optional[bytes]] = [None] * (end - i)
+            for j, chunk_hash in reuse_by_start.get(i, ()):
+                if j <= end:
+                    costs[j - i - 1] = penalties[j - i - 1]
+                    hashes[j - i - 1] = chunk_hash
+
+            # Spans up to the overlap all land on the next node; longer ones
+            # land `overlap` units before their end
+            same_node_end = min(end, i + 1 + overlap_units)
+            next_nodes = [i + 1 - start] * (same_node_end - i)
+            next_nodes.extend(
+                range(same_node_end + 1 - overlap_units - start, end - overlap_units - start + 1)
+            )
+            if end == N:
+                next_nodes[-1] = N - start
+
+            edges[i - start] = list(zip(next_nodes, range(i + 1, end + 1), costs, hashes))
+
+        return edges
+
+    def _solve_convex(
+        self,
+        new_splits: list[T],
+        start: int,
+        target: int,
+        reuse_hashes: dict[tuple[int, int], bytes],
+    ) -> tuple[list[Optional[int]], list[Optional[int]]]:
+        """
+        Find the optimal path without enumerating filler edges.
+
+        A filler chunk costs ``1 + (1 - fill_rate) ** 2``, a convex function of
+        its length, so over prefix lengths the filler costs satisfy the
+        quadrangle inequality and the best filler predecessor of a node moves
+        monotonically to the right. Filler chunks landing ``overlap`` units
+        before their end are relaxed through a monotone candidate queue with
+        binary search, in O(N log N). The remaining edges are relaxed
+        explicitly: reuse edges, the longest chunk shorter than the overlap
+        (which lands on the next node), and chunks ending the document.
+
+        The optimum cost and edge count match :meth:`_solve_dag` over the
+        exhaustive graph; among exactly tied paths a different one may be chosen.
+
+        Args:
+            new_splits: New units of the document
+            start: Node the path starts from
+            target: Node the path must end at
+            reuse_hashes: Digests of the reusable spans, keyed by (start, end)
+
+        Returns:
+            Predecessor node and span end of the best edge into every node,
+            numbered from ``start``
+        """
+        N = len(new_splits)
         max_chunk_size = self.max_chunk_size
         max_chunk_size_float = float(max_chunk_size)
         overlap_units = self.chunker.overlap
-        unit_length = self.chunker.unit_length
-
-        for i in range(N):
-            current_length = 0
-            chunk_splits: list[T] = []
-
-            for j in range(i + 1, N + 1):
-                if j <= N:
-                    split = new_splits[j - 1]
-                    chunk_splits.append(split)
-                    current_length += unit_length(split)
-
-                    # A single split cannot exceed the max chunk size
-                    # TODO: handle the edge case in which all splits are larger than max_chunk_size
-                    if unit_length(split) > max_chunk_size:
-                        raise ValueError(
-                            f"Split length {unit_length(split)} exceeds max chunk size "
-                            f"{max_chunk_size}."
-                        )
+        inf = float("inf")
 
-                if current_length > max_chunk_size:
-                    break
+        prefix: list[int] = self._window_prefix(new_splits, start, target).tolist()
+        window_end = start + len(prefix) - 1
 
-                serialized = self.chunker.serialize_units(chunk_splits)
-                chunk_hash = hashlib.md5(serialized).hexdigest()
+        def span_length(i: int, j: int) -> int:
+            return prefix[j - start] - prefix[i - start]
 
-                fill_rate = current_length / max_chunk_size_float
-                penalty = (1 - fill_rate) ** 2
+        def filler_cost(length: int) -> float:
+            if length > max_chunk_size:
+                return inf
+            return 1.0 + (1 - length / max_chunk_size_float) ** 2
 
-                if chunk_hash in old_chunk_hashes:
-                    cost = penalty
+        num_nodes = target - start + 1
+        int_inf: int = sys.maxsize
+        min_cost = [inf] * num_nodes
+        min_num_edges = [int_inf] * num_nodes
+        min_cost[0] = 0
+        min_num_edges[0] = 0
+        previous_node: list[Optional[int]] = [None] * num_nodes
+        previous_end: list[Optional[int]] = [None] * num_nodes
+
+        def relax(u: int, v: int, end: int, edge_cost: float) -> None:
+            if edge_cost == inf:
+                return
+            cost_u = min_cost[u]
+            new_cost = cost_u + edge_cost
+            new_num_edges = min_num_edges[u] + 1
+            if new_cost > min_cost[v]:
+                return
+            if new_cost == min_cost[v]:
+                if new_num_edges > min_num_edges[v]:
+                    return
+                prev_u = previous_node[v]
+                if (
+                    new_num_edges == min_num_edges[v]
+                    and prev_u is not None
+                    and cost_u >= min_cost[prev_u]
+                ):
+                    return
+            min_cost[v] = new_cost
+            min_num_edges[v] = new_num_edges
+            previous_node[v] = u
+            previous_end[v] = end
+
+        reuse_edges: dict[int, list[tuple[int, int, float]]] = {}
+        for i, j in reuse_hashes:
+            length = span_length(i, j)
+            next_node = self._next_node(i, j, N)
+            if length <= max_chunk_size and next_node <= target:
+                penalty = (1 - length / max_chunk_size_float) ** 2
+                reuse_edges.setdefault(i, []).append((next_node - start, j, penalty))
+
+        # Long filler chunks [i, t + overlap) land on node t, for t up to long_end
+        long_end = min(target, N - 1 - overlap_units)
+
+        def long_value(i: int, t: int) -> tuple[float, int]:
+            edge_cost = filler_cost(span_length(i, t + overlap_units))
+            return min_cost[i - start] + edge_cost, min_num_edges[i - start] + 1
+
+        def newer_wins(i: int, older: int, t: int) -> bool:
+            # Older candidates run out of room first, so once the older one is
+            # infeasible the newer one wins from there on
+            older_value = long_value(older, t)
+            return older_value[0] == inf or long_value(i, t) < older_value
+
+        # Candidate i is the best long-filler predecessor for nodes [positions[k], ...)
+        candidates: list[int] = []
+        positions: list[int] = []
+        head = 0
+
+        def add_candidate(i: int) -> None:
+            first = i + 1
+            if min_cost[i - start] == inf or first > long_end:
+                return
+            if filler_cost(span_length(i, first + overlap_units)) == inf:
+                return
+
+            # By the quadrangle inequality a newer candidate wins on a suffix of nodes
+            while len(candidates) > head:
+                position = max(positions[-1], first)
+                if newer_wins(i, candidates[-1], position):
+                    candidates.pop()
+                    positions.pop()
                 else:
-                    cost = 1.0 + penalty
+                    break
 
-                if j == N:
-                    next_node = N
+            if len(candidates) == head:
+                candidates.append(i)
+                positions.append(first)
+                return
+
+            low = max(positions[-1], first) + 1
+            high = long_end + 1
+            while low < high:
+                mid = (low + high) // 2
+                if newer_wins(i, candidates[-1], mid):
+                    high = mid
                 else:
-                    next_node = max(i + 1, j - overlap_units)
+                    low = mid + 1
+            if low <= long_end:
+                candidates.append(i)
+                positions.append(low)
+
+        for node in range(start, target + 1):
+            u = node - start
+            if node > start:
+                add_candidate(node - 1)
+                if node <= long_end:
+                    while head + 1 < len(candidates) and positions[head + 1] <= node:
+                        head += 1
+                    if head < len(candidates):
+                        i = candidates[head]
+                        relax(
+                            i - start,
+                            u,
+                            node + overlap_units,
+                            filler_cost(span_length(i, node + overlap_units)),
+                        )
+
+            if node == target or min_cost[u] == inf:
+                continue
+
+            for v, end, edge_cost in reuse_edges.get(node, ()):
+                relax(u, v, end, edge_cost)
+
+            # Filler chunks shorter than the overlap all land on the next node
+            short_end = min(node + overlap_units, N - 1, window_end)
+            if short_end > node:
+                while short_end > node + 1 and span_length(node, short_end) > max_chunk_size:
+                    short_end -= 1
+                relax(u, u + 1, short_end, filler_cost(span_length(node, short_end)))
+
+            if target == N:
+                relax(u, N - start, N, filler_cost(span_length(node, N)))
+
+        return previous_node, previous_end
+
+    @staticmethod
+    def _solve_dag(
+        edges: list[list[tuple[int, int, float, Optional[bytes]]]],
+    ) -> tuple[list[Optional[int]], list[Optional[int]]]:
+        """
+        Find the optimal path with a single left-to-right pass over the DAG.
+
+        Every edge points forward, so nodes are final once all smaller nodes
+        have been relaxed. Ties on cost are broken by edge count, and remaining
+        ties by the predecessor :meth:`_solve_dijkstra` would settle first, so
+        both solvers return the same path.
+
+        Args:
+            edges: Outgoing (next_node, end, cost, digest) edges of every node
+
+        Returns:
+            Predecessor node and span end of the best edge into every node
+        """
+        num_nodes = len(edges)
+        int_inf: int = sys.maxsize
+
+        min_cost = [float("inf")] * num_nodes
+        min_num_edges = [int_inf] * num_nodes
+        min_cost[0] = 0
+        min_num_edges[0] = 0
+        previous_node: list[Optional[int]] = [None] * num_nodes
+        previous_end: list[Optional[int]] = [None] * num_nodes
+
+        for u in range(num_nodes):
+            cost_u = min_cost[u]
+            if cost_u == float("inf"):
+                continue
+            new_num_edges = min_num_edges[u] + 1
+
+            for v, end, edge_cost, _ in edges[u]:
+                new_cost = cost_u + edge_cost
+                if new_cost > min_cost[v]:
+                    continue
+                if new_cost == min_cost[v]:
+                    if new_num_edges > min_num_edges[v]:
+                        continue
+                    # Dijkstra settles tied predecessors by (cost, edge count, node)
+                    prev_u = previous_node[v]
+                    if (
+                        new_num_edges == min_num_edges[v]
+                        and prev_u is not None
+                        and cost_u >= min_cost[prev_u]
+                    ):
+                        continue
+
+                min_cost[v] = new_cost
+                min_num_edges[v] = new_num_edges
+                previous_node[v] = u
+                previous_end[v] = end
+
+        return previous_node, previous_end
+
+    @staticmethod
+    def _solve_dijkstra(
+        edges: list[list[tuple[int, int, float, Optional[bytes]]]],
+    ) -> tuple[list[Optional[int]], list[Optional[int]]]:
+        """
+        Find the optimal path using Dijkstra's algorithm with edge count tie-breaking.
+
+        Reference implementation kept to cross-check :meth:`_solve_dag`.
 
-                edges[i].append((next_node, cost, chunk_splits.copy(), chunk_hash))
+        Args:
+            edges: Outgoing (next_node, end, cost, digest) edges of every node
 
-        # Find optimal path using Dijkstra's algorithm with edge count tie-breaking
+        Returns:
+            Predecessor node and span end of the best edge into every node
+        """
+        num_nodes = len(edges)
         int_inf: int = sys.maxsize
 
-        min_cost = [float("inf")] * (N + 1)
-        min_num_edges = [int_inf] * (N + 1)
+        min_cost = [float("inf")] * num_nodes
+        min_num_edges = [int_inf] * num_nodes
         min_cost[0] = 0
         min_num_edges[0] = 0
-        previous_node: list[Optional[int]] = [None] * (N + 1)
-        previous_edge: list[Optional[tuple[int, float, list[T], str]]] = [None] * (N + 1)
+        previous_node: list[Optional[int]] = [None] * num_nodes
+        previous_end: list[Optional[int]] = [None] * num_nodes
 
         heap: list[tuple[float, int, int]] = [(0, 0, 0)]  # (cost, edge_count, node)
 
@@ -360,7 +2101,7 @@ class KARAUpdater(Generic[T]):
             if cost_u > min_cost[u] or (cost_u == min_cost[u] and edges_count_u > min_num_edges[u]):
                 continue
 
-            for v, edge_cost, chunk_splits, chunk_hash in edges[u]:
+            for v, end, edge_cost, _ in edges[u]:
                 new_cost = min_cost[u] + edge_cost
                 new_num_edges = min_num_edges[u] + 1
 
@@ -370,36 +2111,11 @@ class KARAUpdater(Generic[T]):
                     min_cost[v] = new_cost
                     min_num_edges[v] = new_num_edges
                     previous_node[v] = u
-                    previous_edge[v] = (v, edge_cost, chunk_splits, chunk_hash)
+                    previous_end[v] = end
                     heap_item: tuple[float, int, int] = (new_cost, new_num_edges, v)
                     heapq.heappush(heap, heap_item)
 
-        # Reconstruct the solution for this document
-        new_chunks: list[ChunkData[T]] = []
-        result: UpdateResult[T] = UpdateResult()
-
-        node = N
-        while node > 0:
-            edge = previous_edge[node]
-            if edge is None:
-                break
-
-            _, edge_cost, chunk_splits, chunk_hash = edge
-            chunk_data = ChunkData.from_splits(
-                chunk_splits,
-                document_id,
-                serializer=self.chunker.serialize_units,
-                renderer=self.chunker.render_units,
-            )
-            new_chunks.insert(0, chunk_data)
-
-            prev_node = previous_node[node]
-            if prev_node is None:
-                break
-            node = prev_node
-
-        result.new_chunked_doc = ChunkedDocument[T](chunks=new_chunks)
-        return result
+        return previous_node, previous_end
 
     def _update_chunks(
         self, current_collection: ChunkedDocument[Any], new_splits: list[Any]
@@ -415,35 +2131,187 @@ class KARAUpdater(Generic[T]):
         Returns:
             UpdateResult with new chunks and statistics
         """
-        old_chunk_counts: dict[str, int] = {}
-        for chunk in current_collection.chunks:
-            old_chunk_counts[chunk.hash] = old_chunk_counts.get(chunk.hash, 0) + 1
+        old_chunk_counts = current_collection.digest_counts
+        self._check_hash_algorithm(current_collection.get_hash_algorithms())
 
         # Use the new multi-document method with document_id = 0
         doc_result = self._update_chunks_for_document(
-            current_collection, new_splits, 0, set(old_chunk_counts.keys())
+            current_collection,
+            new_splits,
+            0,
+            old_chunk_counts,
+            self._index_chunks(current_collection.iter_units()),
         )
 
-        # Count used chunks
-        used_counts: dict[str, int] = {}
+        # Count used chunks against the inventory
         assert doc_result.new_chunked_doc is not None
-        for chunk in doc_result.new_chunked_doc.chunks:
-            used_counts[chunk.hash] = used_counts.get(chunk.hash, 0) + 1
+        used_counts = Counter(chunk.digest for chunk in doc_result.new_chunked_doc.chunks)
+        result = self._count_operations(
+            old_chunk_counts, current_collection.num_chunks, used_counts
+        )
+        result.new_chunked_doc = doc_result.new_chunked_doc
+        return result
 
-        # Calculate added and reused chunks based on inventory
-        doc_result.num_added = 0
-        doc_result.num_reused = 0
-        for chunk_hash, count in used_counts.items():
-            old_count = old_chunk_counts.get(chunk_hash, 0)
-            reused = min(count, old_count)
-            doc_result.num_reused += reused
-            doc_result.num_added += count - reused
 
-        # Count deleted chunks
-        doc_result.num_deleted = 0
-        for chunk_hash, count in old_chunk_counts.items():
-            reused_count = used_counts.get(chunk_hash, 0)
-            if reused_count < count:
-                doc_result.num_deleted += count - reused_count
+def _solve_documents(
+    updater: KARAUpdater[T],
+    old_chunk_hashes: Container[bytes],
+    reuse_index: ReuseIndex[T],
+    tasks: list[tuple[DocumentId, str, Optional[list[ChunkData[T]]]]],
+) -> list[list[ChunkData[T]]]:
+    """
+    Split and solve a batch of documents.
+
+    Module-level so it can be pickled and run in worker processes.
+
+    Args:
+        updater: Updater whose chunker and solver settings are used
+        old_chunk_hashes: Existing chunk digests
+        reuse_index: Occurrence index of the existing chunks
+        tasks: (document_id, text, previous chunks of the document) per document
+
+    Returns:
+        New chunks of every document, in task order
+    """
+    empty_collection = ChunkedDocument[T](chunks=[])
+    document_chunks: list[list[ChunkData[T]]] = []
+    for doc_id, document, old_document_chunks in tasks:
+        new_splits = updater.chunker._split_to_units(document)
+        doc_result = updater._update_chunks_for_document(
+            empty_collection,
+            new_splits,
+            doc_id,
+            old_chunk_hashes,
+            reuse_index,
+            old_document_chunks,
+        )
+        assert doc_result.new_chunked_doc is not None
+        document_chunks.append(doc_result.new_chunked_doc.chunks)
+    return document_chunks
+
+
+class _ChunkMatcher:
+    """
+    Pair new chunks with unpaired old chunks of the same digest.
+
+    A new chunk takes an old chunk of its own document when there is one, and
+    otherwise any old chunk, found through an index by digest that is built
+    on first use. Each digest is reused as often as the smaller of its old
+    and new counts in whatever order documents are paired, matching
+    :meth:`KARAUpdater._count_operations`.
+    """
+
+    def __init__(
+        self,
+        old_documents: Iterable[tuple[Optional[DocumentId], Sequence[bytes]]],
+        old_digests: Container[bytes],
+    ):
+        """
+        Initialize the matcher.
+
+        Args:
+            old_documents: Document ids and chunk digests of the old collection
+            old_digests: Digests of the old collection, to skip lookups of new ones
+        """
+        self._old = dict(old_documents)
+        self._old_digests = old_digests
+        # Positions of the old chunks already paired, by document
+        self._paired: dict[Optional[DocumentId], set[int]] = {}
+        self._by_digest: Optional[dict[bytes, deque[ChunkRef]]] = None
+
+    def pair_in_document(
+        self, document_id: Optional[DocumentId], digests: Sequence[bytes], delta: ChunkDelta
+    ) -> list[tuple[ChunkRef, bytes]]:
+        """Pair the chunks of a new document within its old chunks and return the rest."""
+        old_digests = self._old.get(document_id, ())
+        paired = self._paired.setdefault(document_id, set())
+        if not paired and digests == old_digests:
+            # Unchanged documents keep every chunk in place
+            delta.reused.update(((document_id, i), (document_id, i)) for i in range(len(digests)))
+            paired.update(range(len(digests)))
+            return []
+
+        positions: dict[bytes, deque[int]] = {}
+        for position, digest in enumerate(old_digests):
+            if position not in paired:
+                positions.setdefault(digest, deque()).append(position)
+        unmatched: list[tuple[ChunkRef, bytes]] = []
+        for position, digest in enumerate(digests):
+            candidates = positions.get(digest)
+            if candidates:
+                old_position = candidates.popleft()
+                paired.add(old_position)
+                delta.reused[document_id, position] = (document_id, old_position)
+            else:
+                unmatched.append(((document_id, position), digest))
+        return unmatched
+
+    def pair_anywhere(self, unmatched: Iterable[tuple[ChunkRef, bytes]], delta: ChunkDelta) -> None:
+        """Pair chunks with old chunks of any document, and add the ones left over."""
+        for ref, digest in unmatched:
+            old_ref = self._take(digest) if digest in self._old_digests else None
+            if old_ref is None:
+                delta.added.append(ref)
+            else:
+                delta.reused[ref] = old_ref
+
+    def unpaired(self) -> list[ChunkRef]:
+        """Return the old chunks left unpaired, in collection order."""
+        refs: list[ChunkRef] = []
+        for document_id, digests in self._old.items():
+            paired = self._paired.get(document_id, set())
+            if len(paired) < len(digests):
+                refs.extend(
+                    (document_id, position)
+                    for position in range(len(digests))
+                    if position not in paired
+                )
+        return refs
+
+    def _take(self, digest: bytes) -> Optional[ChunkRef]:
+        """Pair the first unpaired old chunk with ``digest``, if any."""
+        if self._by_digest is None:
+            self._by_digest = {}
+            for document_id, digests in self._old.items():
+                for position, old_digest in enumerate(digests):
+                    self._by_digest.setdefault(old_digest, deque()).append((document_id, position))
+        # Chunks paired since the index was built are dropped as they reach the front
+        candidates = self._by_digest.get(digest)
+        while candidates:
+            document_id, position = candidates.popleft()
+            paired = self._paired.setdefault(document_id, set())
+            if position not in paired:
+                paired.add(position)
+                return document_id, position
+        return None
+
+
+def _match_chunks(
+    old_documents: Iterable[tuple[Optional[DocumentId], Sequence[bytes]]],
+    new_documents: Iterable[tuple[Optional[DocumentId], Sequence[bytes]]],
+    old_digests: Container[bytes],
+) -> ChunkDelta:
+    """
+    Compute the delta between an old collection and new chunks.
 
-        return doc_result
+    Every new document is paired within its own old chunks before any chunk
+    is taken from another document.
+
+    Args:
+        old_documents: Document ids and chunk digests of the old collection
+        new_documents: Document ids and chunk digests of the new chunks
+        old_digests: Digests of the old collection
+
+    Returns:
+        ChunkDelta of the added, deleted and reused chunks
+    """
+    matcher = _ChunkMatcher(old_documents, old_digests)
+    delta = ChunkDelta()
+    unmatched = [
+        chunk
+        for document_id, digests in new_documents
+        for chunk in matcher.pair_in_document(document_id, digests, delta)
+    ]
+    matcher.pair_anywhere(unmatched, delta)
+    delta.deleted = matcher.unpaired()
+    return delta
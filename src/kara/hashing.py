@@ -0,0 +1,524 @@
+"""
+Chunk hash algorithms and rolling fingerprints for fast detection of reusable chunk spans.
+"""
+
+import hashlib
+import math
+from array import array
+from collections.abc import Collection, Container, Iterable, Iterator, Sequence
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+# Hashes stored without an "<algorithm>:" prefix predate configurable algorithms
+LEGACY_HASH_ALGORITHM = "md5"
+HASH_ALGORITHMS = ("md5", "blake2b", "xxh128")
+_HASH_TAG_SEPARATOR = ":"
+
+# Digests are kept as raw bytes internally: one tag byte naming the algorithm
+# followed by the 16-byte digest. Hex strings only appear at the API boundary.
+_DIGEST_TAGS = {algorithm: bytes([tag]) for tag, algorithm in enumerate(HASH_ALGORITHMS)}
+DIGEST_SIZE = 1 + 16
+
+
+def get_hash_function(algorithm: str) -> Callable[[bytes], bytes]:
+    """
+    Return the function digesting serialized chunk bytes with ``algorithm``.
+
+    Args:
+        algorithm: One of ``"md5"``, ``"blake2b"`` (128-bit digest) or
+            ``"xxh128"`` (non-cryptographic, requires ``xxhash``)
+
+    Returns:
+        Function mapping bytes to a tagged raw digest
+    """
+    if algorithm == "md5":
+        return _md5_digest
+    if algorithm == "blake2b":
+        return _blake2b_digest
+    if algorithm == "xxh128":
+        if xxhash is None:
+            raise ImportError(
+                "xxhash is required for the 'xxh128' hash algorithm. "
+                "Install with: pip install kara-toolkit[xxhash]"
+            )
+        return _xxh128_digest
+    raise ValueError(
+        f"Unknown hash algorithm {algorithm!r}. Expected one of: {', '.join(HASH_ALGORITHMS)}."
+    )
+
+
+def digest_to_hex(digest: bytes) -> str:
+    """
+    Format a tagged digest as a hash string.
+
+    MD5 hashes are left untagged so existing collections keep their hashes;
+    other algorithms prefix the hex digest with ``"<algorithm>:"``.
+    """
+    algorithm = HASH_ALGORITHMS[digest[0]]
+    if algorithm == LEGACY_HASH_ALGORITHM:
+        return digest[1:].hex()
+    return algorithm + _HASH_TAG_SEPARATOR + digest[1:].hex()
+
+
+def digest_from_hex(hash_value: str) -> bytes:
+    """Parse a hash string produced by :func:`digest_to_hex` back into a tagged digest."""
+    algorithm = hash_algorithm_of(hash_value)
+    if algorithm not in _DIGEST_TAGS:
+        raise ValueError(f"Unknown hash algorithm {algorithm!r} in hash {hash_value!r}.")
+    _, _, hex_digest = hash_value.rpartition(_HASH_TAG_SEPARATOR)
+    return _DIGEST_TAGS[algorithm] + bytes.fromhex(hex_digest)
+
+
+def hash_algorithm_of(hash_value: str) -> str:
+    """Return the algorithm a stored chunk hash was computed with."""
+    algorithm, separator, _ = hash_value.partition(_HASH_TAG_SEPARATOR)
+    return algorithm if separator else LEGACY_HASH_ALGORITHM
+
+
+def digest_algorithm(digest: bytes) -> str:
+    """Return the algorithm a tagged digest was computed with."""
+    return HASH_ALGORITHMS[digest[0]]
+
+
+def _md5_digest(data: bytes, _tag: bytes = _DIGEST_TAGS["md5"]) -> bytes:
+    return _tag + hashlib.md5(data).digest()
+
+
+def _blake2b_digest(data: bytes, _tag: bytes = _DIGEST_TAGS["blake2b"]) -> bytes:
+    return _tag + hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _xxh128_digest(data: bytes, _tag: bytes = _DIGEST_TAGS["xxh128"]) -> bytes:
+    return _tag + xxhash.xxh3_128_digest(data)
+
+
+# Fingerprints are byte strings read as base-256 numbers modulo the Mersenne
+# prime 2**61 - 1, so shifting by ``n`` bytes is a rotation: 256**n == 2**(8n % 61).
+_MERSENNE_EXPONENT = 61
+_MODULUS = (1 << _MERSENNE_EXPONENT) - 1
+
+
+def _shift(num_bytes: int) -> int:
+    """Return ``256 ** num_bytes`` modulo the fingerprint modulus."""
+    return 1 << ((8 * num_bytes) % _MERSENNE_EXPONENT)
+
+
+def fingerprint_units(units: Iterable[T], serialize_unit: Callable[[T], bytes]) -> int:
+    """
+    Compute the fingerprint of a whole unit sequence.
+
+    Args:
+        units: Units to fingerprint
+        serialize_unit: Function serializing a single unit to bytes
+
+    Returns:
+        Fingerprint equal to ``SpanHasher(units, serialize_unit).fingerprint(0, len(units))``
+    """
+    value = 0
+    for unit in units:
+        data = serialize_unit(unit)
+        value = (value * _shift(len(data)) + int.from_bytes(data, "big")) % _MODULUS
+    return value
+
+
+class SpanHasher(Generic[T]):
+    """
+    Constant-time fingerprints for every contiguous span of a unit sequence.
+
+    Each unit is serialized exactly once. Prefix fingerprints and byte offsets
+    are kept so the fingerprint of ``units[start:end]`` is a single modular
+    subtraction, instead of re-serializing and re-hashing the whole span.
+
+    Fingerprints are not cryptographic: equal spans always share a fingerprint,
+    but a match must be verified before it is trusted.
+    """
+
+    def __init__(self, units: Sequence[T], serialize_unit: Callable[[T], bytes]):
+        """
+        Initialize the hasher.
+
+        Args:
+            units: Unit sequence whose spans will be fingerprinted
+            serialize_unit: Function serializing a single unit to bytes
+        """
+        prefix = [0]
+        offsets = [0]
+        value = 0
+        offset = 0
+        for unit in units:
+            data = serialize_unit(unit)
+            value = (value * _shift(len(data)) + int.from_bytes(data, "big")) % _MODULUS
+            offset += len(data)
+            prefix.append(value)
+            offsets.append(offset)
+
+        self._prefix = prefix
+        self._offsets = offsets
+
+    def fingerprint(self, start: int, end: int) -> int:
+        """Return the fingerprint of ``units[start:end]``."""
+        span_bytes = self._offsets[end] - self._offsets[start]
+        return (self._prefix[end] - self._prefix[start] * _shift(span_bytes)) % _MODULUS
+
+
+class OccurrenceIndex(Generic[T]):
+    """
+    Index of old chunks for locating their occurrences in a new unit sequence.
+
+    Chunks are keyed by their first unit and unit count, holding the span
+    fingerprints seen for that key. Scanning a new sequence then only checks,
+    at every position, the chunk lengths that start with the unit found there,
+    in the manner of Rabin-Karp multi-pattern search.
+    """
+
+    def __init__(self, serialize_unit: Callable[[T], bytes]):
+        """
+        Initialize an empty index.
+
+        Args:
+            serialize_unit: Function serializing a single unit to bytes
+        """
+        self.serialize_unit = serialize_unit
+        self._entries: dict[T, dict[int, set[int]]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of distinct (first unit, unit count, fingerprint) keys."""
+        return sum(len(fps) for lengths in self._entries.values() for fps in lengths.values())
+
+    def add(self, units: Sequence[T]) -> None:
+        """Add the units of an old chunk to the index."""
+        if units:
+            self.add_fingerprint(
+                units[0], len(units), fingerprint_units(units, self.serialize_unit)
+            )
+
+    def add_fingerprint(self, first_unit: T, length: int, fingerprint: int) -> None:
+        """Add an old chunk by its first unit, unit count and fingerprint."""
+        self._entries.setdefault(first_unit, {}).setdefault(length, set()).add(fingerprint)
+
+    def find(
+        self, units: Sequence[T], span_hasher: SpanHasher[T], start: int, end: int, stop: int
+    ) -> list[tuple[int, int]]:
+        """
+        Find spans of ``units`` whose fingerprint matches an indexed chunk.
+
+        Matches are candidates only: equal fingerprints must still be verified
+        against the chunk hashes.
+
+        Args:
+            units: New unit sequence
+            span_hasher: Hasher over ``units[start:stop]``
+            start: First position a match may start at
+            end: Position matches must start before
+            stop: Position matches must end at or before
+
+        Returns:
+            (start, end) spans over ``units``, ordered by start position
+        """
+        entries = self._entries
+        matches: list[tuple[int, int]] = []
+        for i in range(start, end):
+            lengths = entries.get(units[i])
+            if lengths is None:
+                continue
+            for length, fingerprints in lengths.items():
+                j = i + length
+                if j <= stop and span_hasher.fingerprint(i - start, j - start) in fingerprints:
+                    matches.append((i, j))
+        return matches
+
+
+class LengthIndex(Generic[T]):
+    """
+    Index of old chunks known only by their digests and unit counts.
+
+    Without the units of the old chunks there is nothing to fingerprint, so
+    every span whose unit count matches an old chunk length is a candidate.
+    The number of candidates grows with the number of distinct lengths, which
+    stays small for token chunks that mostly fill the chunk size.
+    """
+
+    def __init__(self, lengths: Iterable[int]):
+        """
+        Initialize the index.
+
+        Args:
+            lengths: Unit counts of the old chunks
+        """
+        self._lengths = sorted(set(lengths))
+
+    def __len__(self) -> int:
+        """Return the number of distinct chunk lengths."""
+        return len(self._lengths)
+
+    def find(
+        self, units: Sequence[T], span_hasher: SpanHasher[T], start: int, end: int, stop: int
+    ) -> list[tuple[int, int]]:
+        """
+        Find spans of ``units`` with the length of an old chunk.
+
+        Takes the arguments of :meth:`OccurrenceIndex.find`; every match must
+        be verified against the chunk hashes.
+
+        Returns:
+            (start, end) spans over ``units``, ordered by start position
+        """
+        lengths = self._lengths
+        return [
+            (i, i + length) for i in range(start, end) for length in lengths if i + length <= stop
+        ]
+
+
+class SortedOccurrenceIndex(Generic[T]):
+    """
+    Occurrence index of old chunks held in flat sorted NumPy columns.
+
+    A compact stand-in for :class:`OccurrenceIndex` where the index is sent to
+    worker processes: distinct (first unit, unit count) keys and chunk
+    fingerprints are kept as sorted integer columns, 20 bytes per chunk at
+    most, instead of nested dictionaries and sets. First units are keyed by
+    their own fingerprint and fingerprints are not paired with their key, so
+    it finds a superset of the spans :class:`OccurrenceIndex` finds; hash
+    verification discards the extra ones.
+    """
+
+    def __init__(self, chunks: Iterable[tuple[T, int, int]], serialize_unit: Callable[[T], bytes]):
+        """
+        Initialize the index.
+
+        Args:
+            chunks: First unit, unit count and fingerprint of every old chunk
+                with units
+            serialize_unit: Function serializing a single unit to bytes
+        """
+        keys = array("Q")
+        lengths = array("Q")
+        fingerprints = array("Q")
+        for first_unit, length, fingerprint in chunks:
+            keys.append(fingerprint_units((first_unit,), serialize_unit))
+            lengths.append(length)
+            fingerprints.append(fingerprint)
+
+        pairs = np.empty(len(keys), dtype=[("key", np.uint64), ("length", np.uint64)])
+        pairs["key"] = np.frombuffer(keys, dtype=np.uint64)
+        pairs["length"] = np.frombuffer(lengths, dtype=np.uint64)
+        pairs = np.unique(pairs)
+        self._keys = pairs["key"].copy()
+        self._lengths = pairs["length"].astype(np.uint32)
+        self._fingerprints = np.unique(np.frombuffer(fingerprints, dtype=np.uint64))
+
+    @classmethod
+    def from_units(
+        cls, chunk_units: Iterable[Sequence[T]], serialize_unit: Callable[[T], bytes]
+    ) -> "SortedOccurrenceIndex[T]":
+        """Index old chunks by their units."""
+        return cls(
+            (
+                (units[0], len(units), fingerprint_units(units, serialize_unit))
+                for units in chunk_units
+                if units
+            ),
+            serialize_unit,
+        )
+
+    def __len__(self) -> int:
+        """Return the number of distinct chunk fingerprints."""
+        return len(self._fingerprints)
+
+    def find(
+        self, units: Sequence[T], span_hasher: SpanHasher[T], start: int, end: int, stop: int
+    ) -> list[tuple[int, int]]:
+        """
+        Find spans of ``units`` whose fingerprint matches an indexed chunk.
+
+        Takes the arguments of :meth:`OccurrenceIndex.find`; every match must
+        be verified against the chunk hashes.
+
+        Returns:
+            (start, end) spans over ``units``, ordered by start position
+        """
+        if end <= start or not len(self._keys):
+            return []
+        fingerprint = span_hasher.fingerprint
+        unit_keys = np.fromiter(
+            (fingerprint(k, k + 1) for k in range(end - start)), np.uint64, end - start
+        )
+        lows = np.searchsorted(self._keys, unit_keys, "left")
+        highs = np.searchsorted(self._keys, unit_keys, "right")
+
+        spans: list[tuple[int, int]] = []
+        span_fingerprints: list[int] = []
+        for k in np.flatnonzero(highs > lows).tolist():
+            i = start + k
+            for length in self._lengths[lows[k] : highs[k]].tolist():
+                j = i + length
+                if j <= stop:
+                    spans.append((i, j))
+                    span_fingerprints.append(fingerprint(k, j - start))
+        if not spans:
+            return []
+
+        found = np.array(span_fingerprints, dtype=np.uint64)
+        positions = np.searchsorted(self._fingerprints, found)
+        positions[positions == len(self._fingerprints)] = 0
+        hits = self._fingerprints[positions] == found
+        return [span for span, hit in zip(spans, hits.tolist()) if hit]
+
+
+class SortedDigests:
+    """
+    Exact set of tagged digests held as a sorted NumPy column.
+
+    Stores 17 bytes per distinct digest instead of a dictionary entry and a
+    bytes object, and answers membership by binary search.
+    """
+
+    def __init__(self, digests: np.ndarray):
+        """
+        Initialize the set.
+
+        Args:
+            digests: Column of tagged digests with a ``V17`` dtype, in any
+                order and possibly repeated
+        """
+        self.column = np.unique(digests)
+
+    def __len__(self) -> int:
+        """Number of distinct digests."""
+        return len(self.column)
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Iterate over the digests in sorted order."""
+        raw = self.column.tobytes()
+        return (raw[i : i + DIGEST_SIZE] for i in range(0, len(raw), DIGEST_SIZE))
+
+    def __contains__(self, digest: object) -> bool:
+        """Return whether ``digest`` is in the set."""
+        if not isinstance(digest, bytes) or len(digest) != DIGEST_SIZE:
+            return False
+        key = np.frombuffer(digest, dtype=self.column.dtype)
+        position = int(np.searchsorted(self.column, key)[0])
+        return position < len(self.column) and self.column[position] == key[0]
+
+
+# Blocked Bloom filter: all probes of a key fall in one 512-bit block, a cache line
+_BLOOM_BLOCK_BITS = 512
+_BLOOM_PROBE_BITS = 9  # log2 of the block size
+_BLOOM_MAX_PROBES = 64 // _BLOOM_PROBE_BITS
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set of tagged digests, backed by a NumPy bit array.
+
+    Digest bytes are already uniformly distributed, so they are used as the
+    hash directly: the first 8 bytes after the tag pick a 512-bit block and
+    the next 8 bytes supply the bit positions probed within it. Lookups never
+    miss a member, but may accept a non-member with a small probability that
+    shrinks as ``bits_per_key`` grows (about 1% at 10 bits per key).
+    """
+
+    def __init__(self, digests: Collection[bytes], bits_per_key: int = 10):
+        """
+        Build the filter.
+
+        Args:
+            digests: Tagged digests to add
+            bits_per_key: Bits of the filter per digest
+        """
+        if bits_per_key < 1:
+            raise ValueError(f"bits_per_key must be positive, got {bits_per_key}.")
+        self.num_probes = max(1, min(_BLOOM_MAX_PROBES, round(bits_per_key * math.log(2))))
+        self.num_blocks = max(1, -(-len(digests) * bits_per_key // _BLOOM_BLOCK_BITS))
+
+        if isinstance(digests, SortedDigests):
+            keys = digests.column.view(np.uint8).reshape(-1, DIGEST_SIZE)
+        else:
+            keys = np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, DIGEST_SIZE)
+        block_keys = keys[:, 1:9].copy().view("<u8").ravel()
+        probe_keys = keys[:, 9:17].copy().view("<u8").ravel()
+        positions = (block_keys % np.uint64(self.num_blocks)) * np.uint64(_BLOOM_BLOCK_BITS)
+        bits = np.zeros(self.num_blocks * _BLOOM_BLOCK_BITS // 8, dtype=np.uint8)
+        for probe in range(self.num_probes):
+            offsets = (probe_keys >> np.uint64(probe * _BLOOM_PROBE_BITS)) & np.uint64(511)
+            bit = positions + offsets
+            masks = np.left_shift(np.uint8(1), (bit & np.uint64(7)).astype(np.uint8))
+            np.bitwise_or.at(bits, bit >> np.uint64(3), masks)
+        self._bits = bits.tobytes()
+
+    def __contains__(self, digest: object) -> bool:
+        """Return whether ``digest`` may have been added."""
+        if not isinstance(digest, bytes) or len(digest) != DIGEST_SIZE:
+            return False
+        block_key = int.from_bytes(digest[1:9], "little")
+        probe_key = int.from_bytes(digest[9:17], "little")
+        position = (block_key % self.num_blocks) * _BLOOM_BLOCK_BITS
+        bits = self._bits
+        for probe in range(self.num_probes):
+            bit = position + ((probe_key >> (probe * _BLOOM_PROBE_BITS)) & 511)
+            if not bits[bit >> 3] >> (bit & 7) & 1:
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the bit array in bytes."""
+        return len(self._bits)
+
+
+class PrefilteredDigests:
+    """
+    Old digests for the reuse test, held as a Bloom filter with exact confirmation.
+
+    Membership is answered by the filter, so it may accept a digest that is
+    not an old chunk. Such false hits are found afterwards with
+    :meth:`confirm` and can be excluded from a new solve. Pickling keeps only
+    the filter and the exclusions, so worker processes receive a compact
+    object instead of the whole inventory.
+    """
+
+    def __init__(
+        self,
+        exact: Optional[Container[bytes]],
+        bloom: BloomFilter,
+        excluded: frozenset[bytes] = frozenset(),
+    ):
+        """
+        Initialize the membership test.
+
+        Args:
+            exact: Exact old digests, consulted only by :meth:`confirm`
+            bloom: Bloom filter of the old digests
+            excluded: Digests known not to be old chunks
+        """
+        self._exact = exact
+        self.bloom = bloom
+        self.excluded = excluded
+
+    def __contains__(self, digest: object) -> bool:
+        """Return whether ``digest`` may be an old chunk."""
+        return digest in self.bloom and digest not in self.excluded
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Drop the exact digests when pickling."""
+        state = self.__dict__.copy()
+        state["_exact"] = None
+        return state
+
+    def confirm(self, digest: bytes) -> bool:
+        """Return whether ``digest`` is an old chunk, using the exact digests."""
+        if self._exact is None:
+            raise RuntimeError("Exact digests are not available after pickling.")
+        return digest in self._exact
+
+    def excluding(self, digests: Iterable[bytes]) -> "PrefilteredDigests":
+        """Return a copy that also rejects ``digests``."""
+        return PrefilteredDigests(self._exact, self.bloom, self.excluded | frozenset(digests))
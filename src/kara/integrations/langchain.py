@@ -2,11 +2,18 @@
 LangChain integration for kara-toolkit.
 """
 
-from collections.abc import Collection
+import copy
+import json
+import os
+import sqlite3
+import warnings
+from collections import OrderedDict
+from collections.abc import Collection, Hashable, Iterable
 from collections.abc import Set as AbstractSet
 from typing import Any, Literal, Optional, Union
 
 try:
+    from langchain_core.documents import Document
     from langchain_text_splitters.base import TextSplitter
 except ImportError as e:
     raise ImportError(
@@ -14,8 +21,9 @@ except ImportError as e:
         "Please install it with: pip install kara-toolkit[langchain]"
     ) from e
 
-from ..chunkers import BaseDocumentChunker
-from ..core import ChunkedDocument, KARAUpdater, UpdateResult
+from ..chunkers import BaseDocumentChunker, serialize_unit
+from ..core import ChunkedDocument, CollectionState, HashRecord, KARAUpdater, UpdateResult
+from ..hashing import fingerprint_units
 
 
 class KARATextSplitter(TextSplitter):
@@ -24,12 +32,31 @@ class KARATextSplitter(TextSplitter):
 
     This splitter maintains compatibility with LangChain's ecosystem while
     providing efficient chunk updates through the KARA algorithm.
+
+    With a ``source_key``, :meth:`split_documents` and :meth:`create_documents`
+    keep a separate collection per value of that metadata field, so documents
+    from different sources update their own previous chunks instead of
+    replacing each other's. Documents of a batch sharing a source, such as the
+    pages of a file, are updated together as the documents of one collection.
+    Up to ``max_sources`` collections are kept in memory, least recently used
+    first out. With a ``state_path``, the chunk records of every source are also
+    saved to a SQLite database, from which evicted sources and later runs are
+    restored as :class:`~kara.core.CollectionState`. Without one, an evicted
+    source starts over from scratch the next time it is split.
+
+    Example:
+        >>> splitter = KARATextSplitter(chunker, source_key="source", state_path="kara.sqlite")
+        >>> chunks = splitter.split_documents(loader.load())
     """
 
     def __init__(
         self,
         chunker: BaseDocumentChunker,
         previous_chunks: Optional[list[str]] = None,
+        previous_records: Optional[Iterable[HashRecord]] = None,
+        source_key: Optional[str] = None,
+        max_sources: int = 128,
+        state_path: Optional[Union[str, "os.PathLike[str]"]] = None,
         **kwargs: Any,
     ):
         """
@@ -38,8 +65,24 @@ class KARATextSplitter(TextSplitter):
         Args:
             chunker: Chunker instance to use for splitting
             previous_chunks: Optional list of previous chunks for incremental updates
+            previous_records: Optional ``(hash, document_id, length[, first_unit,
+                fingerprint])`` records of the previous chunks, as stored in
+                vector-store metadata. Used instead of ``previous_chunks`` to
+                restart without re-tokenizing; the split text is document ``0``. See
+                :meth:`~kara.core.CollectionState.from_records`.
+            source_key: Optional metadata field whose value identifies the
+                source of a document, keying the state of split documents.
+                Documents without the field share one state.
+            max_sources: Maximum number of source collections kept in memory.
+                Without a ``state_path``, evicting a source discards its
+                previous chunks, with a warning.
+            state_path: Optional path of a SQLite database persisting the
+                chunk hashes, lengths and fingerprints of every source,
+                created if it does not exist
             **kwargs: Additional arguments passed to TextSplitter
         """
+        if max_sources < 1:
+            raise ValueError(f"max_sources must be positive, got {max_sources}.")
         super().__init__(
             chunk_size=chunker.chunk_size,
             chunk_overlap=chunker.overlap,
@@ -48,6 +91,7 @@ class KARATextSplitter(TextSplitter):
 
         self._kara_chunker = chunker
         self._last_result: Optional[UpdateResult] = None
+        self._last_source_results: dict[Hashable, UpdateResult] = {}
 
         # Initialize KARA updater
         self.kara_updater = KARAUpdater(
@@ -55,12 +99,37 @@ class KARATextSplitter(TextSplitter):
         )
 
         # Store current document collection
-        self._current_collection: Optional[ChunkedDocument] = None
-        if previous_chunks is not None:
+        self._current_collection: Optional[Union[ChunkedDocument, CollectionState]] = None
+        if previous_records is not None:
+            self._current_collection = CollectionState.from_records(previous_records)
+        elif previous_chunks is not None:
             self._current_collection = ChunkedDocument.from_chunks(
                 previous_chunks, self._kara_chunker
             )
 
+        # Collections by source, least recently used first
+        self.source_key = source_key
+        self.max_sources = max_sources
+        self._sources: OrderedDict[Hashable, Union[ChunkedDocument, CollectionState]] = (
+            OrderedDict()
+        )
+        self._state_db: Optional[sqlite3.Connection] = None
+        if state_path is not None:
+            self._state_db = sqlite3.connect(os.fspath(state_path))
+            self._state_db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (source TEXT NOT NULL, "
+                "document INTEGER NOT NULL, position INTEGER NOT NULL, "
+                "digest BLOB NOT NULL, length INTEGER NOT NULL, "
+                "first_unit TEXT, fingerprint INTEGER, "
+                "PRIMARY KEY (source, document, position))"
+            )
+            # Databases from before fingerprints were saved restore without them
+            columns = {row[1] for row in self._state_db.execute("PRAGMA table_info(chunks)")}
+            for column, column_type in (("first_unit", "TEXT"), ("fingerprint", "INTEGER")):
+                if column not in columns:
+                    self._state_db.execute(f"ALTER TABLE chunks ADD COLUMN {column} {column_type}")
+            self._state_db.commit()
+
     @classmethod
     def from_tiktoken_encoder(
         cls,
@@ -148,6 +217,11 @@ class KARATextSplitter(TextSplitter):
         """Get the result of the last split operation."""
         return self._last_result
 
+    @property
+    def last_source_results(self) -> dict[Hashable, UpdateResult]:
+        """Get the result of every source of the last split with a ``source_key``."""
+        return self._last_source_results
+
     def split_text(self, text: str) -> list[str]:
         """
         Split text using KARA algorithm.
@@ -170,7 +244,161 @@ class KARATextSplitter(TextSplitter):
             self._current_collection = self._last_result.new_chunked_doc
 
         # Type guard to ensure we have a valid collection
-        if self._current_collection is None:
+        if not isinstance(self._current_collection, ChunkedDocument):
             return []
 
         return self._current_collection.get_chunk_contents()
+
+    def create_documents(
+        self, texts: list[str], metadatas: Optional[list[dict[Any, Any]]] = None
+    ) -> list[Document]:
+        """
+        Split texts into LangChain documents.
+
+        Without a ``source_key``, every text updates the state of
+        :meth:`split_text` in turn. With one, texts are grouped by source and
+        every source is updated once, against its own previous chunks.
+        :attr:`last_source_results` then holds the result of every source,
+        whose documents are numbered by their order in the batch, and
+        :attr:`last_result` sums their counts.
+
+        Args:
+            texts: Texts to split
+            metadatas: Optional metadata of every text, copied to its chunks
+
+        Returns:
+            Chunks of every text as documents, in order
+        """
+        if self.source_key is None:
+            return super().create_documents(texts, metadatas)
+
+        metadatas_ = metadatas or [{}] * len(texts)
+        groups: dict[Hashable, list[int]] = {}
+        for i, metadata in enumerate(metadatas_):
+            groups.setdefault(_source_of(metadata.get(self.source_key)), []).append(i)
+
+        splits: list[list[str]] = [[] for _ in texts]
+        self._last_source_results = {}
+        for source, indices in groups.items():
+            source_result = self._split_source(source, [texts[i] for i in indices])
+            self._last_source_results[source] = source_result
+            collection = source_result.new_chunked_doc
+            assert collection is not None
+            for document_id, i in enumerate(indices):
+                splits[i] = [
+                    chunk.content for chunk in collection.get_chunks_by_document(document_id)
+                ]
+        results = self._last_source_results.values()
+        # Deltas of different sources refer to the same document ids, so only counts add up
+        self._last_result = UpdateResult(
+            num_added=sum(result.num_added for result in results),
+            num_reused=sum(result.num_reused for result in results),
+            num_deleted=sum(result.num_deleted for result in results),
+        )
+
+        documents = []
+        for text, chunks, metadata in zip(texts, splits, metadatas_):
+            index = 0
+            previous_chunk_len = 0
+            for chunk in chunks:
+                chunk_metadata = copy.deepcopy(metadata)
+                if self._add_start_index:
+                    offset = index + previous_chunk_len - self._chunk_overlap
+                    index = text.find(chunk, max(0, offset))
+                    chunk_metadata["start_index"] = index
+                    previous_chunk_len = len(chunk)
+                documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
+
+    def close(self) -> None:
+        """Close the database persisting source states."""
+        if self._state_db is not None:
+            self._state_db.close()
+            self._state_db = None
+
+    def _split_source(self, source: Hashable, texts: list[str]) -> UpdateResult:
+        """Update the collection of a source with its texts, one document per text."""
+        previous = self._sources.pop(source, None)
+        if previous is None:
+            previous = self._load_source(source)
+        if previous is None:
+            result = self.kara_updater.create_collection(texts)
+        else:
+            result = self.kara_updater.update_collection(previous, texts)
+        collection = result.new_chunked_doc
+        assert collection is not None
+
+        self._sources[source] = collection
+        while len(self._sources) > self.max_sources:
+            evicted, _ = self._sources.popitem(last=False)
+            if self._state_db is None:
+                warnings.warn(
+                    f"Evicted the previous chunks of source {evicted!r}; it will be split "
+                    "from scratch. Raise max_sources or pass a state_path to keep them.",
+                    UserWarning,
+                    stacklevel=3,
+                )
+        self._save_source(source, collection)
+        return result
+
+    def _load_source(self, source: Hashable) -> Optional[CollectionState]:
+        """Restore the state of a source from the database, if it was saved."""
+        if self._state_db is None:
+            return None
+        rows = self._state_db.execute(
+            "SELECT digest, document, length, first_unit, fingerprint FROM chunks "
+            "WHERE source = ? ORDER BY document, position",
+            (json.dumps(source),),
+        ).fetchall()
+        if not rows:
+            return None
+        records: list[HashRecord] = [
+            (bytes(digest), doc, length)
+            if fingerprint is None
+            else (
+                bytes(digest),
+                doc,
+                length,
+                None if first_unit is None else json.loads(first_unit),
+                fingerprint,
+            )
+            for digest, doc, length, first_unit, fingerprint in rows
+        ]
+        return CollectionState.from_records(records)
+
+    def _save_source(self, source: Hashable, collection: ChunkedDocument) -> None:
+        """Replace the saved chunk records of a source."""
+        if self._state_db is None:
+            return
+        key = json.dumps(source)
+        positions: dict[Any, int] = {}
+        rows = []
+        for chunk in collection.chunks:
+            position = positions.get(chunk.document_id, 0)
+            positions[chunk.document_id] = position + 1
+            units = chunk.units
+            rows.append(
+                (
+                    key,
+                    chunk.document_id,
+                    position,
+                    chunk.digest,
+                    len(units),
+                    json.dumps(units[0]) if units else None,
+                    fingerprint_units(units, serialize_unit),
+                )
+            )
+        with self._state_db:
+            self._state_db.execute("DELETE FROM chunks WHERE source = ?", (key,))
+            self._state_db.executemany(
+                "INSERT INTO chunks (source, document, position, digest, length, "
+                "first_unit, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+def _source_of(value: Any) -> Hashable:
+    """Return a metadata value as a source key that survives a JSON round trip."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
@@ -0,0 +1,224 @@
+"""
+Asynchronous updates that overlap solving documents with embedding their chunks.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Iterator, Sequence
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional, TypeVar, Union
+
+from .cache import EmbeddingCache
+from .core import (
+    ChunkDelta,
+    ChunkedDocument,
+    CollectionState,
+    DocumentUpdate,
+    KARAUpdater,
+    _ChunkMatcher,
+)
+
+T = TypeVar("T")
+
+Embedder = Callable[[list[Any]], Awaitable[Sequence[Any]]]
+
+
+class _PendingDocument:
+    """A solved document waiting for the embeddings of its added chunks."""
+
+    __slots__ = ("update", "done", "remaining")
+
+    def __init__(self, update: DocumentUpdate[Any], done: "asyncio.Future[None]", remaining: int):
+        self.update = update
+        self.done = done
+        self.remaining = remaining
+
+
+# Chunk contents to embed, with the document and index each embedding belongs to
+_Batch = list[tuple[_PendingDocument, int, Any]]
+
+
+class _Solver:
+    """Solves documents one at a time and pairs their chunks, off the event loop."""
+
+    def __init__(
+        self,
+        updater: KARAUpdater[T],
+        current_collection: Union[ChunkedDocument[T], CollectionState],
+        documents: list[str],
+        executor: Optional[Executor],
+        cache: Optional[EmbeddingCache],
+    ):
+        self._cache = cache
+        self._solved: Iterator[list[Any]] = updater._solve_update(
+            current_collection, documents, executor
+        )
+        self._matcher = _ChunkMatcher(
+            current_collection.iter_document_digests(), current_collection.digest_counts
+        )
+
+    def solve_next(
+        self, document_id: int, embed: bool
+    ) -> tuple[DocumentUpdate[Any], list[tuple[int, Any]]]:
+        """
+        Solve the next document and return its update with the contents to embed.
+
+        The contents are paired with their index in ``update.embeddings``,
+        which already holds the embeddings found in the cache.
+        """
+        chunks = next(self._solved)
+        delta = ChunkDelta()
+        unmatched = self._matcher.pair_in_document(
+            document_id, [chunk.digest for chunk in chunks], delta
+        )
+        self._matcher.pair_anywhere(unmatched, delta)
+        update = DocumentUpdate(document_id, chunks, delta)
+        if not embed:
+            return update, []
+        added = [chunks[position] for _, position in delta.added]
+        if self._cache is None:
+            update.embeddings = [None] * len(added)
+        else:
+            update.embeddings = self._cache.get_many([chunk.digest for chunk in added])
+        contents = [
+            (index, chunk.content)
+            for index, (chunk, embedding) in enumerate(zip(added, update.embeddings))
+            if embedding is None
+        ]
+        update.num_cached = len(added) - len(contents)
+        return update, contents
+
+    def finish(self) -> DocumentUpdate[Any]:
+        """Return the last update, listing the old chunks that were not reused."""
+        return DocumentUpdate(None, [], ChunkDelta(deleted=self._matcher.unpaired()))
+
+
+async def run_update_pipeline(
+    updater: KARAUpdater[T],
+    current_collection: Union[ChunkedDocument[T], CollectionState],
+    documents: list[str],
+    embed: Optional[Embedder],
+    executor: Optional[Executor],
+    batch_size: int,
+    max_concurrency: int,
+    max_pending_batches: int,
+    max_pending_documents: int,
+    cache: Optional[EmbeddingCache],
+) -> AsyncIterator[DocumentUpdate[T]]:
+    """
+    Solve documents in a worker thread while their chunks are embedded.
+
+    See :meth:`KARAUpdater.aupdate`, which validates the arguments.
+    """
+    loop = asyncio.get_running_loop()
+    # Solved documents in order, then the last update, then None
+    ready: asyncio.Queue[Union[tuple[DocumentUpdate[T], asyncio.Future[None]], None]] = (
+        asyncio.Queue()
+    )
+    batches: asyncio.Queue[Optional[_Batch]] = asyncio.Queue(max_pending_batches)
+    in_flight = asyncio.Semaphore(max_pending_documents)
+    idle_workers = 0
+    errors: list[BaseException] = []
+
+    async def solve() -> None:
+        batch: _Batch = []
+
+        async def flush() -> None:
+            nonlocal batch
+            if batch:
+                await batches.put(batch)
+                batch = []
+
+        try:
+            solver = await loop.run_in_executor(
+                None, _Solver, updater, current_collection, documents, executor, cache
+            )
+            for document_id in range(len(documents)):
+                if in_flight.locked():
+                    # Documents waiting to be consumed may wait for this batch
+                    await flush()
+                await in_flight.acquire()
+                update, contents = await loop.run_in_executor(
+                    None, solver.solve_next, document_id, embed is not None
+                )
+                done = loop.create_future()
+                if contents:
+                    pending = _PendingDocument(update, done, len(contents))
+                    for index, content in contents:
+                        batch.append((pending, index, content))
+                        if len(batch) == batch_size:
+                            await flush()
+                else:
+                    done.set_result(None)
+                ready.put_nowait((update, done))
+                if idle_workers and batches.empty():
+                    await flush()
+            await flush()
+            last = loop.create_future()
+            last.set_result(None)
+            ready.put_nowait((solver.finish(), last))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            ready.put_nowait(None)
+        for _ in range(max_concurrency if embed is not None else 0):
+            await batches.put(None)
+
+    async def embed_batches() -> None:
+        nonlocal idle_workers
+        assert embed is not None
+        while True:
+            idle_workers += 1
+            batch = await batches.get()
+            idle_workers -= 1
+            if batch is None:
+                return
+            try:
+                embeddings = await embed([content for _, _, content in batch])
+                if len(embeddings) != len(batch):
+                    raise ValueError(
+                        f"embed returned {len(embeddings)} embeddings for {len(batch)} contents."
+                    )
+                if cache is not None:
+                    await loop.run_in_executor(
+                        None,
+                        cache.put_many,
+                        [_digest_of(pending, index) for pending, index, _ in batch],
+                        embeddings,
+                    )
+            except Exception as error:
+                for pending, _, _ in batch:
+                    if not pending.done.done():
+                        pending.done.set_exception(error)
+                continue
+            for (pending, index, _), embedding in zip(batch, embeddings):
+                assert pending.update.embeddings is not None
+                pending.update.embeddings[index] = embedding
+                pending.remaining -= 1
+                if pending.remaining == 0 and not pending.done.done():
+                    pending.done.set_result(None)
+
+    tasks = [asyncio.ensure_future(solve())]
+    if embed is not None:
+        tasks.extend(asyncio.ensure_future(embed_batches()) for _ in range(max_concurrency))
+    try:
+        while True:
+            item = await ready.get()
+            if item is None:
+                break
+            update, done = item
+            await done
+            yield update
+            if update.document_id is not None:
+                in_flight.release()
+        if errors:
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _digest_of(pending: _PendingDocument, index: int) -> bytes:
+    """Return the digest of the added chunk an embedding of a batch belongs to."""
+    update = pending.update
+    return update.chunks[update.delta.added[index][1]].digest
@@ -0,0 +1,288 @@
+"""
+Binary on-disk format for chunk collections, written incrementally and read through mmap.
+
+A collection file holds, in order:
+
+- an 8-byte magic string;
+- the little-endian ``uint32`` unit buffer of every chunk, streamed as documents are written;
+- padding to an 8-byte boundary;
+- the ``int64`` chunk offsets into the unit buffer (one more than the chunks);
+- the ``int64`` document code of every chunk;
+- the ``int64`` first chunk of every document, plus the number of chunks;
+- the 17-byte tagged digest of every chunk;
+- the document ids as a UTF-8 JSON list, in order of their codes;
+- a fixed-size footer locating the sections, ending with the magic string.
+
+Since the per-chunk tables follow the units, a writer only keeps them in
+memory (33 bytes per chunk) while the units go straight to disk. Readers map
+the file and view every section as a NumPy array without copying.
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Sequence
+from itertools import groupby
+from operator import attrgetter
+from types import TracebackType
+from typing import IO, Any, NamedTuple, Optional, Union
+
+import numpy as np
+
+from .core import ChunkData, DocumentId
+from .hashing import DIGEST_SIZE
+
+_MAGIC = b"KARACOL1"
+_FORMAT_VERSION = 1
+# num_chunks, num_units, num_documents, tables position, digests position,
+# document ids position, document ids size, format version, magic
+_FOOTER = struct.Struct("<QQQQQQQQ8s")
+
+DIGEST_DTYPE = np.dtype(f"V{DIGEST_SIZE}")
+UNIT_DTYPE = np.dtype("<u4")
+# Item type of the array("I") units of ChunkData
+NATIVE_UNIT_DTYPE = np.dtype("I")
+_INDEX_DTYPE = np.dtype("<i8")
+
+PathOrFile = Union[str, "os.PathLike[str]", IO[bytes]]
+
+
+class CollectionColumns(NamedTuple):
+    """Columns of a stored collection, as read by :func:`read_columns`."""
+
+    digests: np.ndarray
+    codes: np.ndarray
+    offsets: np.ndarray
+    units: np.ndarray
+    document_ids: list[Optional[DocumentId]]
+    document_starts: np.ndarray
+
+
+class CollectionWriter:
+    """
+    Incremental writer of a collection file.
+
+    Chunks are appended document by document, and the units of every document
+    are written out as soon as it is added. When writing to a path, the file
+    is written next to it and moved into place on :meth:`close`, so a
+    collection mapped from the same path stays readable until then.
+
+    Example:
+        >>> with CollectionWriter("collection.kara") as writer:
+        ...     for chunks in document_chunks:
+        ...         writer.add_chunks(chunks)
+    """
+
+    def __init__(self, file: PathOrFile):
+        """
+        Initialize the writer.
+
+        Args:
+            file: Path or binary file object to write to
+        """
+        self._path: Optional[str] = None
+        self._file: IO[bytes]
+        if isinstance(file, (str, os.PathLike)):
+            self._path = os.fspath(file)
+            self._file = open(self._path + ".tmp", "wb")
+        else:
+            self._file = file
+
+        self._file.write(_MAGIC)
+        self._num_units = 0
+        self._lengths: list[np.ndarray] = []
+        self._digests: list[bytes] = []
+        self._document_ids: list[Optional[DocumentId]] = []
+        self._written_ids: set[Optional[DocumentId]] = set()
+        self._document_starts: list[int] = []
+        self._num_chunks = 0
+        self._closed = False
+
+    def __enter__(self) -> "CollectionWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_chunks(self, chunks: Sequence[ChunkData[int]]) -> None:
+        """
+        Append chunks, grouped by document.
+
+        Args:
+            chunks: Chunks holding integer units between 0 and 2**32 - 1. All
+                chunks of a document must be added contiguously.
+        """
+        for document_id, group in groupby(chunks, key=attrgetter("document_id")):
+            document_chunks = list(group)
+            digests, lengths, units = chunk_columns(document_chunks)
+            self.add_columns(document_id, digests, lengths, units)
+
+    def add_columns(
+        self,
+        document_id: Optional[DocumentId],
+        digests: np.ndarray,
+        lengths: np.ndarray,
+        units: np.ndarray,
+    ) -> None:
+        """
+        Append consecutive chunks of a document given as columns.
+
+        Args:
+            document_id: Document the chunks belong to
+            digests: Tagged digest of every chunk
+            lengths: Unit count of every chunk
+            units: Units of the chunks, concatenated
+        """
+        if not self._document_ids or self._document_ids[-1] != document_id:
+            if document_id in self._written_ids:
+                raise ValueError(f"Chunks of document {document_id} must be written contiguously.")
+            self._written_ids.add(document_id)
+            self._document_ids.append(document_id)
+            self._document_starts.append(self._num_chunks)
+
+        self._file.write(np.ascontiguousarray(units, dtype=UNIT_DTYPE).tobytes())
+        self._num_units += len(units)
+        self._lengths.append(np.asarray(lengths, dtype=_INDEX_DTYPE))
+        self._digests.append(digests.tobytes())
+        self._num_chunks += len(lengths)
+
+    def close(self) -> None:
+        """Write the chunk tables and footer, and move the file into place."""
+        if self._closed:
+            return
+        self._closed = True
+
+        position = len(_MAGIC) + self._num_units * UNIT_DTYPE.itemsize
+        padding = -position % _INDEX_DTYPE.itemsize
+        self._file.write(b"\0" * padding)
+        tables_position = position + padding
+
+        lengths = np.concatenate([np.zeros(1, dtype=_INDEX_DTYPE), *self._lengths])
+        starts = np.array([*self._document_starts, self._num_chunks], dtype=_INDEX_DTYPE)
+        codes = np.repeat(np.arange(len(self._document_ids), dtype=_INDEX_DTYPE), np.diff(starts))
+        for table in (np.cumsum(lengths, dtype=_INDEX_DTYPE), codes, starts):
+            self._file.write(table.tobytes())
+
+        digests_position = tables_position + (2 * self._num_chunks + len(starts) + 1) * 8
+        for digests in self._digests:
+            self._file.write(digests)
+        document_ids = json.dumps(self._document_ids).encode("utf-8")
+        ids_position = digests_position + self._num_chunks * DIGEST_SIZE
+        self._file.write(document_ids)
+        self._file.write(
+            _FOOTER.pack(
+                self._num_chunks,
+                self._num_units,
+                len(self._document_ids),
+                tables_position,
+                digests_position,
+                ids_position,
+                len(document_ids),
+                _FORMAT_VERSION,
+                _MAGIC,
+            )
+        )
+
+        if self._path is not None:
+            self._file.close()
+            os.replace(self._path + ".tmp", self._path)
+
+    def abort(self) -> None:
+        """Discard a file written to a path, leaving any existing file in place."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._path is not None:
+            self._file.close()
+            os.remove(self._path + ".tmp")
+
+
+def read_columns(file: PathOrFile) -> CollectionColumns:
+    """
+    Read the columns of a collection file.
+
+    Paths are memory-mapped read-only and every column is a zero-copy view
+    of the mapping; binary file objects are read into memory.
+
+    Args:
+        file: Path or binary file object written by :class:`CollectionWriter`
+
+    Returns:
+        CollectionColumns of the stored collection
+    """
+    buffer: Any
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        buffer = file.read()
+
+    if len(buffer) < len(_MAGIC) + _FOOTER.size or buffer[: len(_MAGIC)] != _MAGIC:
+        raise ValueError("Not a KARA collection file.")
+    (
+        num_chunks,
+        num_units,
+        num_documents,
+        tables_position,
+        digests_position,
+        ids_position,
+        ids_size,
+        version,
+        magic,
+    ) = _FOOTER.unpack_from(buffer, len(buffer) - _FOOTER.size)
+    if magic != _MAGIC:
+        raise ValueError("Not a KARA collection file.")
+    if version != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported KARA collection file version {version}.")
+
+    def view(dtype: np.dtype, count: int, position: int) -> np.ndarray:
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=position)
+
+    offsets = view(_INDEX_DTYPE, num_chunks + 1, tables_position)
+    codes = view(_INDEX_DTYPE, num_chunks, tables_position + (num_chunks + 1) * 8)
+    starts = view(_INDEX_DTYPE, num_documents + 1, tables_position + (2 * num_chunks + 1) * 8)
+    return CollectionColumns(
+        digests=view(DIGEST_DTYPE, num_chunks, digests_position),
+        codes=codes,
+        offsets=offsets,
+        units=view(UNIT_DTYPE, num_units, len(_MAGIC)),
+        document_ids=json.loads(bytes(buffer[ids_position : ids_position + ids_size])),
+        document_starts=starts,
+    )
+
+
+def chunk_columns(chunks: Sequence[ChunkData[int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the digest, unit count and unit columns of chunks.
+
+    Args:
+        chunks: Chunks holding integer units between 0 and 2**32 - 1
+
+    Returns:
+        Tuple of the digest, unit count and concatenated unit arrays
+    """
+    for chunk in chunks:
+        # ChunkData keeps token ids that fit 32 bits as array("I")
+        if chunk.units and not isinstance(chunk.units, array):
+            raise TypeError(
+                "Columnar collections only store integer units between 0 and 2**32 - 1, "
+                f"such as token ids, got chunk units {chunk.units[:3]!r}."
+            )
+    lengths = np.fromiter((len(chunk.units) for chunk in chunks), dtype=np.int64, count=len(chunks))
+    # array("I") holds native C unsigned ints; the columns hold little-endian uint32
+    units = np.frombuffer(
+        b"".join(chunk.units.tobytes() for chunk in chunks if chunk.units),  # type: ignore[attr-defined]
+        dtype=NATIVE_UNIT_DTYPE,
+    ).astype(UNIT_DTYPE, copy=False)
+    digests = np.frombuffer(b"".join(chunk.digest for chunk in chunks), dtype=DIGEST_DTYPE)
+    return digests, lengths, units
@@ -0,0 +1,230 @@
+"""
+In-process vector store that applies the chunk deltas of KARA updates in place.
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from .core import ChunkDelta, ChunkRef, DocumentUpdate, UpdateResult
+
+
+class LocalVectorStore:
+    """
+    Brute-force vector store backed by a contiguous float32 matrix.
+
+    Every chunk of a collection owns a row of the matrix, addressed by the
+    ``(document_id, position)`` reference that :class:`~kara.core.ChunkDelta`
+    uses. Applying a delta moves reused chunks to their new reference without
+    touching their rows, frees the rows of deleted chunks and writes added
+    chunks into freed rows first, so the matrix is only reallocated when it
+    runs out of rows, doubling its capacity.
+
+    Example:
+        >>> store = LocalVectorStore(dim=1536)
+        >>> result = updater.update_collection(collection, documents)
+        >>> store.apply(result, embeddings.embed_documents(contents_of_added))
+        >>> store.search(query_vector, k=5)
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024, normalize: bool = False):
+        """
+        Initialize an empty store.
+
+        Args:
+            dim: Dimension of the embeddings
+            capacity: Number of rows allocated up front
+            normalize: Whether to scale embeddings and queries to unit length,
+                so that scores are cosine similarities instead of dot products
+        """
+        if dim < 1:
+            raise ValueError(f"dim must be positive, got {dim}.")
+        if capacity < 0:
+            raise ValueError(f"capacity must not be negative, got {capacity}.")
+        self.dim = dim
+        self.normalize = normalize
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        # Rows below _num_rows are in use or on the free-list; the rest were never used
+        self._num_rows = 0
+        self._free: list[int] = []
+        self._rows: dict[ChunkRef, int] = {}
+        self._refs: list[Optional[ChunkRef]] = []
+
+    def __len__(self) -> int:
+        """Number of stored chunks."""
+        return len(self._rows)
+
+    def __contains__(self, ref: object) -> bool:
+        """Check whether a chunk reference is stored."""
+        return ref in self._rows
+
+    @property
+    def capacity(self) -> int:
+        """Number of allocated rows."""
+        return int(self._matrix.shape[0])
+
+    @property
+    def num_free_rows(self) -> int:
+        """Number of allocated rows not holding a chunk."""
+        return self.capacity - len(self._rows)
+
+    def get(self, ref: ChunkRef) -> np.ndarray:
+        """
+        Return the stored embedding of a chunk.
+
+        Args:
+            ref: ``(document_id, position)`` of the chunk
+
+        Returns:
+            Read-only view of the embedding row
+        """
+        row = self._matrix[self._rows[ref]]
+        row.flags.writeable = False
+        return row
+
+    def apply(
+        self,
+        update: Union[UpdateResult[Any], ChunkDelta],
+        embeddings: Sequence[Any],
+    ) -> None:
+        """
+        Apply the delta of an update.
+
+        Old chunks are looked up before any new chunk is stored, since old and
+        new chunks share references. Chunks not listed in the delta, such as
+        the untouched documents of :meth:`~kara.core.KARAUpdater.update_documents`,
+        keep their rows.
+
+        Args:
+            update: UpdateResult with a delta, or the delta itself
+            embeddings: Embedding of every ``delta.added`` chunk, in order
+
+        Raises:
+            ValueError: If the delta is missing, refers to chunks that are not
+                stored or to an old chunk twice, or does not match the embeddings
+        """
+        delta = update if isinstance(update, ChunkDelta) else update.delta
+        if delta is None:
+            raise ValueError("The update has no delta; create the updater with compute_delta=True.")
+        vectors = self._as_matrix(embeddings)
+        if len(vectors) != len(delta.added):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(delta.added)} added chunks.")
+        old_refs = [*delta.reused.values(), *delta.deleted]
+        missing = [ref for ref in old_refs if ref not in self._rows]
+        if missing:
+            raise ValueError(f"The delta refers to chunks that are not stored: {missing[:5]}")
+        if len(set(old_refs)) != len(old_refs):
+            raise ValueError("The delta reuses or deletes an old chunk more than once.")
+
+        reused_rows = [(new, self._rows.pop(old)) for new, old in delta.reused.items()]
+        for ref in delta.deleted:
+            row = self._rows.pop(ref)
+            self._refs[row] = None
+            self._free.append(row)
+        for ref, row in reused_rows:
+            self._rows[ref] = row
+            self._refs[row] = ref
+
+        rows = self._allocate(len(delta.added))
+        self._matrix[rows] = vectors
+        for ref, row in zip(delta.added, rows.tolist()):
+            self._rows[ref] = row
+            self._refs[row] = ref
+
+    def apply_updates(self, updates: Iterable[DocumentUpdate[Any]]) -> None:
+        """
+        Apply the updates of a :meth:`~kara.core.KARAUpdater.aupdate` run.
+
+        The per-document deltas of a run reuse old chunks across documents,
+        so they are combined and applied at once.
+
+        Args:
+            updates: Every update of the run, each with its embeddings
+        """
+        delta = ChunkDelta()
+        embeddings: list[Any] = []
+        for update in updates:
+            if update.delta.added and update.embeddings is None:
+                raise ValueError(f"Update of document {update.document_id} has no embeddings.")
+            delta.added.extend(update.delta.added)
+            delta.deleted.extend(update.delta.deleted)
+            delta.reused.update(update.delta.reused)
+            embeddings.extend(update.embeddings or [])
+        self.apply(delta, embeddings)
+
+    def search(self, query: Any, k: int = 4) -> list[tuple[ChunkRef, float]]:
+        """
+        Return the stored chunks most similar to a query embedding.
+
+        Args:
+            query: Query embedding
+            k: Number of chunks to return
+
+        Returns:
+            Up to ``k`` ``(reference, score)`` pairs, best first
+        """
+        return self.search_batch([query], k)[0]
+
+    def search_batch(
+        self, queries: Sequence[Any], k: int = 4
+    ) -> list[list[tuple[ChunkRef, float]]]:
+        """
+        Return the stored chunks most similar to each of several query embeddings.
+
+        Scores of all queries are computed with a single matrix product.
+
+        Args:
+            queries: Query embeddings
+            k: Number of chunks to return per query
+
+        Returns:
+            Up to ``k`` ``(reference, score)`` pairs per query, best first
+        """
+        if k < 1:
+            raise ValueError(f"k must be positive, got {k}.")
+        query_matrix = self._as_matrix(queries)
+        k = min(k, len(self._rows))
+        if k == 0:
+            return [[] for _ in range(len(query_matrix))]
+
+        scores = query_matrix @ self._matrix[: self._num_rows].T
+        if self._free:
+            scores[:, self._free] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(self._refs[row], score) for row, score in zip(rows, row_scores)]  # type: ignore[misc]
+            for rows, row_scores in zip(top.tolist(), top_scores.tolist())
+        ]
+
+    def _as_matrix(self, embeddings: Sequence[Any]) -> np.ndarray:
+        """Convert embeddings to a float32 matrix, normalized if requested."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.size == 0:
+            return vectors.reshape(0, self.dim)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape}.")
+        if self.normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return vectors
+
+    def _allocate(self, num_rows: int) -> np.ndarray:
+        """Take rows from the free-list, then unused rows, growing the matrix if needed."""
+        reused = min(num_rows, len(self._free))
+        rows = self._free[len(self._free) - reused :]
+        del self._free[len(self._free) - reused :]
+        fresh = num_rows - reused
+        if self._num_rows + fresh > self.capacity:
+            capacity = max(self._num_rows + fresh, 2 * self.capacity)
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[: self._num_rows] = self._matrix[: self._num_rows]
+            self._matrix = matrix
+        rows.extend(range(self._num_rows, self._num_rows + fresh))
+        self._refs.extend([None] * fresh)
+        self._num_rows += fresh
+        return np.asarray(rows, dtype=np.intp)
@@ -263,6 +263,93 @@ class TestKARADataDriven:
             # Edge cases can be either single or multi-document
             assert scenario.is_single_document() or scenario.is_multi_document()
 
+    @pytest.mark.parametrize(
+        "scenario_name",
+        [
+            "middle_insertion",
+            "wikipedia_style",
+            "overlap_two_units",
+            "repetitive_chunks",
+            "multi_doc_one_changed",
+            "multi_doc_removal",
+        ],
+    )
+    def test_solvers_agree(self, test_data_loader: DataLoader, scenario_name: str) -> None:
+        """Test that the DAG solver returns the same path as the Dijkstra reference."""
+        scenario = test_data_loader.load_scenario(scenario_name)
+        if scenario.is_single_document():
+            assert scenario.initial_text is not None
+            assert scenario.updated_text is not None
+            initial_documents = [scenario.initial_text]
+            updated_documents = [scenario.updated_text]
+        else:
+            assert scenario.initial_documents is not None
+            assert scenario.updated_documents is not None
+            initial_documents = scenario.initial_documents
+            updated_documents = scenario.updated_documents
+
+        results = []
+        for solver in ("dag", "dijkstra"):
+            updater = self._create_updater_from_scenario(scenario)
+            updater.solver = solver
+            initial_collection = updater.create_collection(initial_documents).new_chunked_doc
+            assert initial_collection is not None
+            results.append(updater.update_collection(initial_collection, updated_documents))
+
+        dag_result, dijkstra_result = results
+        assert dag_result.new_chunked_doc is not None
+        assert dijkstra_result.new_chunked_doc is not None
+        assert dag_result.new_chunked_doc.chunks == dijkstra_result.new_chunked_doc.chunks
+        assert dag_result.num_reused == dijkstra_result.num_reused
+
+    @pytest.mark.parametrize(
+        "scenario_name",
+        [
+            "middle_insertion",
+            "wikipedia_style",
+            "overlap_two_units",
+            "repetitive_chunks",
+            "multi_doc_one_changed",
+            "multi_doc_removal",
+        ],
+    )
+    def test_convex_solver_matches_optimum(
+        self, test_data_loader: DataLoader, scenario_name: str
+    ) -> None:
+        """Test that the convex solver reaches the same optimal cost as the DAG solver."""
+        scenario = test_data_loader.load_scenario(scenario_name)
+        if scenario.is_single_document():
+            assert scenario.initial_text is not None
+            assert scenario.updated_text is not None
+            initial_documents = [scenario.initial_text]
+            updated_documents = [scenario.updated_text]
+        else:
+            assert scenario.initial_documents is not None
+            assert scenario.updated_documents is not None
+            initial_documents = scenario.initial_documents
+            updated_documents = scenario.updated_documents
+
+        costs = []
+        for solver in ("dag", "convex"):
+            updater = self._create_updater_from_scenario(scenario)
+            updater.solver = solver
+            initial_collection = updater.create_collection(initial_documents).new_chunked_doc
+            assert initial_collection is not None
+            old_hashes = initial_collection.get_chunk_hashes()
+            result = updater.update_collection(initial_collection, updated_documents)
+            assert result.new_chunked_doc is not None
+            cost = 0.0
+            for chunk in result.new_chunked_doc.chunks:
+                length = sum(updater.chunker.unit_length(unit) for unit in chunk.splits)
+                cost += (1 - length / updater.max_chunk_size) ** 2
+                cost += 0 if chunk.hash in old_hashes else 1
+            costs.append((cost, len(result.new_chunked_doc.chunks), result.num_reused))
+
+        (dag_cost, dag_count, dag_reused), (convex_cost, convex_count, convex_reused) = costs
+        assert convex_cost == pytest.approx(dag_cost)
+        assert convex_count == dag_count
+        assert convex_reused == dag_reused
+
     @pytest.mark.parametrize("scenario_name", ["invalid_parameters"])
     def test_exception_scenarios(self, test_data_loader: DataLoader, scenario_name: str) -> None:
         """Test scenarios that are expected to raise exceptions."""
@@ -2,8 +2,18 @@
 Integration tests using examples from the examples directory.
 """
 
-from kara.chunkers import CharacterChunker
-from kara.core import KARAUpdater
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from kara.accounting import MIN_MEMORY_BUDGET
+from kara.cache import EmbeddingCache
+from kara.chunkers import CharacterChunker, TokenChunker
+from kara.columnar import ColumnarChunkedDocument
+from kara.core import ChunkedDocument, CollectionState, DocumentUpdate, KARAUpdater
+from kara.vectorstore import LocalVectorStore
 
 
 class TestExamplesIntegration:
@@ -219,3 +229,543 @@ class TestExamplesIntegration:
                 f"{result['reused']:6d} | "
                 f"{result['efficiency']:9.2f}"
             )
+
+    def test_incremental_update_workflow(self) -> None:
+        """Test that incremental updates keep untouched chunks and only solve around edits."""
+        paragraphs = [f"Paragraph {i} talks about topic number {i}. " for i in range(40)]
+        original_doc = "".join(paragraphs)
+        paragraphs[20] = "Paragraph 20 was rewritten with brand new content. "
+        updated_doc = "".join(paragraphs)
+
+        chunker = CharacterChunker(chunk_size=120, separators=[". ", " "], keep_separator=True)
+        full_updater = KARAUpdater(chunker=chunker)
+        incremental_updater = KARAUpdater(chunker=chunker, incremental=True)
+
+        initial_collection = full_updater.create_collection([original_doc]).new_chunked_doc
+        assert initial_collection is not None
+
+        full_result = full_updater.update_collection(initial_collection, [updated_doc])
+        incremental_result = incremental_updater.update_collection(
+            initial_collection, [updated_doc]
+        )
+        assert incremental_result.new_chunked_doc is not None
+
+        contents = incremental_result.new_chunked_doc.get_chunk_contents()
+        assert "".join(contents) == updated_doc
+        assert incremental_result.num_added == full_result.num_added
+        assert incremental_result.num_reused == full_result.num_reused
+
+    def test_incremental_update_with_overlap(self) -> None:
+        """Test that incremental updates rebuild overlapping chunk chains correctly."""
+        words = [f"w{i} " for i in range(60)]
+        original_doc = "".join(words)
+        words[30:30] = ["inserted ", "words "]
+        updated_doc = "".join(words)
+
+        chunker = CharacterChunker(chunk_size=20, separators=[" "], overlap=1)
+        updater = KARAUpdater(chunker=chunker, incremental=True)
+
+        initial_collection = updater.create_collection([original_doc]).new_chunked_doc
+        assert initial_collection is not None
+        result = updater.update_collection(initial_collection, [updated_doc])
+        assert result.new_chunked_doc is not None
+
+        chunks = result.new_chunked_doc.chunks
+        for prev_chunk, next_chunk in zip(chunks, chunks[1:]):
+            assert prev_chunk.splits[-1] == next_chunk.splits[0]
+        rebuilt = chunks[0].splits + [unit for chunk in chunks[1:] for unit in chunk.splits[1:]]
+        assert rebuilt == chunker._split_to_units(updated_doc)
+        assert result.num_reused > 0
+
+    def test_parallel_update_matches_serial(self) -> None:
+        """Test that executor-backed updates merge results exactly like serial updates."""
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(12)]
+        updated_docs = [
+            doc.replace("topic", "subject") if i % 3 == 0 else doc
+            for i, doc in enumerate(initial_docs)
+        ]
+        updated_docs.append("A brand new document. It covers topic 1. Nothing else here.")
+
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        serial_updater = KARAUpdater(chunker=chunker)
+        initial_collection = serial_updater.create_collection(initial_docs).new_chunked_doc
+        assert initial_collection is not None
+
+        serial_result = serial_updater.update_collection(initial_collection, updated_docs)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            threaded_result = serial_updater.update_collection(
+                initial_collection, updated_docs, executor=executor
+            )
+        process_result = KARAUpdater(chunker=chunker, max_workers=2).update_collection(
+            initial_collection, updated_docs
+        )
+
+        assert serial_result.new_chunked_doc is not None
+        for result in (threaded_result, process_result):
+            assert result.new_chunked_doc is not None
+            assert result.new_chunked_doc.chunks == serial_result.new_chunked_doc.chunks
+            assert result.num_added == serial_result.num_added
+            assert result.num_reused == serial_result.num_reused
+            assert result.num_deleted == serial_result.num_deleted
+
+    def test_hash_algorithm_migration_workflow(self) -> None:
+        """Test migrating a stored MD5 collection to another hash algorithm."""
+        original_doc = "First sentence here. Second sentence here. Third sentence here."
+        updated_doc = "First sentence here. Second sentence changed. Third sentence here."
+
+        md5_chunker = CharacterChunker(chunk_size=30, separators=[". "], keep_separator=True)
+        md5_collection = KARAUpdater(chunker=md5_chunker).create_collection([original_doc])
+        assert md5_collection.new_chunked_doc is not None
+        assert md5_collection.new_chunked_doc.get_hash_algorithms() == {"md5"}
+
+        chunker = CharacterChunker(
+            chunk_size=30, separators=[". "], keep_separator=True, hash_algorithm="blake2b"
+        )
+        updater = KARAUpdater(chunker=chunker)
+        with pytest.raises(ValueError, match="rehash"):
+            updater.update_collection(md5_collection.new_chunked_doc, [updated_doc])
+
+        migrated = md5_collection.new_chunked_doc.rehash(chunker)
+        assert migrated.get_hash_algorithms() == {"blake2b"}
+        assert migrated.get_chunk_contents() == md5_collection.new_chunked_doc.get_chunk_contents()
+
+        result = updater.update_collection(migrated, [updated_doc])
+        assert result.new_chunked_doc is not None
+        assert result.num_reused == 2
+        assert result.num_added == 1
+        assert all(chunk.hash.startswith("blake2b:") for chunk in result.new_chunked_doc.chunks)
+
+    def test_update_documents_workflow(self) -> None:
+        """Test patching a collection keyed by stable ids with a change feed."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker)
+        documents = {
+            f"doc-{i}": f"Document {i}. It covers topic {i}. Nothing else here." for i in range(5)
+        }
+
+        created = updater.update_documents(ChunkedDocument[str](chunks=[]), documents)
+        collection = created.new_chunked_doc
+        assert collection is not None
+        assert created.num_reused == 0
+        assert collection.get_document_ids() == set(documents)
+        untouched = collection.get_chunks_by_document("doc-1")
+
+        result = updater.update_documents(
+            collection,
+            {
+                "doc-0": "Document 0. It covers subject 0. Nothing else here.",
+                "doc-3": None,
+                "doc-new": "A new document. Nothing else here.",
+            },
+        )
+
+        assert result.new_chunked_doc is collection
+        assert collection.get_document_ids() == {"doc-0", "doc-1", "doc-2", "doc-4", "doc-new"}
+        assert all(
+            new is old for new, old in zip(collection.get_chunks_by_document("doc-1"), untouched)
+        )
+        assert "".join(c.content for c in collection.get_chunks_by_document("doc-0")) == (
+            "Document 0. It covers subject 0. Nothing else here."
+        )
+        # Reuse is counted against the listed documents only
+        assert (result.num_added, result.num_reused, result.num_deleted) == (3, 1, 3)
+        assert collection.digest_counts == ChunkedDocument(chunks=collection.chunks).digest_counts
+
+    def test_update_documents_matches_update_collection_counts(self) -> None:
+        """Test that delta accounting agrees with a full update of the same change."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker)
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(6)]
+        updated_docs = list(initial_docs)
+        updated_docs[2] = "Document 2. It covers topic 2 and more. Nothing else here."
+        updated_docs[4] = "Document 4 was rewritten. Nothing else here."
+
+        full = updater.update_collection(
+            updater.create_collection(initial_docs).new_chunked_doc,  # type: ignore[arg-type]
+            updated_docs,
+        )
+        collection = updater.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        partial = updater.update_documents(collection, {2: updated_docs[2], 4: updated_docs[4]})
+
+        assert full.new_chunked_doc is not None
+        assert collection.chunks == full.new_chunked_doc.chunks
+        assert partial.num_added == full.num_added
+        assert partial.num_deleted == full.num_deleted
+
+    def test_columnar_collection_workflow(self) -> None:
+        """Test that a columnar collection updates like a ChunkedDocument."""
+        chunker = TokenChunker(
+            tokenizer_function=lambda text: [int(token) for token in text.split()], chunk_size=4
+        )
+        updater = KARAUpdater(chunker=chunker)
+        initial_docs = ["1 2 3 4 5 6 7 8 9", "10 11 12 13 14", "15 16 17"]
+        updated_docs = ["1 2 3 4 5 6 0 7 8 9", "10 11 12 13 14", "18 19"]
+
+        collection = updater.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        columnar = ColumnarChunkedDocument.from_collection(collection)
+
+        expected = updater.update_collection(collection, updated_docs)
+        result = updater.update_collection(columnar, updated_docs)
+        assert isinstance(result.new_chunked_doc, ColumnarChunkedDocument)
+        assert expected.new_chunked_doc is not None
+        assert result.new_chunked_doc.chunks == expected.new_chunked_doc.chunks
+        assert (result.num_added, result.num_reused, result.num_deleted) == (
+            expected.num_added,
+            expected.num_reused,
+            expected.num_deleted,
+        )
+
+        changes = {1: "10 11 12 13 14 20", 2: None}
+        patched = updater.update_documents(result.new_chunked_doc, changes)
+        assert patched.new_chunked_doc is result.new_chunked_doc
+        assert result.new_chunked_doc.get_document_ids() == {0, 1}
+        assert patched.num_reused == 1
+
+    def test_update_collection_writes_output_file(self, tmp_path: Path) -> None:
+        """Test streaming an update of a mapped collection back to its own file."""
+        chunker = TokenChunker(
+            tokenizer_function=lambda text: [int(token) for token in text.split()], chunk_size=4
+        )
+        updater = KARAUpdater(chunker=chunker)
+        initial_docs = ["1 2 3 4 5 6 7 8 9", "10 11 12 13 14"]
+        updated_docs = ["1 2 3 4 5 6 0 7 8 9", "10 11 12 13 14", "15 16"]
+
+        collection = updater.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        path = tmp_path / "collection.kara"
+        ColumnarChunkedDocument.from_collection(collection).save(path)
+        mapped = ColumnarChunkedDocument.load(path)
+
+        expected = updater.update_collection(collection, updated_docs)
+        result = updater.update_collection(mapped, updated_docs, output=path)
+
+        assert isinstance(result.new_chunked_doc, ColumnarChunkedDocument)
+        assert expected.new_chunked_doc is not None
+        assert result.new_chunked_doc.chunks == expected.new_chunked_doc.chunks
+        assert ColumnarChunkedDocument.load(path).chunks == expected.new_chunked_doc.chunks
+        assert mapped.chunks == collection.chunks
+        assert (result.num_added, result.num_reused, result.num_deleted) == (
+            expected.num_added,
+            expected.num_reused,
+            expected.num_deleted,
+        )
+
+    def test_update_from_hash_only_state(self) -> None:
+        """Test that a hash-only state yields the same update as the full collection."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker)
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(4)]
+        updated_docs = list(initial_docs)
+        updated_docs[1] = "Document 1. It covers topic 1 and more. Nothing else here."
+        del updated_docs[3]
+
+        collection = updater.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        state = CollectionState.from_collection(collection)
+
+        expected = updater.update_collection(collection, updated_docs)
+        result = updater.update_collection(state, updated_docs)
+
+        assert isinstance(result.new_chunked_doc, ChunkedDocument)
+        assert expected.new_chunked_doc is not None
+        assert result.new_chunked_doc.chunks == expected.new_chunked_doc.chunks
+        assert (result.num_added, result.num_reused, result.num_deleted) == (
+            expected.num_added,
+            expected.num_reused,
+            expected.num_deleted,
+        )
+        assert result.num_reused > 0
+
+    def test_update_from_stored_records(self) -> None:
+        """Test restarting from hashes kept in vector-store metadata."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker)
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(3)]
+        updated_docs = list(initial_docs)
+        updated_docs[0] = "Document 0. It covers topic 0 in depth. Nothing else here."
+
+        collection = updater.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        records = CollectionState.from_collection(collection).to_records()
+        metadata = [{"kara": list(record)} for record in records]
+        state = CollectionState.from_records(tuple(m["kara"]) for m in metadata)
+
+        expected = updater.update_collection(collection, updated_docs)
+        result = updater.update_collection(state, updated_docs)
+
+        assert expected.new_chunked_doc is not None
+        assert result.new_chunked_doc is not None
+        assert result.new_chunked_doc.chunks == expected.new_chunked_doc.chunks
+        assert (result.num_added, result.num_reused, result.num_deleted) == (
+            expected.num_added,
+            expected.num_reused,
+            expected.num_deleted,
+        )
+
+    def test_prefiltered_update_matches_exact(self) -> None:
+        """Test that a Bloom-filter prefilter does not change the update."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        exact = KARAUpdater(chunker=chunker)
+        # One bit per key makes false hits common, exercising their re-solve
+        prefiltered = KARAUpdater(chunker=chunker, prefilter_bits_per_key=1)
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(6)]
+        updated_docs = [doc.replace("Nothing", "Little") for doc in initial_docs[:4]]
+        updated_docs.append("A new document. It covers topic 2. Nothing else here.")
+
+        collection = exact.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+
+        expected = exact.update_collection(collection, updated_docs)
+        assert expected.new_chunked_doc is not None
+
+        for current in (collection, CollectionState.from_collection(collection)):
+            result = prefiltered.update_collection(current, updated_docs)
+            assert result.new_chunked_doc is not None
+            assert result.new_chunked_doc.get_chunk_contents() == (
+                expected.new_chunked_doc.get_chunk_contents()
+            )
+            assert (result.num_added, result.num_reused, result.num_deleted) == (
+                expected.num_added,
+                expected.num_reused,
+                expected.num_deleted,
+            )
+
+    def test_out_of_core_accounting_matches_in_memory(self, tmp_path: Path) -> None:
+        """Test that counting in spilled runs gives the in-memory counts."""
+        chunker = TokenChunker(chunk_size=4, tokenizer_function=lambda text: list(text.encode()))
+        in_memory = KARAUpdater(chunker=chunker)
+        out_of_core = KARAUpdater(chunker=chunker, accounting_memory_budget=2 * MIN_MEMORY_BUDGET)
+        initial_docs = [f"Document {i} covers topic {i % 7} in detail." * 20 for i in range(10)]
+        updated_docs = [doc.replace("detail", "depth") for doc in initial_docs[:6]]
+        updated_docs.extend(initial_docs[6:9])
+
+        collection = in_memory.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        expected = in_memory.update_collection(collection, updated_docs)
+
+        for current in (collection, CollectionState.from_collection(collection)):
+            result = out_of_core.update_collection(current, updated_docs)
+            assert (result.num_added, result.num_reused, result.num_deleted) == (
+                expected.num_added,
+                expected.num_reused,
+                expected.num_deleted,
+            )
+
+        result = out_of_core.update_collection(
+            collection, updated_docs, output=tmp_path / "collection.kara"
+        )
+        assert result.num_reused == expected.num_reused
+        assert result.num_deleted == expected.num_deleted
+
+    def test_prefiltered_mapped_update_skips_inventory(self, tmp_path: Path) -> None:
+        """Test that a prefiltered out-of-core update of a mapped collection stays exact."""
+        chunker = TokenChunker(chunk_size=4, tokenizer_function=lambda text: list(text.encode()))
+        exact = KARAUpdater(chunker=chunker)
+        bounded = KARAUpdater(
+            chunker=chunker,
+            prefilter_bits_per_key=1,
+            accounting_memory_budget=2 * MIN_MEMORY_BUDGET,
+        )
+        initial_docs = [f"Document {i} covers topic {i % 7} in detail." * 5 for i in range(10)]
+        updated_docs = [doc.replace("detail", "depth") for doc in initial_docs[:6]]
+
+        collection = exact.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        expected = exact.update_collection(collection, updated_docs)
+        path = tmp_path / "collection.kara"
+        ColumnarChunkedDocument.from_collection(collection).save(path)
+        mapped = ColumnarChunkedDocument.load(path)
+
+        result = bounded.update_collection(mapped, updated_docs, output=tmp_path / "new.kara")
+
+        assert mapped._digest_counts_cache is None
+        assert result.new_chunked_doc is not None and expected.new_chunked_doc is not None
+        assert result.new_chunked_doc.chunks == expected.new_chunked_doc.chunks
+        assert (result.num_added, result.num_reused, result.num_deleted) == (
+            expected.num_added,
+            expected.num_reused,
+            expected.num_deleted,
+        )
+
+    def test_update_delta_applies_to_vector_store(self) -> None:
+        """Test that applying the delta of an update to stored vectors keeps their ids."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker, compute_delta=True)
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(4)]
+        updated_docs = [initial_docs[2], initial_docs[0].replace("topic 0", "topic zero")]
+        updated_docs.append("A new document. Nothing else here.")
+
+        initial = updater.create_collection(initial_docs)
+        collection = initial.new_chunked_doc
+        assert collection is not None and initial.delta is not None
+        # Vector ids by chunk location, as a vector store would keep them
+        store = {ref: f"id-{i}" for i, ref in enumerate(initial.delta.added)}
+        contents = {ref: collection.get_chunks_by_document(ref[0])[ref[1]].content for ref in store}
+
+        result = updater.update_collection(collection, updated_docs)
+        delta = result.delta
+        assert delta is not None and result.new_chunked_doc is not None
+        # Deltas are opt-in; the counts do not depend on them
+        counted = KARAUpdater(chunker=chunker).update_collection(collection, updated_docs)
+        assert counted.delta is None
+        assert (counted.num_added, counted.num_reused, counted.num_deleted) == (
+            result.num_added,
+            result.num_reused,
+            result.num_deleted,
+        )
+        assert (len(delta.added), len(delta.reused), len(delta.deleted)) == (
+            result.num_added,
+            result.num_reused,
+            result.num_deleted,
+        )
+
+        new_store = {ref: store[old_ref] for ref, old_ref in delta.reused.items()}
+        new_store.update((ref, f"new-{i}") for i, ref in enumerate(delta.added))
+        assert set(store.values()) - set(new_store.values()) == {store[r] for r in delta.deleted}
+        new_chunks = result.new_chunked_doc
+        for ref, old_ref in delta.reused.items():
+            assert new_chunks.get_chunks_by_document(ref[0])[ref[1]].content == contents[old_ref]
+        assert len(new_store) == new_chunks.num_chunks
+        # The unchanged document moved from position 2 to 0 and kept its vectors
+        assert delta.reused[(0, 0)] == (2, 0)
+
+    def test_local_vector_store_follows_updates(self) -> None:
+        """Test that a local store applying each kind of update holds the collection's chunks."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker, compute_delta=True)
+        docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(4)]
+        revised = [docs[3], docs[0].replace("topic 0", "topic zero"), "A new one. Short."]
+
+        def embed(contents: list[str]) -> list[list[float]]:
+            return [[float(len(content)), float(content.count(" "))] for content in contents]
+
+        def added_contents(collection: ChunkedDocument[str], refs: list[tuple]) -> list[str]:
+            return [
+                collection.get_chunks_by_document(doc)[position].content for doc, position in refs
+            ]
+
+        def assert_matches(store: LocalVectorStore, collection: ChunkedDocument[str]) -> None:
+            refs = [
+                (doc, position)
+                for doc in collection.get_document_ids()
+                for position in range(len(collection.get_chunks_by_document(doc)))
+            ]
+            assert len(store) == len(refs)
+            for ref, vector in zip(refs, embed(added_contents(collection, refs))):
+                assert store.get(ref).tolist() == vector
+
+        store = LocalVectorStore(dim=2)
+        result = updater.create_collection(docs)
+        collection = result.new_chunked_doc
+        assert collection is not None and result.delta is not None
+        store.apply(result, embed(added_contents(collection, result.delta.added)))
+
+        async def embed_async(contents: list[str]) -> list[list[float]]:
+            return embed(contents)
+
+        async def run() -> list[DocumentUpdate[str]]:
+            return [update async for update in updater.aupdate(collection, revised, embed_async)]
+
+        store.apply_updates(asyncio.run(run()))
+        collection = updater.update_collection(collection, revised).new_chunked_doc
+        assert collection is not None
+        assert_matches(store, collection)
+        capacity = store.capacity
+
+        result = updater.update_documents(collection, {1: docs[1], 2: None})
+        assert result.delta is not None
+        store.apply(result, embed(added_contents(collection, result.delta.added)))
+        assert_matches(store, collection)
+        assert store.capacity == capacity
+
+    def test_aupdate_embeds_while_solving(self) -> None:
+        """Test the async update against a fake embedding service with latency."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker)
+        initial_docs = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(6)]
+        updated_docs = [
+            doc.replace("Nothing else", f"More on {i}") for i, doc in enumerate(initial_docs)
+        ]
+        del updated_docs[4]
+
+        collection = updater.create_collection(initial_docs).new_chunked_doc
+        assert collection is not None
+        expected = updater.update_collection(collection, updated_docs)
+
+        calls: list[int] = []
+        active = 0
+        peak = 0
+
+        async def embed(contents: list[str]) -> list[tuple[str, int]]:
+            nonlocal active, peak
+            calls.append(len(contents))
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return [(content, len(content)) for content in contents]
+
+        async def run() -> list[DocumentUpdate[str]]:
+            return [
+                update
+                async for update in updater.aupdate(
+                    collection, updated_docs, embed, batch_size=2, max_concurrency=2
+                )
+            ]
+
+        updates = asyncio.run(run())
+
+        assert [update.document_id for update in updates] == [*range(len(updated_docs)), None]
+        for update in updates[:-1]:
+            assert update.embeddings is not None
+            contents = [update.chunks[position].content for _, position in update.delta.added]
+            assert [content for content, _ in update.embeddings] == contents
+        assert (
+            sum(len(update.delta.added) for update in updates),
+            sum(len(update.delta.reused) for update in updates),
+            len(updates[-1].delta.deleted),
+        ) == (expected.num_added, expected.num_reused, expected.num_deleted)
+        assert sum(calls) == expected.num_added
+        assert max(calls) <= 2
+        assert peak <= 2
+
+    def test_aupdate_reuses_cached_embeddings_after_revert(self, tmp_path: Path) -> None:
+        """Test that chunks returning after a revert take their embeddings from the cache."""
+        chunker = CharacterChunker(chunk_size=30, separators=[". ", " "], keep_separator=True)
+        updater = KARAUpdater(chunker=chunker)
+        original = [f"Document {i}. It covers topic {i}. Nothing else here." for i in range(4)]
+        edited = original[:2] + original[3:]
+        calls: list[list[str]] = []
+
+        async def embed(contents: list[str]) -> list[list[float]]:
+            calls.append(contents)
+            return [[float(len(content))] for content in contents]
+
+        async def run(
+            collection: ChunkedDocument[str], documents: list[str], cache: EmbeddingCache
+        ) -> list[DocumentUpdate[str]]:
+            updates = updater.aupdate(collection, documents, embed, cache=cache)
+            return [update async for update in updates]
+
+        empty = updater.create_collection([]).new_chunked_doc
+        first = updater.create_collection(original).new_chunked_doc
+        second = updater.update_collection(first, edited).new_chunked_doc
+        assert empty is not None and first is not None and second is not None
+        path = tmp_path / "embeddings.sqlite"
+        with EmbeddingCache(path) as cache:
+            asyncio.run(run(empty, original, cache))
+            asyncio.run(run(first, edited, cache))
+        calls.clear()
+
+        with EmbeddingCache(path, max_entries=0) as cache:
+            updates = asyncio.run(run(second, original, cache))
+            assert calls == []
+            assert cache.hit_rate == 1.0
+
+        assert [update.num_cached for update in updates] == [0, 0, 2, 0, 0]
+        for update in updates[:-1]:
+            assert update.num_cached == len(update.delta.added)
+            contents = [update.chunks[position].content for _, position in update.delta.added]
+            assert update.embeddings == [[float(len(content))] for content in contents]
@@ -3,6 +3,7 @@ from typing import Any
 import pytest
 
 from kara.chunkers import CharacterChunker, OpenAITokenChunker
+from kara.core import CollectionState
 from kara.integrations.langchain import KARATextSplitter
 
 
@@ -105,3 +106,120 @@ def test_kara_text_splitter_previous_chunks() -> None:
     chunks = splitter.split_text(text)
     assert len(chunks) > 0
     # Should reuse Chunk 1 if it matches exactly (depends on chunker)
+
+
+def test_kara_text_splitter_previous_records() -> None:
+    """Test restarting KARATextSplitter from stored chunk hashes."""
+    chunker = CharacterChunker(chunk_size=20, separators=[". "], keep_separator=True)
+    text = "First sentence. Second sentence. Third sentence."
+    first = KARATextSplitter(chunker=chunker)
+    first.split_text(text)
+    assert first.last_result is not None and first.last_result.new_chunked_doc is not None
+    records = list(CollectionState.from_collection(first.last_result.new_chunked_doc).to_records())
+
+    splitter = KARATextSplitter(chunker=chunker, previous_records=records)
+    chunks = splitter.split_text("First sentence. Second sentence. Fourth sentence.")
+
+    assert chunks == ["First sentence. ", "Second sentence. ", "Fourth sentence."]
+    assert splitter.last_result is not None
+    assert splitter.last_result.num_reused == 2
+
+
+def test_kara_text_splitter_tracks_sources() -> None:
+    """Test that documents from different sources update their own previous chunks."""
+    from langchain_core.documents import Document
+
+    chunker = CharacterChunker(chunk_size=15, separators=[". "], keep_separator=True)
+    splitter = KARATextSplitter(
+        chunker=chunker, source_key="source", max_sources=2, add_start_index=True
+    )
+    docs = [
+        Document(page_content="Alpha one. Alpha two.", metadata={"source": "a"}),
+        Document(page_content="Beta one. Beta two.", metadata={"source": "b"}),
+        Document(page_content="Beta three.", metadata={"source": "b", "page": 2}),
+    ]
+    chunks = splitter.split_documents(docs)
+    assert [chunk.page_content for chunk in chunks] == [
+        "Alpha one. ",
+        "Alpha two.",
+        "Beta one. ",
+        "Beta two.",
+        "Beta three.",
+    ]
+    assert chunks[1].metadata == {"source": "a", "start_index": 11}
+    assert chunks[4].metadata["page"] == 2
+
+    docs[0].page_content = "Alpha one. Alpha 2."
+    splitter.split_documents(docs)
+    assert splitter.last_result is not None
+    assert (splitter.last_result.num_added, splitter.last_result.num_reused) == (1, 4)
+    assert splitter.last_source_results["b"].num_added == 0
+
+    # A third source evicts the least recently used one
+    with pytest.warns(UserWarning, match="source 'a'"):
+        splitter.split_documents([Document(page_content="Gamma.", metadata={"source": "c"})])
+    with pytest.warns(UserWarning, match="source 'b'"):
+        splitter.split_documents(docs[:1])
+    assert splitter.last_result.num_added == 2
+
+
+def test_kara_text_splitter_persists_sources(tmp_path: Any) -> None:
+    """Test that source states saved to disk survive eviction and restarts."""
+    from langchain_core.documents import Document
+
+    chunker = CharacterChunker(chunk_size=15, separators=[". "], keep_separator=True)
+    path = tmp_path / "sources.sqlite"
+    first = KARATextSplitter(chunker=chunker, source_key="source", max_sources=1, state_path=path)
+    first.split_documents(
+        [
+            Document(page_content="Alpha one. Alpha two.", metadata={"source": "a"}),
+            Document(page_content="Beta one. Beta two.", metadata={"source": 1}),
+        ]
+    )
+    # Restored sources keep their fingerprints for the occurrence index
+    restored = first._load_source("a")
+    assert restored is not None and restored._occurrence_index() is not None
+    first.close()
+
+    splitter = KARATextSplitter(chunker=chunker, source_key="source", state_path=path)
+    chunks = splitter.split_documents(
+        [
+            Document(page_content="Alpha one. Alpha 2.", metadata={"source": "a"}),
+            Document(page_content="Beta one. Beta two.", metadata={"source": "1"}),
+        ]
+    )
+    splitter.close()
+
+    assert [chunk.page_content for chunk in chunks[:2]] == ["Alpha one. ", "Alpha 2."]
+    assert splitter.last_source_results["a"].num_reused == 1
+    # Sources are keyed by value and type
+    assert splitter.last_source_results["1"].num_added == 2
+
+
+def test_kara_text_splitter_reads_unfingerprinted_state(tmp_path: Any) -> None:
+    """Test that a database saved without fingerprints is upgraded and still restores."""
+    import sqlite3
+
+    from langchain_core.documents import Document
+
+    chunker = CharacterChunker(chunk_size=15, separators=[". "], keep_separator=True)
+    digest = chunker.hash_units(["Alpha one. "])
+    path = tmp_path / "sources.sqlite"
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "CREATE TABLE chunks (source TEXT NOT NULL, document INTEGER NOT NULL, "
+            "position INTEGER NOT NULL, digest BLOB NOT NULL, length INTEGER NOT NULL, "
+            "PRIMARY KEY (source, document, position))"
+        )
+        db.execute("INSERT INTO chunks VALUES ('\"a\"', 0, 0, ?, 1)", (digest,))
+    db.close()
+
+    splitter = KARATextSplitter(chunker=chunker, source_key="source", state_path=path)
+    restored = splitter._load_source("a")
+    assert restored is not None and restored._occurrence_index() is None
+    document = Document(page_content="Alpha one. Alpha 2.", metadata={"source": "a"})
+    splitter.split_documents([document])
+    assert splitter.last_source_results["a"].num_reused == 1
+    restored = splitter._load_source("a")
+    assert restored is not None and restored._occurrence_index() is not None
+    splitter.close()
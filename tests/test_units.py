@@ -4,17 +4,54 @@ These tests focus on testing individual classes and methods in isolation.
 For integration testing and scenario-based testing, see test_data_driven.py.
 """
 
+import asyncio
+import io
+import json
+import pickle
+import random
+from array import array
+from collections import Counter
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
 
+from kara.accounting import MIN_MEMORY_BUDGET, DigestRuns, count_operations
+from kara.cache import EmbeddingCache
 from kara.chunkers import (
     CharacterChunker,
     HuggingFaceTokenChunker,
     OpenAITokenChunker,
     TokenChunker,
 )
-from kara.core import ChunkData, ChunkedDocument
+from kara.columnar import ColumnarChunkedDocument
+from kara.core import (
+    ChunkData,
+    ChunkDelta,
+    ChunkedDocument,
+    CollectionState,
+    KARAUpdater,
+    UpdateResult,
+    _match_chunks,
+)
+from kara.hashing import (
+    BloomFilter,
+    LengthIndex,
+    OccurrenceIndex,
+    PrefilteredDigests,
+    SortedDigests,
+    SortedOccurrenceIndex,
+    SpanHasher,
+    digest_algorithm,
+    digest_from_hex,
+    digest_to_hex,
+    fingerprint_units,
+    get_hash_function,
+    hash_algorithm_of,
+)
+from kara.storage import DIGEST_DTYPE, CollectionWriter
+from kara.vectorstore import LocalVectorStore
 
 
 class TestChunkData:
@@ -37,6 +74,71 @@ class TestChunkData:
         assert chunk1.content == chunk2.content
         assert chunk1.hash == chunk2.hash
 
+    def test_constructor_accepts_hashes_and_validates_digests(self) -> None:
+        """Test that the constructor takes hex hashes and rejects malformed digests."""
+        chunk = ChunkData.from_splits(["Hello"])
+
+        assert ChunkData("Hello", ["Hello"], chunk.hash).digest == chunk.digest
+        assert ChunkData("Hello", ["Hello"], hash=chunk.hash) == chunk
+        # An untagged 16-byte digest is MD5, like an unprefixed hex hash
+        assert ChunkData("Hello", ["Hello"], chunk.digest[1:]).digest == chunk.digest
+        with pytest.raises(ValueError, match="Invalid chunk hash"):
+            ChunkData("Hello", ["Hello"], "not-hex")
+        with pytest.raises(ValueError, match="17 bytes"):
+            ChunkData("Hello", ["Hello"], b"short")
+        with pytest.raises(TypeError, match="bytes or a hex hash"):
+            ChunkData("Hello", ["Hello"], 123)  # type: ignore[arg-type]
+        with pytest.raises(TypeError, match="either digest or hash"):
+            ChunkData("Hello", ["Hello"], chunk.digest, hash=chunk.hash)
+
+    def test_token_units_are_compact(self) -> None:
+        """Test that token ids are stored as a 32-bit array behind a list interface."""
+        chunk = ChunkData.from_splits([5, 70000, 3])
+
+        assert isinstance(chunk.units, array)
+        assert chunk.splits == [5, 70000, 3]
+        assert chunk.content == [5, 70000, 3]
+        assert not hasattr(chunk, "__dict__")
+
+    def test_units_outside_uint32_stay_a_list(self) -> None:
+        """Test that units an array cannot hold keep their list storage."""
+        assert ChunkData.from_splits([-1, 2]).units == [-1, 2]
+        assert ChunkData.from_splits([2**40]).units == [2**40]
+
+    def test_content_is_rendered_lazily(self) -> None:
+        """Test that content is rendered from the units on access."""
+        renderer = MagicMock(return_value="rendered")
+        chunk = ChunkData.from_splits([1, 2], renderer=renderer)
+
+        renderer.assert_not_called()
+        assert chunk.content == "rendered"
+        assert list(renderer.call_args.args[0]) == [1, 2]
+
+    def test_pickle_round_trip(self) -> None:
+        """Test that compact chunks survive pickling."""
+        chunk = ChunkData.from_splits([1, 2, 3], document_id="doc")
+
+        assert pickle.loads(pickle.dumps(chunk)) == chunk
+
+    def test_pickle_collection_rendered_by_chunker(self) -> None:
+        """Test that pickling chunks keeps their content without pickling the chunker."""
+        chunker = TokenChunker(chunk_size=3, tokenizer_function=lambda text: list(text.encode()))
+        collection = KARAUpdater(chunker=chunker).create_collection(["abcdefg"]).new_chunked_doc
+        assert collection is not None
+
+        restored = pickle.loads(pickle.dumps(collection))
+
+        assert restored == collection
+        assert restored.chunks[0].content == chunker.render_units([97, 98, 99])
+        assert restored.chunks[0]._renderer is None
+
+    def test_from_splits_with_hasher(self) -> None:
+        """Test that a custom hasher replaces the default MD5 hash."""
+        chunk = ChunkData.from_splits(["Hello"], hasher=get_hash_function("blake2b"))
+
+        assert chunk.hash.startswith("blake2b:")
+        assert chunk.hash != ChunkData.from_splits(["Hello"]).hash
+
 
 class TestChunkedDocument:
     """Tests for ChunkedDocument class."""
@@ -70,6 +172,731 @@ class TestChunkedDocument:
         assert doc.get_chunk_hashes() == set()
         assert doc.get_chunk_contents() == []
 
+    def test_document_index(self) -> None:
+        """Test per-document lookups, grouping documents split across the list."""
+        chunks = [
+            ChunkData.from_splits([text], document_id)
+            for text, document_id in [("a", 0), ("b", 0), ("c", 1), ("a", 2), ("d", 0)]
+        ]
+        doc: ChunkedDocument[str] = ChunkedDocument(chunks=chunks)
+
+        assert doc.get_document_ids() == {0, 1, 2}
+        assert doc.get_chunks_by_document(0) == [chunks[0], chunks[1], chunks[4]]
+        assert doc.get_chunks_by_document(1) == [chunks[2]]
+        assert doc.get_chunks_by_document(3) == []
+        assert doc.has_document(2)
+        assert not doc.has_document(3)
+        assert doc.digest_counts[chunks[0].digest] == 2
+        assert doc.chunks == [chunks[0], chunks[1], chunks[4], chunks[2], chunks[3]]
+
+    def test_replace_and_remove_documents(self) -> None:
+        """Test that patching keeps the indexes equal to a rebuilt collection."""
+        rng = random.Random(0)
+        doc: ChunkedDocument[str] = ChunkedDocument(chunks=[])
+        for _ in range(200):
+            document_id = rng.randrange(6)
+            if rng.random() < 0.2:
+                doc.remove_document(document_id)
+            else:
+                new_chunks = [
+                    ChunkData.from_splits([rng.choice("abcdef")], document_id)
+                    for _ in range(rng.randrange(4))
+                ]
+                if rng.random() < 0.5:
+                    doc.replace_document(document_id, new_chunks)
+                else:
+                    doc.replace_documents({document_id: new_chunks, 6: None})
+
+            rebuilt = ChunkedDocument(chunks=list(doc.chunks))
+            assert doc.digest_counts == rebuilt.digest_counts
+            assert doc.num_chunks == len(rebuilt.chunks)
+            assert doc.get_document_ids() == rebuilt.get_document_ids()
+            for document_id in range(7):
+                assert doc.get_chunks_by_document(document_id) == (
+                    rebuilt.get_chunks_by_document(document_id)
+                )
+
+    def test_replace_document_rejects_foreign_chunks(self) -> None:
+        """Test that chunks of another document cannot be spliced in."""
+        doc: ChunkedDocument[str] = ChunkedDocument(chunks=[ChunkData.from_splits(["a"], 0)])
+
+        with pytest.raises(ValueError, match="cannot replace"):
+            doc.replace_document(0, [ChunkData.from_splits(["b"], 1)])
+
+
+class TestColumnarChunkedDocument:
+    """Tests for ColumnarChunkedDocument class."""
+
+    @staticmethod
+    def _token_chunks(rng: random.Random, document_id: int, count: int) -> list[ChunkData[int]]:
+        return [
+            ChunkData.from_splits([rng.randrange(5) for _ in range(rng.randrange(4))], document_id)
+            for _ in range(count)
+        ]
+
+    def test_matches_chunked_document(self) -> None:
+        """Test that columnar lookups match a ChunkedDocument of the same chunks."""
+        rng = random.Random(0)
+        chunks = [chunk for i in [0, 1, 0, 2] for chunk in self._token_chunks(rng, i, 3)]
+        doc: ChunkedDocument[int] = ChunkedDocument(chunks=chunks)
+        columnar = ColumnarChunkedDocument(chunks)
+
+        assert columnar.chunks == doc.chunks
+        assert columnar.num_chunks == doc.num_chunks
+        assert columnar.digest_counts == doc.digest_counts
+        assert columnar.get_chunk_hashes() == doc.get_chunk_hashes()
+        assert columnar.get_document_ids() == doc.get_document_ids()
+        assert columnar.get_hash_algorithms() == {"md5"}
+        assert columnar.get_chunks_by_document(0) == doc.get_chunks_by_document(0)
+        assert columnar.get_chunks_by_document(3) == []
+        assert isinstance(columnar.chunks[0].units, array)
+
+    def test_replace_and_remove_documents(self) -> None:
+        """Test that patching the columns matches patching a ChunkedDocument."""
+        rng = random.Random(1)
+        doc: ChunkedDocument[int] = ChunkedDocument(chunks=[])
+        columnar = ColumnarChunkedDocument([])
+        for step in range(100):
+            replacements: dict = {
+                document_id: (
+                    None if rng.random() < 0.2 else self._token_chunks(rng, document_id, 3)
+                )
+                for document_id in rng.sample(range(6), 2)
+            }
+            if step % 2:
+                # Patch a built inventory as well as a lazily built one
+                assert columnar.digest_counts == doc.digest_counts
+            doc.replace_documents(replacements)
+            columnar.replace_documents(replacements)
+
+            assert columnar.chunks == doc.chunks
+            assert columnar.digest_counts == doc.digest_counts
+            assert columnar.num_chunks == doc.num_chunks
+
+    def test_save_and_load(self) -> None:
+        """Test that saved columns load back into the same collection."""
+        chunks = [
+            ChunkData.from_splits([1, 2], 0),
+            ChunkData.from_splits([2**32 - 1], "doc"),
+            ChunkData.from_splits([], "doc"),
+        ]
+        columnar = ColumnarChunkedDocument(chunks)
+        columnar.remove_document(0)
+
+        buffer = io.BytesIO()
+        columnar.save(buffer)
+        buffer.seek(0)
+        loaded = ColumnarChunkedDocument.load(buffer)
+
+        assert loaded == columnar
+        assert loaded.get_chunks_by_document("doc") == chunks[1:]
+        assert pickle.loads(pickle.dumps(loaded)) == loaded
+
+    def test_load_maps_file(self, tmp_path: Path) -> None:
+        """Test that a saved path is memory-mapped without copying the columns."""
+        rng = random.Random(2)
+        chunks = [chunk for i in range(4) for chunk in self._token_chunks(rng, i, 3)]
+        path = tmp_path / "collection.kara"
+        ColumnarChunkedDocument(chunks).save(path)
+
+        loaded = ColumnarChunkedDocument.load(path)
+        assert not loaded._units.flags.writeable
+        assert loaded.chunks == chunks
+        assert loaded.get_chunks_by_document(2) == chunks[6:9]
+        # Units are streamed in blocks of whole chunks, and empty chunks
+        with patch("kara.columnar._UNIT_BLOCK", 2):
+            assert list(loaded.iter_units()) == [list(chunk.units) for chunk in chunks]
+
+        loaded.replace_document(1, [ChunkData.from_splits([7], 1)])
+        loaded.save(path)
+        assert ColumnarChunkedDocument.load(path) == loaded
+
+    def test_units_are_stored_little_endian(self) -> None:
+        """Test that units are written as little-endian uint32 whatever the host order."""
+        buffer = io.BytesIO()
+        ColumnarChunkedDocument([ChunkData.from_splits([1, 2**32 - 2], 0)]).save(buffer)
+
+        assert buffer.getvalue()[8:16] == b"\x01\x00\x00\x00\xfe\xff\xff\xff"
+
+    def test_mapped_file_is_not_replaced_where_locked(self, tmp_path: Path) -> None:
+        """Test that replacing the mapped file is rejected where the OS forbids it."""
+        chunker = TokenChunker(chunk_size=4, tokenizer_function=lambda text: list(text.encode()))
+        path = tmp_path / "collection.kara"
+        ColumnarChunkedDocument([ChunkData.from_splits([1, 2], 0)]).save(path)
+        loaded = ColumnarChunkedDocument.load(path)
+
+        with patch("kara.columnar._MAPPED_FILES_LOCKED", True):
+            with pytest.raises(ValueError, match="memory-mapped"):
+                loaded.save(path)
+            with pytest.raises(ValueError, match="memory-mapped"):
+                KARAUpdater(chunker=chunker).update_collection(loaded, ["abc"], output=path)
+            loaded.save(tmp_path / "other.kara")
+        assert [p.name for p in sorted(tmp_path.iterdir())] == ["collection.kara", "other.kara"]
+
+    def test_writer_rejects_split_documents(self, tmp_path: Path) -> None:
+        """Test that the writer requires contiguous documents and keeps old files."""
+        path = tmp_path / "collection.kara"
+        ColumnarChunkedDocument([ChunkData.from_splits([1], 0)]).save(path)
+
+        with pytest.raises(ValueError, match="contiguously"):
+            with CollectionWriter(path) as writer:
+                writer.add_chunks([ChunkData.from_splits([2], 0), ChunkData.from_splits([3], 1)])
+                writer.add_chunks([ChunkData.from_splits([4], 0)])
+
+        assert ColumnarChunkedDocument.load(path).chunks == [ChunkData.from_splits([1], 0)]
+        assert [p.name for p in tmp_path.iterdir()] == ["collection.kara"]
+
+    def test_load_rejects_other_files(self) -> None:
+        """Test that files in another format are rejected."""
+        with pytest.raises(ValueError, match="Not a KARA collection file"):
+            ColumnarChunkedDocument.load(io.BytesIO(b"PK\x03\x04" + bytes(100)))
+
+    def test_contents_use_renderer(self) -> None:
+        """Test that contents are rendered from the units."""
+        chunks = [ChunkData.from_splits([1, 2], 0, renderer=str)]
+        columnar = ColumnarChunkedDocument(chunks, renderer=lambda units: "-".join(map(str, units)))
+
+        assert columnar.get_chunk_contents() == ["1-2"]
+        assert columnar.to_collection().chunks[0].digest == chunks[0].digest
+
+    def test_rejects_non_token_units(self) -> None:
+        """Test that only 32-bit unsigned token ids are stored."""
+        with pytest.raises(TypeError, match="integer units"):
+            ColumnarChunkedDocument([ChunkData.from_splits(["a"])])
+        with pytest.raises(TypeError, match="integer units"):
+            ColumnarChunkedDocument([ChunkData.from_splits([-1])])
+
+
+class TestCollectionState:
+    """Tests for CollectionState class."""
+
+    def test_matches_chunked_document(self) -> None:
+        """Test that the hash-only state tracks the inventory of a collection."""
+        rng = random.Random(3)
+        doc: ChunkedDocument[str] = ChunkedDocument(chunks=[])
+        state = CollectionState()
+        for _ in range(100):
+            document_id = rng.randrange(5)
+            new_chunks = [
+                ChunkData.from_splits(list(rng.choice(["a", "bb", "abc"])), document_id)
+                for _ in range(rng.randrange(3))
+            ]
+            doc.replace_document(document_id, new_chunks)
+            state.replace_document(document_id, new_chunks)
+
+            assert state.digest_counts == doc.digest_counts
+            assert state.num_chunks == doc.num_chunks
+            assert state.get_document_ids() == doc.get_document_ids()
+            assert state.get_chunk_lengths() == {len(chunk.units) for chunk in doc.chunks}
+            assert state.get_document_digests(document_id) == [c.digest for c in new_chunks]
+        assert state == CollectionState.from_collection(doc)
+        assert pickle.loads(pickle.dumps(state)) == state
+
+    def test_from_records(self) -> None:
+        """Test rehydrating a state from stored hashes, digests and lengths."""
+        chunks = [
+            ChunkData.from_splits(["a", "b"], 0),
+            ChunkData.from_splits(["c"], "doc"),
+            ChunkData.from_splits(["a", "b"], 0),
+        ]
+        collection: ChunkedDocument[str] = ChunkedDocument(chunks=chunks)
+        records = [(chunk.hash, chunk.document_id, len(chunk.units)) for chunk in chunks]
+
+        state = CollectionState.from_records(records)
+        assert state == CollectionState.from_collection(collection)
+        assert state.get_chunk_lengths() == {1, 2}
+
+        md5 = CollectionState.from_records(
+            [(c.digest[1:], c.document_id, len(c.units)) for c in chunks]
+        )
+        assert md5.get_document_digests(0) == [chunks[0].digest, chunks[2].digest]
+        assert md5.get_hash_algorithms() == {"md5"}
+        assert md5._occurrence_index() is None
+
+        with pytest.raises(ValueError, match="length"):
+            CollectionState.from_records([(c.hash, c.document_id) for c in chunks])
+        with pytest.raises(ValueError, match="Chunk digests"):
+            CollectionState.from_records([(chunks[0].digest[:8], 0, 2)])
+
+    def test_records_round_trip(self) -> None:
+        """Test that exported records rebuild an indexed state."""
+        chunks = [
+            ChunkData.from_splits([1, 2], 0),
+            ChunkData.from_splits([], 0),
+            ChunkData.from_splits(["c"], "doc"),
+        ]
+        state = CollectionState(chunks)
+        records = json.loads(json.dumps(list(state.to_records())))
+
+        restored = CollectionState.from_records(records)
+        assert restored == state
+        index = restored._occurrence_index()
+        assert index is not None
+        assert index._entries == state._occurrence_index()._entries  # type: ignore[union-attr]
+
+    def test_occurrence_index_matches_units(self) -> None:
+        """Test that recorded fingerprints index the chunks as their units would."""
+        chunker = TokenChunker(chunk_size=4, tokenizer_function=lambda text: list(text.encode()))
+        chunks = [
+            ChunkData.from_splits(units, document_id)
+            for units, document_id in [([1, 2], 0), ([2**32 - 1], 0), (["a", "b"], 1), ([], 1)]
+        ]
+        expected: OccurrenceIndex[int] = OccurrenceIndex(chunker.serialize_unit)
+        for chunk in chunks:
+            expected.add(chunk.units)
+
+        index = CollectionState(chunks)._occurrence_index()
+        assert index is not None
+        assert index._entries == expected._entries
+        records = [(chunk.hash, chunk.document_id, len(chunk.units)) for chunk in chunks]
+        assert CollectionState.from_records(records)._occurrence_index() is None
+
+    def test_rejects_foreign_chunks(self) -> None:
+        """Test that chunks of another document cannot be recorded."""
+        with pytest.raises(ValueError, match="cannot replace"):
+            CollectionState().replace_document(0, [ChunkData.from_splits(["b"], 1)])
+
+
+class TestKARAUpdater:
+    """Tests for KARAUpdater configuration."""
+
+    def test_unknown_solver(self) -> None:
+        """Test that an unknown solver name is rejected."""
+        with pytest.raises(ValueError, match="Unknown solver"):
+            KARAUpdater(chunker=CharacterChunker(), solver="bellman-ford")  # type: ignore[arg-type]
+
+    def test_count_operations_with_duplicate_hashes(self) -> None:
+        """Test that deletions follow from reuse without scanning the old inventory."""
+        result: UpdateResult[str] = KARAUpdater._count_operations(
+            {b"a": 2, b"b": 1}, 3, {b"a": 1, b"c": 2}
+        )
+
+        assert (result.num_added, result.num_reused, result.num_deleted) == (2, 1, 2)
+
+    def test_match_chunks_prefers_own_document(self) -> None:
+        """Test that reused chunks map to distinct old chunks, of their own document first."""
+        old = [(0, [b"a", b"b"]), (1, [b"a", b"a"])]
+        new = [(0, [b"b", b"c"]), (1, [b"a"]), (2, [b"a", b"a"])]
+
+        delta = _match_chunks(old, new, {b"a", b"b"})
+
+        assert delta.reused == {(0, 0): (0, 1), (1, 0): (1, 0), (2, 0): (0, 0), (2, 1): (1, 1)}
+        assert delta.added == [(0, 1)]
+        assert delta.deleted == []
+        assert _match_chunks(old, [], {b"a", b"b"}).deleted == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+    def test_aupdate_validates_and_propagates_errors(self) -> None:
+        """Test that bad pipeline settings are rejected and embedding errors are raised."""
+        updater = KARAUpdater(chunker=CharacterChunker(chunk_size=10, separators=[" "]))
+        collection = updater.create_collection(["aaa bbb"]).new_chunked_doc
+        assert collection is not None
+        with pytest.raises(ValueError, match="max_concurrency"):
+            updater.aupdate(collection, ["aaa ccc"], max_concurrency=0)
+
+        async def embed(contents: list[str]) -> list[str]:
+            raise RuntimeError("embedding service unavailable")
+
+        async def run() -> None:
+            async for _ in updater.aupdate(collection, ["aaa ccc"], embed):
+                pass
+
+        with pytest.raises(RuntimeError, match="unavailable"):
+            asyncio.run(run())
+
+    def test_convex_solver_reuses_unchanged_chunks(self) -> None:
+        """Test that the convex solver keeps old chunks around a local edit."""
+        chunker = CharacterChunker(chunk_size=12, separators=[" "])
+        updater = KARAUpdater(chunker=chunker, solver="convex")
+        collection = updater.create_collection(["aaa bbb ccc ddd eee fff ggg hhh"]).new_chunked_doc
+        assert collection is not None
+
+        result = updater.update_collection(collection, ["aaa bbb ccc ddd XXX eee fff ggg hhh"])
+
+        assert result.num_reused == 1
+        assert result.new_chunked_doc is not None
+        assert result.new_chunked_doc.chunks[0].content == "aaa bbb ccc "
+        contents = "".join(chunk.content for chunk in result.new_chunked_doc.chunks)
+        assert contents == "aaa bbb ccc ddd XXX eee fff ggg hhh"
+
+    def test_convex_solver_rejects_oversized_unit(self) -> None:
+        """Test that the convex solver rejects units longer than the chunk size."""
+        chunker = CharacterChunker(chunk_size=5, separators=[" "])
+        updater = KARAUpdater(chunker=chunker, solver="convex")
+        collection = updater.create_collection(["ab ab"]).new_chunked_doc
+        assert collection is not None
+        with pytest.raises(ValueError, match="exceeds max chunk size"):
+            updater.update_collection(collection, ["ab abcdefgh ab"])
+
+
+class TestHashAlgorithms:
+    """Tests for configurable chunk hash algorithms."""
+
+    def test_md5_hashes_are_untagged(self) -> None:
+        """Test that MD5 keeps the legacy untagged hex digest."""
+        chunk_hash = digest_to_hex(get_hash_function("md5")(b"Hello"))
+
+        assert chunk_hash == "8b1a9953c4611296a827abf8c47804d7"
+        assert hash_algorithm_of(chunk_hash) == "md5"
+
+    @pytest.mark.parametrize("algorithm", ["blake2b", "xxh128"])
+    def test_tagged_hashes(self, algorithm: str) -> None:
+        """Test that other algorithms tag their 128-bit hex digests."""
+        if algorithm == "xxh128":
+            pytest.importorskip("xxhash")
+        digest = get_hash_function(algorithm)(b"Hello")
+        chunk_hash = digest_to_hex(digest)
+        tag, _, hex_digest = chunk_hash.partition(":")
+
+        assert len(digest) == 17
+        assert tag == algorithm
+        assert len(hex_digest) == 32
+        assert hash_algorithm_of(chunk_hash) == algorithm
+        assert digest_algorithm(digest) == algorithm
+
+    @pytest.mark.parametrize("algorithm", ["md5", "blake2b"])
+    def test_hex_round_trip(self, algorithm: str) -> None:
+        """Test that hex hashes parse back into the same tagged digest."""
+        digest = get_hash_function(algorithm)(b"Hello")
+
+        assert digest_from_hex(digest_to_hex(digest)) == digest
+
+    def test_chunk_data_exposes_hex_hash(self) -> None:
+        """Test that ChunkData keeps the raw digest and formats hex on access."""
+        chunk = ChunkData.from_splits(["Hello"])
+
+        assert chunk.digest == get_hash_function("md5")(b"Hello")
+        assert chunk.hash == "8b1a9953c4611296a827abf8c47804d7"
+        assert ChunkedDocument(chunks=[chunk]).get_chunk_digests() == {chunk.digest}
+
+    def test_unknown_algorithm(self) -> None:
+        """Test that an unknown algorithm is rejected by the chunker."""
+        with pytest.raises(ValueError, match="Unknown hash algorithm"):
+            CharacterChunker(hash_algorithm="sha0")
+
+    def test_xxhash_not_installed(self) -> None:
+        """Test that xxh128 without xxhash raises an ImportError with an install hint."""
+        with patch("kara.hashing.xxhash", None):
+            with pytest.raises(ImportError, match="kara-toolkit\\[xxhash\\]"):
+                TokenChunker(hash_algorithm="xxh128")
+
+
+class TestSpanHasher:
+    """Tests for rolling span fingerprints."""
+
+    def test_span_matches_direct_fingerprint(self) -> None:
+        """Test that prefix-derived fingerprints equal direct ones for every span."""
+        chunker = TokenChunker(chunk_size=10)
+        units = [5, 17, 5, 300, 17, 5]
+        hasher = SpanHasher(units, chunker.serialize_unit)
+
+        for start in range(len(units)):
+            for end in range(start + 1, len(units) + 1):
+                expected = fingerprint_units(units[start:end], chunker.serialize_unit)
+                assert hasher.fingerprint(start, end) == expected
+
+    def test_equal_text_with_different_boundaries(self) -> None:
+        """Test that string spans are fingerprinted by their serialized bytes."""
+        chunker = CharacterChunker()
+        hasher = SpanHasher(["Hello", " ", "World"], chunker.serialize_unit)
+
+        assert hasher.fingerprint(0, 3) == fingerprint_units(
+            ["Hello World"], chunker.serialize_unit
+        )
+        assert hasher.fingerprint(0, 2) != hasher.fingerprint(1, 3)
+
+    def test_token_sequences_are_unambiguous(self) -> None:
+        """Test that token spans with the same digits but different ids differ."""
+        chunker = TokenChunker(chunk_size=10)
+
+        assert fingerprint_units([12, 3], chunker.serialize_unit) != fingerprint_units(
+            [1, 23], chunker.serialize_unit
+        )
+
+
+class TestOccurrenceIndex:
+    """Tests for locating old chunks in a new unit sequence."""
+
+    def test_finds_every_occurrence(self) -> None:
+        """Test that repeated and overlapping occurrences are all found."""
+        chunker = TokenChunker(chunk_size=10)
+        index: OccurrenceIndex[int] = OccurrenceIndex(chunker.serialize_unit)
+        index.add([1, 2])
+        index.add([2, 3, 1])
+        index.add([9])
+
+        units = [1, 2, 3, 1, 2, 7]
+        hasher = SpanHasher(units, chunker.serialize_unit)
+
+        assert index.find(units, hasher, 0, len(units), len(units)) == [(0, 2), (1, 4), (3, 5)]
+        assert len(index) == 3
+
+    def test_respects_window_bounds(self) -> None:
+        """Test that matches start inside the window and end before its stop."""
+        chunker = CharacterChunker()
+        index: OccurrenceIndex[str] = OccurrenceIndex(chunker.serialize_unit)
+        index.add(["a ", "b "])
+
+        units = ["a ", "b ", "a ", "b ", "a ", "b "]
+        hasher = SpanHasher(units[2:5], chunker.serialize_unit)
+
+        assert index.find(units, hasher, 2, 4, 5) == [(2, 4)]
+
+    def test_length_index_probes_old_lengths(self) -> None:
+        """Test that a length index proposes every span with an old chunk length."""
+        chunker = TokenChunker(chunk_size=10)
+        index: LengthIndex[int] = LengthIndex([2, 3, 2])
+
+        units = [1, 2, 3, 4, 5]
+        hasher = SpanHasher(units, chunker.serialize_unit)
+
+        assert index.find(units, hasher, 1, 3, 5) == [(1, 3), (1, 4), (2, 4), (2, 5)]
+        assert len(index) == 2
+
+    def test_sorted_index_finds_occurrences(self) -> None:
+        """Test that the flat index finds the spans of the nested index, in order."""
+        chunker = TokenChunker(chunk_size=10)
+        old_units = [[1, 2], [2, 3, 1], [9], [1, 5, 5]]
+        index: OccurrenceIndex[int] = OccurrenceIndex(chunker.serialize_unit)
+        for units in old_units:
+            index.add(units)
+        sorted_index = SortedOccurrenceIndex.from_units(old_units, chunker.serialize_unit)
+
+        units = [1, 2, 3, 1, 2, 7, 1, 5, 5]
+        for start, end, stop in [(0, len(units), len(units)), (2, 5, 6), (5, 5, 9)]:
+            hasher = SpanHasher(units[start:stop], chunker.serialize_unit)
+            assert sorted_index.find(units, hasher, start, end, stop) == index.find(
+                units, hasher, start, end, stop
+            )
+        assert len(sorted_index) == 4
+        assert (
+            SortedOccurrenceIndex.from_units([], chunker.serialize_unit).find(
+                units, SpanHasher(units, chunker.serialize_unit), 0, len(units), len(units)
+            )
+            == []
+        )
+
+    def test_sorted_index_pickles_compactly(self) -> None:
+        """Test that the flat index pickles to at most 20 bytes per chunk."""
+        chunker = TokenChunker(chunk_size=10)
+        rng = random.Random(0)
+        old_units = [[rng.randrange(50_000) for _ in range(8)] for _ in range(2_000)]
+        sorted_index = SortedOccurrenceIndex.from_units(old_units, chunker.serialize_unit)
+
+        assert len(pickle.dumps(sorted_index)) <= 20 * len(old_units) + 1_000
+
+
+class TestBloomFilter:
+    """Tests for the probabilistic prefilter of old digests."""
+
+    def test_no_false_negatives(self) -> None:
+        """Test that every inserted digest passes and most others do not."""
+        hash_function = get_hash_function("blake2b")
+        inserted = [hash_function(str(i).encode()) for i in range(2000)]
+        others = [hash_function(f"other {i}".encode()) for i in range(2000)]
+        bloom = BloomFilter(inserted, bits_per_key=10)
+
+        assert all(digest in bloom for digest in inserted)
+        assert sum(digest in bloom for digest in others) < 0.05 * len(others)
+        assert bloom.nbytes <= 2000 * 10 // 8 + 64
+
+    def test_rejects_invalid_bits_per_key(self) -> None:
+        """Test that at least one bit per key is required."""
+        with pytest.raises(ValueError, match="bits_per_key"):
+            BloomFilter([], bits_per_key=0)
+
+    def test_prefiltered_digests(self) -> None:
+        """Test confirming and excluding false hits, and pickling without the exact set."""
+        hash_function = get_hash_function("blake2b")
+        old = {hash_function(f"old {i}".encode()) for i in range(200)}
+        # One bit per key admits many digests, so false hits are easy to find
+        membership = PrefilteredDigests(old, BloomFilter(old, bits_per_key=1))
+        candidates = [hash_function(str(i).encode()) for i in range(100)]
+        false_hit = next(digest for digest in candidates if digest in membership)
+
+        assert membership.confirm(hash_function(b"old 0"))
+        assert not membership.confirm(false_hit)
+        assert false_hit not in membership.excluding({false_hit})
+        assert hash_function(b"old 0") in membership.excluding({false_hit})
+
+        restored = pickle.loads(pickle.dumps(membership))
+        assert false_hit in restored
+        with pytest.raises(RuntimeError):
+            restored.confirm(false_hit)
+
+    def test_sorted_digests(self) -> None:
+        """Test exact membership by binary search over a digest column."""
+        hash_function = get_hash_function("blake2b")
+        old = [hash_function(f"old {i}".encode()) for i in range(200)]
+        digests = SortedDigests(np.frombuffer(b"".join(old + old[:50]), dtype=DIGEST_DTYPE))
+
+        assert len(digests) == 200
+        assert sorted(digests) == sorted(old)
+        assert all(digest in digests for digest in old)
+        assert hash_function(b"new") not in digests
+        assert b"short" not in digests
+        assert all(digest in BloomFilter(digests, bits_per_key=10) for digest in old)
+
+
+class TestDigestRuns:
+    """Tests for counting digests in sorted runs spilled to disk."""
+
+    def test_matches_counter(self, tmp_path: Path) -> None:
+        """Test that spilled and merged counts equal in-memory counts."""
+        hash_function = get_hash_function("blake2b")
+        rng = random.Random(0)
+        old = [hash_function(str(rng.randrange(3000)).encode()) for _ in range(6000)]
+        new = [hash_function(str(rng.randrange(1000, 5000)).encode()) for _ in range(5000)]
+
+        with DigestRuns(MIN_MEMORY_BUDGET, str(tmp_path)) as old_runs:
+            with DigestRuns(MIN_MEMORY_BUDGET, str(tmp_path)) as new_runs:
+                old_runs.update(old)
+                new_runs.update(new)
+                # Enough runs to need more than one merge pass
+                assert old_runs.num_runs > 64
+                assert list(old_runs) == sorted(Counter(old).items())
+
+                old_counts = Counter(old)
+                reused = sum(min(count, old_counts[d]) for d, count in Counter(new).items())
+                assert count_operations(old_runs, new_runs) == (
+                    len(new) - reused,
+                    reused,
+                    len(old) - reused,
+                )
+        assert list(tmp_path.iterdir()) == []
+
+    def test_counts_in_memory_under_budget(self) -> None:
+        """Test that nothing is spilled while the digests fit the budget."""
+        digest = get_hash_function("md5")(b"chunk")
+        with DigestRuns() as runs:
+            runs.update([digest, digest])
+            assert runs.num_runs == 0
+            assert list(runs) == [(digest, 2)]
+            assert runs.num_digests == 2
+
+    def test_rejects_invalid_input(self) -> None:
+        """Test that tiny budgets and digests of the wrong size are rejected."""
+        with pytest.raises(ValueError, match="memory_budget"):
+            DigestRuns(MIN_MEMORY_BUDGET - 1)
+        with pytest.raises(ValueError, match="accounting_memory_budget"):
+            KARAUpdater(CharacterChunker(), accounting_memory_budget=MIN_MEMORY_BUDGET)
+        with pytest.raises(ValueError, match="compute_delta"):
+            KARAUpdater(
+                CharacterChunker(),
+                accounting_memory_budget=2 * MIN_MEMORY_BUDGET,
+                compute_delta=True,
+            )
+        with DigestRuns() as runs, pytest.raises(ValueError, match="digest"):
+            runs.update([b"short"])
+
+
+class TestEmbeddingCache:
+    """Tests for the embedding cache keyed by chunk hash."""
+
+    def test_memory_tier_is_lru(self) -> None:
+        """Test that the least recently used embedding is evicted from memory."""
+        first, second, third = (ChunkData.from_splits([content]) for content in "abc")
+        cache = EmbeddingCache(max_entries=2)
+        cache.put(first.hash, [1.0])
+        cache.put(second.digest, [2.0])
+        assert cache.get(first.digest) == [1.0]
+        cache.put(third.hash, [3.0])
+
+        assert second.hash not in cache
+        assert cache.get_many([first.hash, second.hash, third.hash]) == [[1.0], None, [3.0]]
+        assert (cache.hits, cache.misses) == (3, 1)
+        assert cache.hit_rate == 0.75
+
+    def test_disk_tier_persists_and_evicts(self, tmp_path: Path) -> None:
+        """Test that embeddings on disk survive reopening and stay under the size limit."""
+        chunks = [ChunkData.from_splits([f"chunk {i}"]) for i in range(4)]
+        path = tmp_path / "embeddings.sqlite"
+        # Two float32 vectors of two values fit
+        with EmbeddingCache(path, max_entries=0, max_disk_bytes=16) as cache:
+            for i, chunk in enumerate(chunks[:3]):
+                cache.put(chunk.hash, [float(i), 0.5])
+            assert cache.get(chunks[1].hash) == [1.0, 0.5]
+            cache.put(chunks[3].hash, [3.0, 0.5])
+            assert (len(cache), cache.disk_bytes) == (2, 16)
+
+        with EmbeddingCache(path) as cache:
+            assert cache.get_many([chunk.hash for chunk in chunks]) == [
+                None,
+                [1.0, 0.5],
+                None,
+                [3.0, 0.5],
+            ]
+
+    def test_embed_chunks_embeds_misses(self) -> None:
+        """Test that only chunks missing from the cache are embedded."""
+        chunks = [ChunkData.from_splits([content]) for content in ("a", "bb", "a", "ccc")]
+        calls: list[list[str]] = []
+
+        def embed(contents: list[str]) -> list[int]:
+            calls.append(contents)
+            return [len(content) for content in contents]
+
+        cache = EmbeddingCache()
+        cache.put(chunks[1].hash, 2)
+        assert cache.embed_chunks(chunks, embed) == [1, 2, 1, 3]
+        assert cache.embed_chunks(chunks[:1], embed) == [1]
+        assert calls == [["a", "a", "ccc"]]
+        with pytest.raises(ValueError, match="embed returned"):
+            cache.embed_chunks([ChunkData.from_splits(["d"])], lambda contents: [])
+        with pytest.raises(ValueError, match="max_entries"):
+            EmbeddingCache(max_entries=-1)
+
+
+class TestLocalVectorStore:
+    """Tests for the vector store applying chunk deltas in place."""
+
+    def test_apply_reuses_freed_rows(self) -> None:
+        """Test that reused chunks keep their rows and added chunks fill freed ones."""
+        store = LocalVectorStore(dim=2, capacity=2)
+        store.apply(ChunkDelta(added=[(0, 0), (0, 1), (1, 0)]), [[1, 0], [0, 1], [1, 1]])
+        assert (len(store), store.capacity) == (3, 4)
+        row = store.get((1, 0))
+
+        # Document 1 moves to position 0; document 0 loses a chunk and gains one
+        store.apply(
+            ChunkDelta(added=[(1, 1)], deleted=[(0, 0)], reused={(0, 0): (1, 0), (1, 0): (0, 1)}),
+            [[2, 2]],
+        )
+        assert (len(store), store.capacity, store.num_free_rows) == (3, 4, 1)
+        assert store.get((0, 0)).tolist() == [1, 1]
+        assert store.get((1, 0)).tolist() == [0, 1]
+        assert store.get((1, 1)).tolist() == [2, 2]
+        assert not row.flags.writeable
+
+    def test_search_returns_top_k(self) -> None:
+        """Test that search ranks stored chunks and skips freed rows."""
+        store = LocalVectorStore(dim=2, normalize=True)
+        store.apply(ChunkDelta(added=[(0, 0), (0, 1), (0, 2)]), [[1, 0], [3, 3], [0, 2]])
+        store.apply(ChunkDelta(deleted=[(0, 0)], reused={(0, 1): (0, 1), (0, 2): (0, 2)}), [])
+
+        results = store.search_batch([[1, 0], [0, 5]], k=5)
+        assert [[ref for ref, _ in refs] for refs in results] == [
+            [(0, 1), (0, 2)],
+            [(0, 2), (0, 1)],
+        ]
+        assert results[1][0][1] == pytest.approx(1.0)
+        assert store.search([1, 1], k=1)[0][0] == (0, 1)
+
+    def test_rejects_mismatched_input(self) -> None:
+        """Test that deltas and embeddings that do not match the store are rejected."""
+        store = LocalVectorStore(dim=2)
+        with pytest.raises(ValueError, match="embeddings for 1 added"):
+            store.apply(ChunkDelta(added=[(0, 0)]), [])
+        with pytest.raises(ValueError, match="dimension 2"):
+            store.apply(ChunkDelta(added=[(0, 0)]), [[1, 2, 3]])
+        with pytest.raises(ValueError, match="not stored"):
+            store.apply(ChunkDelta(deleted=[(0, 0)]), [])
+        with pytest.raises(ValueError, match="no delta"):
+            store.apply(UpdateResult(), [])
+        store.apply(ChunkDelta(added=[(0, 0)]), [[1, 2]])
+        with pytest.raises(ValueError, match="more than once"):
+            store.apply(ChunkDelta(deleted=[(0, 0)], reused={(0, 0): (0, 0)}), [])
+        assert store.get((0, 0)).tolist() == [1, 2]
+
 
 class TestCharacterChunker:
     """Tests for CharacterChunker."""
@@ -117,6 +944,20 @@ class TestCharacterChunker:
         assert len(result) >= 1
         assert all(isinstance(chunk, list) for chunk in result)
 
+    def test_unit_lengths(self) -> None:
+        """Test that bulk unit lengths match per-unit lengths."""
+        chunker = CharacterChunker()
+        units = ["ab ", "c", "", "défg\n"]
+
+        assert chunker.unit_lengths(units).tolist() == [chunker.unit_length(u) for u in units]
+
+    def test_oversized_unit_forms_own_chunk(self) -> None:
+        """Test that a unit longer than chunk_size is kept as a chunk of its own."""
+        chunker = CharacterChunker(separators=[" "], chunk_size=6, overlap=1)
+        result = chunker.create_chunks("ab cd abcdefghij ef gh")
+
+        assert result == [["ab ", "cd "], ["cd "], ["abcdefghij "], ["ef ", "gh"]]
+
 
 class TestTokenChunker:
     """Tests for TokenChunker."""
@@ -160,6 +1001,13 @@ class TestTokenChunker:
         chunker = TokenChunker(tokenizer_function=mock_tokenizer, chunk_size=2)
         assert chunker.create_chunks("") == []
 
+    def test_unit_lengths(self) -> None:
+        """Test that every token has unit length one."""
+        chunker = TokenChunker(chunk_size=2)
+
+        assert chunker.unit_lengths([5, 300, 70000]).tolist() == [1, 1, 1]
+        assert chunker.unit_lengths([]).tolist() == []
+
 
 class TestOpenAITokenChunker:
     """Tests for OpenAITokenChunker."""
@@ -227,6 +1075,20 @@ class TestOpenAITokenChunker:
         chunker = OpenAITokenChunker()
         assert chunker.unit_length(123) == 1
 
+    @patch("tiktoken.get_encoding")
+    def test_pickle_reloads_encoding(self, mock_get_encoding: MagicMock) -> None:
+        """Test that pickled chunkers ship the encoding name, not the encoding."""
+        chunker = OpenAITokenChunker(encoding_name="cl100k_base", chunk_size=10)
+
+        state = chunker.__getstate__()
+        assert "_encoding" not in state
+
+        restored = OpenAITokenChunker.__new__(OpenAITokenChunker)
+        restored.__setstate__(state)
+        assert restored.chunk_size == 10
+        assert restored._encoding is mock_get_encoding.return_value
+        assert mock_get_encoding.call_count == 2
+
     def test_tiktoken_not_installed(self) -> None:
         """Test that ImportError is raised when tiktoken is not installed."""
         with patch.dict("sys.modules", {"tiktoken": None}):